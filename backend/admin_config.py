@@ -0,0 +1,368 @@
+"""
+Validation and safe writes of config.json (offline mode).
+
+The file is validated against a JSON Schema compiled once at import, and
+written to a temporary file in the same folder then renamed over the old
+one, so a crash or a sync reading the file at the same time only ever sees
+a complete version.
+
+Each version of the file is identified by a hash of its content, served as
+the ETag of GET /api/admin/config. Writers pass the version they started
+from (If-Match) and get VersionConflict if someone saved in between, instead
+of silently overwriting each other. Writes hold an exclusive flock on
+<config>.lock, so the check and the rename are atomic across gunicorn
+workers too. Hand edits change the content, hence the version, as well.
+
+A file bind-mounted on its own (docker-compose mounts ./config.json) cannot
+be renamed over: it is then rewritten in place, and read() takes the lock
+shared so the backend still never reads it half-written.
+
+The last version read or written is kept in memory and only parsed again
+when the file's stat changes, so patch() applies targeted operations
+(PATCH /api/admin/config) without re-reading the whole file.
+"""
+import errno
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+from jsonschema import Draft7Validator
+
+import files
+
+_NAME = {'type': 'string', 'minLength': 1, 'maxLength': 100}
+_AMOUNT = {'type': 'number', 'minimum': 0}
+# A file of the photos folder, not a path
+_PHOTO = {'type': ['string', 'null'], 'pattern': r'^[^/\\]*$'}
+
+SCHEMA = {
+    'type': 'object',
+    'required': ['objectif_annuel', 'chiffre_affaire_total', 'chefs_projet'],
+    'properties': {
+        'objectif_annuel': {'type': 'number', 'exclusiveMinimum': 0},
+        'objectif_decembre': _AMOUNT,
+        'wr': _AMOUNT,
+        'chiffre_affaire_total': {'type': 'number'},
+        'chefs_projet': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['nom', 'prenom', 'chiffre_affaire'],
+                'properties': {
+                    'nom': _NAME,
+                    'prenom': _NAME,
+                    'chiffre_affaire': {'type': 'number'},
+                    'photo_filename': _PHOTO
+                }
+            }
+        },
+        'autres_objectifs': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['nom', 'valeur'],
+                'properties': {'nom': _NAME, 'valeur': {'type': 'number'}}
+            }
+        }
+    }
+}
+
+Draft7Validator.check_schema(SCHEMA)
+_validator = Draft7Validator(SCHEMA)
+
+DEFAULTS = {'objectif_decembre': 0, 'wr': 0, 'autres_objectifs': []}
+
+# Operations of PATCH /api/admin/config, applied in order by apply_operations()
+_CDP_FIELDS = {'nom': _NAME, 'prenom': _NAME, 'chiffre_affaire': {'type': 'number'}, 'photo_filename': _PHOTO}
+_OBJECTIF_FIELDS = {'nom': _NAME, 'valeur': {'type': 'number'}}
+OPERATIONS = {
+    'set': {
+        'required': ['field', 'value'],
+        'properties': {
+            'field': {'enum': ['objectif_annuel', 'objectif_decembre', 'wr', 'chiffre_affaire_total']},
+            'value': {'type': 'number'}
+        }
+    },
+    'add_cdp': {'required': ['nom', 'prenom', 'chiffre_affaire'], 'properties': _CDP_FIELDS},
+    'update_cdp': {
+        'required': ['nom', 'prenom'],
+        'anyOf': [{'required': ['chiffre_affaire']}, {'required': ['photo_filename']}],
+        'properties': _CDP_FIELDS
+    },
+    'remove_cdp': {'required': ['nom', 'prenom'], 'properties': {'nom': _NAME, 'prenom': _NAME}},
+    'add_objectif': {'required': ['nom', 'valeur'], 'properties': _OBJECTIF_FIELDS},
+    'update_objectif': {'required': ['nom', 'valeur'], 'properties': _OBJECTIF_FIELDS},
+    'remove_objectif': {'required': ['nom'], 'properties': {'nom': _NAME}},
+}
+MAX_OPERATIONS = 1000
+
+_operation_validators = {}
+for _op, _schema in OPERATIONS.items():
+    _schema = dict(_schema, type='object', additionalProperties=False,
+                   properties=dict(_schema['properties'], op={'const': _op}))
+    Draft7Validator.check_schema(_schema)
+    _operation_validators[_op] = Draft7Validator(_schema)
+
+class VersionConflict(Exception):
+    """The file changed since the version the writer started from."""
+
+    def __init__(self, current_version):
+        super().__init__(f"Configuration changed since it was loaded (current version {current_version})")
+        self.current_version = current_version
+
+class InvalidConfig(ValueError):
+    """A config.json that does not pass validate(), e.g. after a hand edit."""
+
+    def __init__(self, errors):
+        super().__init__(f"Invalid config.json: {'; '.join(errors)}")
+        self.errors = errors
+
+class InvalidPatch(ValueError):
+    """Patch operations that are malformed, do not apply or give an invalid config."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+def _schema_errors(validator, instance, path=()):
+    return [
+        f"{'/'.join(str(part) for part in (*path, *error.absolute_path)) or '(root)'}: {error.message}"
+        for error in sorted(validator.iter_errors(instance), key=lambda error: list(error.absolute_path))
+    ]
+
+def validate(config):
+    """
+    Check a config.json object and fill in the optional fields.
+
+    Returns:
+        The list of errors ('path: message'), empty if config is valid
+    """
+    errors = _schema_errors(_validator, config)
+    if errors:
+        return errors
+
+    # (nom, prenom) identifies a chef de projet in the database
+    seen = set()
+    for index, cdp in enumerate(config['chefs_projet']):
+        key = (cdp['nom'], cdp['prenom'])
+        if key in seen:
+            errors.append(f"chefs_projet/{index}: duplicate chef de projet {cdp['prenom']} {cdp['nom']}")
+        seen.add(key)
+
+    for field, default in DEFAULTS.items():
+        config.setdefault(field, list(default) if isinstance(default, list) else default)
+    return errors
+
+def version_of(content):
+    """Return the version identifying the raw content of the file."""
+    return hashlib.sha256(content).hexdigest()[:16]
+
+@contextmanager
+def locked(path, shared=False):
+    """Hold the write lock of the file (shared: only keep writers out)."""
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _copy(config):
+    """Copy config deep enough to modify it, chefs de projet and objectives included."""
+    copy = dict(config)
+    for field in ('chefs_projet', 'autres_objectifs'):
+        if isinstance(copy.get(field), list):
+            copy[field] = [dict(item) if isinstance(item, dict) else item for item in copy[field]]
+    return copy
+
+# path -> (stat signature, version, config) of the version last read or written
+# by this process, so the file is only parsed again when it changes
+_cache = {}
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+def _read(path):
+    signature = _signature(path)
+    cached = _cache.get(path)
+    if cached is None or cached[0] != signature:
+        with open(path, 'rb') as f:
+            content = f.read()
+        cached = _cache[path] = (signature, version_of(content), json.loads(content))
+    return _copy(cached[2]), cached[1]
+
+def read(path):
+    """Return (config, version) of the file (a copy the caller may modify)."""
+    with locked(path, shared=True):
+        return _read(path)
+
+def _replace(path, content):
+    """Write content to a temporary file next to path, then rename it over path."""
+    try:
+        files.replace(path, lambda f: f.write(content), durable=True)
+    except OSError as e:
+        if e.errno not in (errno.EBUSY, errno.EXDEV):
+            raise
+        # Bind-mounted file: rewrite it in place (readers are kept out by the lock)
+        with open(path, 'r+b') as f:
+            f.write(content)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+    _cache[path] = (_signature(path), version_of(content), json.loads(content))
+
+def _dump(config):
+    return json.dumps(config, indent=2, ensure_ascii=False).encode('utf-8')
+
+def write(path, config, expected_version=None):
+    """
+    Atomically replace the file with config.
+
+    Args:
+        path: The config.json file
+        config: The (validated) config object
+        expected_version: The version the change was made from, or None to
+            overwrite whatever is there
+
+    Returns:
+        The new version
+
+    Raises:
+        VersionConflict: If the file is no longer at expected_version
+    """
+    content = _dump(config)
+    with locked(path):
+        if expected_version is not None:
+            try:
+                with open(path, 'rb') as f:
+                    current_version = version_of(f.read())
+            except FileNotFoundError:
+                current_version = None
+            if current_version != expected_version:
+                raise VersionConflict(current_version)
+        _replace(path, content)
+    return version_of(content)
+
+def update(path, change):
+    """
+    Apply change(config) to the file under the write lock (read, modify, write).
+
+    change returns True if it modified config; nothing is written otherwise.
+
+    Returns:
+        (previous, version): the version change was applied to, and the new
+        version or None if nothing changed
+    """
+    with locked(path):
+        config, previous = _read(path)
+        if not change(config):
+            return previous, None
+        content = _dump(config)
+        _replace(path, content)
+    return previous, version_of(content)
+
+def apply_operations(config, operations):
+    """
+    Apply patch operations (see OPERATIONS) to config, in order.
+
+    Chefs de projet are identified by (nom, prenom), autres objectifs by
+    their name (the first one of that name).
+
+    Returns:
+        The database changes: {'kpi': True if a KPI field was set,
+        'cdps': {(nom, prenom): final chef de projet, None if removed},
+        'objectifs': [(op, nom, valeur), ...] in order}
+
+    Raises:
+        InvalidPatch: If an operation is malformed or does not apply
+    """
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_OPERATIONS:
+        raise InvalidPatch([f"operations: must be a list of 1 to {MAX_OPERATIONS} operations"])
+    errors = []
+    for index, operation in enumerate(operations):
+        validator = _operation_validators.get(operation.get('op')) if isinstance(operation, dict) else None
+        if validator is None:
+            errors.append(f"operations/{index}: op must be one of {', '.join(OPERATIONS)}")
+        else:
+            errors.extend(_schema_errors(validator, operation, ('operations', index)))
+    if errors:
+        raise InvalidPatch(errors)
+
+    changes = {'kpi': False, 'cdps': {}, 'objectifs': []}
+    chefs_projet = config.setdefault('chefs_projet', [])
+    objectifs = config.setdefault('autres_objectifs', [])
+    cdps = {(cdp['nom'], cdp['prenom']): cdp for cdp in chefs_projet}
+    for index, operation in enumerate(operations):
+        op = operation['op']
+        if op == 'set':
+            config[operation['field']] = operation['value']
+            changes['kpi'] = True
+        elif op.endswith('_cdp'):
+            key = (operation['nom'], operation['prenom'])
+            cdp = cdps.get(key)
+            if op == 'add_cdp':
+                if cdp is not None:
+                    errors.append(f"operations/{index}: chef de projet {key[1]} {key[0]} already exists")
+                    continue
+                cdp = cdps[key] = {field: value for field, value in operation.items() if field != 'op'}
+                chefs_projet.append(cdp)
+            elif cdp is None:
+                errors.append(f"operations/{index}: no chef de projet {key[1]} {key[0]}")
+                continue
+            elif op == 'update_cdp':
+                cdp.update((field, operation[field]) for field in ('chiffre_affaire', 'photo_filename') if field in operation)
+            else:
+                chefs_projet.remove(cdp)
+                del cdps[key]
+                cdp = None
+            changes['cdps'][key] = cdp
+        else:
+            if op != 'add_objectif':
+                objectif = next((objectif for objectif in objectifs if objectif['nom'] == operation['nom']), None)
+                if objectif is None:
+                    errors.append(f"operations/{index}: no objectif {operation['nom']}")
+                    continue
+            if op == 'add_objectif':
+                objectifs.append({'nom': operation['nom'], 'valeur': operation['valeur']})
+            elif op == 'update_objectif':
+                objectif['valeur'] = operation['valeur']
+            else:
+                objectifs.remove(objectif)
+            changes['objectifs'].append((op, operation['nom'], operation.get('valeur')))
+    if errors:
+        raise InvalidPatch(errors)
+    return changes
+
+def patch(path, operations, expected_version=None):
+    """
+    Apply patch operations to the file under the write lock.
+
+    The current version is taken from memory unless the file changed since
+    this process last read or wrote it.
+
+    Returns:
+        (previous, config, version, changes): the config the operations
+        were applied to, the new config and version, and the database
+        changes (see apply_operations), None if config is unchanged
+
+    Raises:
+        InvalidPatch: If the operations do not apply or the result is invalid
+        VersionConflict: If the file is no longer at expected_version
+    """
+    with locked(path):
+        config, version = _read(path)
+        if expected_version is not None and version != expected_version:
+            raise VersionConflict(version)
+        previous = _copy(config)
+        changes = apply_operations(config, operations)
+        errors = validate(config)
+        if errors:
+            raise InvalidPatch(errors)
+        content = _dump(config)
+        if version_of(content) == version:
+            return previous, config, version, None
+        _replace(path, content)
+    return previous, config, version_of(content), changes
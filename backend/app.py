@@ -1,111 +1,334 @@
 import os
 import json
-from flask import Flask, jsonify, request, send_from_directory
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, make_response, request, stream_with_context
 from flask_cors import CORS
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+import admin_config
+import config_watcher
 import database
-import google_sheets
-
-app = Flask(__name__)
-CORS(app, resources={
-    r"/api/*": {
-        "origins": "*",
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
-# Configuration
-OFFLINE_MODE = os.getenv('OFFLINE_MODE', 'false').lower() == 'true'
-CONFIG_FILE_PATH = os.getenv('CONFIG_FILE_PATH', '/app/config.json')
-SPREADSHEET_ID = os.getenv('GOOGLE_SPREADSHEET_ID', '')
-SHEET_RANGE = os.getenv('GOOGLE_SHEET_RANGE', 'Sheet1!A1:C100')
-UPDATE_INTERVAL_MINUTES = int(os.getenv('UPDATE_INTERVAL_MINUTES', '15'))
-UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/app/frontend/public/images/cdp')
+import events
+import images
+import jobs
+import leader
+import metrics
+import microcache
+import snapshot
+import tenants
+
+api = Blueprint('api', __name__)
+
+# Configuration (source, schedule and database are per tenant, see tenants.py)
+SNAPSHOT_POLL_SECONDS = float(os.getenv('SNAPSHOT_POLL_SECONDS', '1'))
+CONFIG_WATCH_INTERVAL_SECONDS = float(os.getenv('CONFIG_WATCH_INTERVAL_SECONDS', '0.25'))
+SCHEDULER_LOCK_PATH = os.getenv(
+    'SCHEDULER_LOCK_PATH',
+    os.path.join(os.path.dirname(tenants.default().database_path), 'scheduler.lock')
+)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+HISTORY_DEFAULT_DAYS = 30
+HISTORY_RAW_RETENTION_DAYS = int(os.getenv('HISTORY_RAW_RETENTION_DAYS', '7'))
+HISTORY_HOURLY_RETENTION_DAYS = int(os.getenv('HISTORY_HOURLY_RETENTION_DAYS', '90'))
+HISTORY_DAILY_RETENTION_DAYS = int(os.getenv('HISTORY_DAILY_RETENTION_DAYS', '730'))
+UPDATE_LOG_RETENTION_DAYS = int(os.getenv('UPDATE_LOG_RETENTION_DAYS', '90'))
+# A polling client counts as connected while it polls at least this often
+POLLING_CLIENT_WINDOW_SECONDS = 30
+
+REQUEST_SECONDS = metrics.Histogram(
+    'http_request_duration_seconds', 'Time to produce API responses, in seconds', ['tenant', 'endpoint']
+)
+REQUESTS = metrics.Counter(
+    'http_requests_total', 'API requests served', ['tenant', 'endpoint', 'method', 'status']
+)
+SYNC_PHASE_SECONDS = metrics.Histogram(
+    'sync_phase_duration_seconds', 'Duration of the sync phases (fetch, parse, write, publish), in seconds',
+    ['tenant', 'phase']
+)
+SYNC_SECONDS = metrics.Histogram(
+    'sync_duration_seconds', 'Duration of whole syncs, by outcome, in seconds', ['tenant', 'status']
+)
+
+_polling_clients = {}
+_polling_clients_lock = threading.Lock()
+
+def count_polling_clients():
+    """Return {(tenant,): number of client addresses seen in the last POLLING_CLIENT_WINDOW_SECONDS}."""
+    cutoff = time.monotonic() - POLLING_CLIENT_WINDOW_SECONDS
+    counts = {}
+    with _polling_clients_lock:
+        for key, last_seen in list(_polling_clients.items()):
+            if last_seen < cutoff:
+                del _polling_clients[key]
+            else:
+                counts[(key[0],)] = counts.get((key[0],), 0) + 1
+    return counts
+
+# A client polling through several workers is seen by each: the busiest worker's count is kept
+metrics.Gauge(
+    'polling_clients', 'Client addresses that polled the API recently', ['tenant'],
+    callback=count_polling_clients, merge='max'
+)
 
 def allowed_file(filename):
     """Check if the file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@api.url_value_preprocessor
+def pop_tenant(endpoint, values):
+    """Take the tenant out of /api/<tenant>/... URLs (None for /api/...)."""
+    g.tenant_name = values.pop('tenant', None) if values else None
+
+@api.before_request
+def start_request_timer():
+    """Note when the request started, for the request duration metrics."""
+    g.request_start = time.perf_counter()
+
+@api.before_request
+def enter_tenant():
+    """Serve the request for the tenant named in the URL, or the default one."""
+    tenant = tenants.default() if g.tenant_name is None else tenants.get(g.tenant_name)
+    if tenant is None:
+        return jsonify({'error': f"Unknown tenant: {g.tenant_name}"}), 404
+    g.tenant_token = tenants.activate(tenant)
+
+@api.after_request
+def record_request(response):
+    """Count the request and observe its duration (to the response, not the end of a stream)."""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    name = g.get('tenant_name')
+    if name is None:
+        tenant = tenants.default().name
+    else:
+        # Unknown tenants share one label, so random URLs cannot create new series
+        tenant = name if tenants.get(name) else 'unknown'
+    endpoint = request.endpoint.rsplit('.', 1)[-1] if request.endpoint else 'unknown'
+    REQUEST_SECONDS.observe(time.perf_counter() - start, tenant=tenant, endpoint=endpoint)
+    REQUESTS.inc(tenant=tenant, endpoint=endpoint, method=request.method, status=response.status_code)
+
+    if request.method == 'GET' and response.status_code < 400 and endpoint not in ('stream_updates', 'get_metrics'):
+        address = request.headers.get('X-Real-IP') or request.remote_addr
+        with _polling_clients_lock:
+            _polling_clients[(tenant, address)] = time.monotonic()
+    return response
+
+@api.teardown_request
+def leave_tenant(exc):
+    """Restore the tenant context once the request is done."""
+    token = g.pop('tenant_token', None)
+    if token is not None:
+        tenants.deactivate(token)
+
+def conditional(view):
+    """
+    Answer conditional GETs from the snapshot's data version.
+
+    The ETag is the data version, suffixed with the content encoding when the
+    view picks a pre-compressed variant. A matching If-None-Match gets an empty
+    304 without calling the view or touching the database. Tags are compared
+    weakly (RFC 7232), as nginx weakens the ETag of the responses it gzips;
+    a tag of a pre-compressed variant only matches while the request still
+    accepts its encoding.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = str(snapshot.get_snapshot().version)
+
+        if_none_match = request.if_none_match
+        for etag in if_none_match.as_set(include_weak=True):
+            tag_version, _, encoding = etag.partition('-')
+            if tag_version != version or (encoding and not request.accept_encodings[encoding]):
+                continue
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=if_none_match.is_weak(etag))
+            response.vary.add('Accept-Encoding')
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            if 'ETag' not in response.headers:
+                response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+def config_to_data(config):
+    """Turn a config.json object into the payload of a sync."""
+    return {
+        'total': config.get('chiffre_affaire_total', 0),
+        'cdp_list': config.get('chefs_projet', []),
+        'objectif_annuel': config.get('objectif_annuel', 100000),
+        'objectif_decembre': config.get('objectif_decembre', 0),
+        'wr': config.get('wr', 0),
+        'autres_objectifs': config.get('autres_objectifs', [])
+    }
+
 def load_config_file():
-    """Load data from config.json file (offline mode)."""
+    """
+    Load data from the current tenant's config.json file (offline mode).
+
+    Raises:
+        admin_config.InvalidConfig: If the file does not pass the admin
+            validation (hand edits), before anything is written
+    """
     try:
-        with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-
-        total = config.get('chiffre_affaire_total', 0)
-        cdp_list = config.get('chefs_projet', [])
-        objectif = config.get('objectif_annuel', 100000)
-        objectif_decembre = config.get('objectif_decembre', 0)
-        wr = config.get('wr', 0)
-        autres_objectifs = config.get('autres_objectifs', [])
-
-        return {
-            'total': total,
-            'cdp_list': cdp_list,
-            'objectif_annuel': objectif,
-            'objectif_decembre': objectif_decembre,
-            'wr': wr,
-            'autres_objectifs': autres_objectifs
-        }
+        config, _ = admin_config.read(tenants.current().config_file_path)
+        errors = admin_config.validate(config)
+        if errors:
+            raise admin_config.InvalidConfig(errors)
+        return config_to_data(config)
     except Exception as e:
         print(f"Error loading config file: {e}")
         raise e
 
-def sync_data_from_sheets():
-    """Fetch data from Google Sheets and update the database."""
+def payload_hash(data):
+    """Return the hash of a payload stored as sync_hash to skip identical syncs."""
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+def store_data(data, message, progress=None):
+    """
+    Write a source payload to the current tenant's database and publish it.
+
+    Only the rows that changed are written, in one transaction, and all
+    database work is skipped when the payload is the same as last time.
+
+    Args:
+        data: The payload ('total', 'cdp_list', objectives...)
+        message: Message recorded in update_log if something changed
+        progress: Optional callback called with 'write' and 'publish'
+
+    Returns:
+        (status, version, rows_changed), status being 'success' or
+        'unchanged' and version None when nothing changed
+    """
+    progress = progress or (lambda phase: None)
+    tenant = tenants.current()
+
+    data_hash = payload_hash(data)
+    if data_hash == database.get_state('sync_hash'):
+        return 'unchanged', None, 0
+
+    progress('write')
+    with SYNC_PHASE_SECONDS.time(tenant=tenant.name, phase='write'):
+        version, rows_changed = database.apply_sync(data, data_hash, message)
+    if version is not None:
+        progress('publish')
+        with SYNC_PHASE_SECONDS.time(tenant=tenant.name, phase='publish'):
+            snapshot.rebuild()
+    return 'success', version, rows_changed
+
+def sync_data_from_sheets(progress=None):
+    """
+    Fetch the current tenant's data from its source and update its database.
+
+    Args:
+        progress: Optional callback called with the name of each phase
+            ('fetch', 'write', 'publish') as the sync enters it
+
+    Returns:
+        dict with the sync 'status' ('success', 'unchanged' or 'error'),
+        the number of rows changed, the new data version, a message and
+        the report of the sheet rows that were 'rejected'; an invalid
+        config.json fails with the list of validation errors in 'details'
+    """
+    progress = progress or (lambda phase: None)
+    tenant = tenants.current()
+    start = time.perf_counter()
+    result = {'status': 'error'}
     try:
-        print(f"[{datetime.now()}] Starting data sync...")
+        print(f"[{datetime.now()}] Starting data sync for tenant {tenant.name}...")
+        progress('fetch')
 
-        if OFFLINE_MODE:
-            print("Running in OFFLINE mode - reading from config.json")
+        if tenant.offline_mode:
+            print(f"Running in OFFLINE mode - reading from {tenant.config_file_path}")
             data = load_config_file()
         else:
             print("Running in ONLINE mode - reading from Google Sheets")
-            if not SPREADSHEET_ID:
+            if not tenant.spreadsheet_id:
                 raise ValueError("GOOGLE_SPREADSHEET_ID not configured")
 
-            # Fetch data from Google Sheets
-            data = google_sheets.fetch_kpi_data(SPREADSHEET_ID, SHEET_RANGE)
-
-        # Save global KPI with objectif
-        database.save_kpi_global(
-            data['total'],
-            data.get('objectif_annuel', 100000),
-            data.get('objectif_decembre', 0),
-            data.get('wr', 0)
-        )
-
-        # Clear and save each CDP
-        database.clear_chefs_projet()
-        for cdp in data['cdp_list']:
-            database.save_chef_projet(
-                nom=cdp['nom'],
-                prenom=cdp['prenom'],
-                chiffre_affaire=cdp['chiffre_affaire'],
-                photo_filename=cdp.get('photo_filename')
-            )
-
-        # Clear and save autres objectifs
-        database.clear_autres_objectifs()
-        for obj in data.get('autres_objectifs', []):
-            database.save_autre_objectif(obj['nom'], obj['valeur'])
-
-        # Log success
-        mode = "OFFLINE" if OFFLINE_MODE else "ONLINE"
-        database.log_update('success', f"[{mode}] Synced {len(data['cdp_list'])} CDPs, total: {data['total']}€")
-        print(f"[{datetime.now()}] Data sync completed successfully")
+            # Fetch data from Google Sheets (imported here: the Google client
+            # libraries take seconds to load on a Raspberry Pi, offline tenants never need them)
+            import google_sheets
+            data = google_sheets.fetch_kpi_data(tenant.spreadsheet_id, tenant.sheet_range)
+
+        # Concurrent syncs may share a coalesced fetch result: work on a copy
+        data = dict(data)
+        # Phase timings of the Google Sheets reader (a config.json is read and parsed at once)
+        timings = data.pop('timings', None) or {'fetch': time.perf_counter() - start}
+        for phase, seconds in timings.items():
+            SYNC_PHASE_SECONDS.observe(seconds, tenant=tenant.name, phase=phase)
+
+        # Rows the sheet parser rejected are reported with the sync result, not stored
+        rejected = data.pop('rejected', {'count': 0, 'rows': []})
+        if rejected['count']:
+            print(f"[{datetime.now()}] {rejected['count']} malformed rows rejected: {rejected['rows'][:5]}")
+
+        # Write only the changed rows in one transaction, then publish to the read endpoints
+        mode = "OFFLINE" if tenant.offline_mode else "ONLINE"
+        message = f"[{mode}] Synced {len(data['cdp_list'])} CDPs, total: {data['total']}€"
+        if rejected['count']:
+            message += f" ({rejected['count']} rows rejected)"
+        status, version, rows_changed = store_data(data, message, progress)
+        if status == 'unchanged':
+            # Skipped all database work: the source did not change since the last sync
+            print(f"[{datetime.now()}] Data unchanged since last sync, nothing to do")
+            message = 'Data unchanged'
+        else:
+            print(f"[{datetime.now()}] Data sync completed successfully ({rows_changed} rows changed)")
+        result = {'status': status, 'rows_changed': rows_changed, 'version': version, 'message': message,
+                  'rejected': rejected}
+        return result
 
     except Exception as e:
         error_msg = str(e)
         database.log_update('error', error_msg)
         print(f"[{datetime.now()}] Data sync failed: {error_msg}")
+        result = {'status': 'error', 'rows_changed': 0, 'version': None, 'message': error_msg}
+        if isinstance(e, admin_config.InvalidConfig):
+            # The dashboard keeps serving the last good data
+            result['details'] = e.errors
+        return result
+    finally:
+        SYNC_SECONDS.observe(time.perf_counter() - start, tenant=tenant.name, status=result['status'])
+
+def queue_sync(source):
+    """Queue a sync of the current tenant on the shared sync executor, or attach to the one in flight."""
+    return jobs.submit(sync_data_from_sheets, source)
+
+def compact_history():
+    """Downsample old KPI history, prune the update log and optimize the database of every tenant."""
+    for tenant in tenants.all_tenants():
+        tenants.call(tenant, compact_tenant_history)
+
+def compact_tenant_history():
+    """Downsample old KPI history, prune the update log and optimize the current tenant's database."""
+    try:
+        print(f"[{datetime.now()}] Starting history compaction for tenant {tenants.current().name}...")
+        stats = database.compact_history(
+            HISTORY_RAW_RETENTION_DAYS,
+            HISTORY_HOURLY_RETENTION_DAYS,
+            HISTORY_DAILY_RETENTION_DAYS,
+            UPDATE_LOG_RETENTION_DAYS
+        )
+        vacuumed = database.optimize_db()
+        print(f"[{datetime.now()}] History compaction completed: {stats}, vacuumed: {vacuumed}")
+    except Exception as e:
+        print(f"[{datetime.now()}] History compaction failed: {e}")
 
 # API Endpoints
-@app.route('/api/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
     return jsonify({
@@ -113,135 +336,349 @@ def health_check():
         'timestamp': datetime.now().isoformat()
     })
 
-@app.route('/api/kpi', methods=['GET'])
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose the metrics of every tenant in the Prometheus text format."""
+    try:
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/kpi', methods=['GET'])
+@conditional
+@microcache.cached
 def get_kpi():
     """Get the latest global KPI."""
     try:
-        kpi = database.get_latest_kpi_global()
+        kpi = snapshot.get_snapshot().kpi
         if not kpi:
             return jsonify({'chiffre_affaire': 0, 'timestamp': None})
         return jsonify(kpi)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/cdp', methods=['GET'])
+@api.route('/dashboard', methods=['GET'])
+@conditional
+def get_dashboard():
+    """Get KPI, ranked CDPs, autres objectifs and last update in one payload."""
+    try:
+        current = snapshot.get_snapshot()
+
+        # The payload is pre-encoded once per snapshot, pick the best variant
+        if current.payload_br is not None and request.accept_encodings['br']:
+            body, encoding = current.payload_br, 'br'
+        elif request.accept_encodings['gzip']:
+            body, encoding = current.payload_gzip, 'gzip'
+        else:
+            body, encoding = current.payload, None
+
+        response = current_app.response_class(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f"{current.version}-{encoding}")
+        response.vary.add('Accept-Encoding')
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/stream', methods=['GET'])
+def stream_updates():
+    """Push an 'update' event to the client whenever the data changes."""
+    try:
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        last_version = int(last_event_id) if last_event_id.isdigit() else None
+        full = request.args.get('full') == '1'
+
+        response = Response(
+            stream_with_context(events.stream(snapshot.get_snapshot(), last_version, full)),
+            mimetype='text/event-stream'
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/cdp', methods=['GET'])
+@conditional
+@microcache.cached
 def get_cdp():
     """Get all chefs de projet ranked by revenue."""
     try:
-        cdps = database.get_all_chefs_projet()
+        cdps = snapshot.get_snapshot().cdp_list
         return jsonify(cdps)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/last-update', methods=['GET'])
+@api.route('/last-update', methods=['GET'])
+@conditional
+@microcache.cached
 def get_last_update():
     """Get the timestamp of the last successful update."""
     try:
-        timestamp = database.get_last_update()
+        timestamp = snapshot.get_snapshot().last_update
         return jsonify({'last_update': timestamp})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/sync', methods=['POST'])
+@api.route('/history', methods=['GET'])
+@microcache.cached
+def get_history():
+    """
+    Get the revenue history for charting, as column-oriented arrays.
+
+    Query parameters:
+        from, to: Range as epoch seconds (defaults to the last 30 days)
+        cdp: Restrict to one chef de projet, given as "nom,prenom"
+    """
+    try:
+        try:
+            end = int(request.args.get('to', time.time()))
+            start = int(request.args.get('from', end - HISTORY_DEFAULT_DAYS * 86400))
+        except ValueError:
+            return jsonify({'error': 'from and to must be epoch timestamps'}), 400
+        if start > end:
+            return jsonify({'error': 'from must be before to'}), 400
+
+        nom = prenom = None
+        cdp = request.args.get('cdp')
+        if cdp:
+            if ',' not in cdp:
+                return jsonify({'error': 'cdp must be given as "nom,prenom"'}), 400
+            nom, prenom = (part.strip() for part in cdp.split(',', 1))
+
+        history = database.get_history(start, end, nom, prenom)
+        return jsonify({'from': start, 'to': end, **history})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/sync', methods=['POST'])
 def manual_sync():
-    """Manually trigger a data sync."""
+    """
+    Queue a data sync and return immediately with its job.
+
+    A sync requested while another one is queued or running attaches to it.
+    Poll GET /api/sync/<job_id> for its progress.
+    """
     try:
-        sync_data_from_sheets()
-        return jsonify({'status': 'success', 'message': 'Data sync completed'})
+        job, created = queue_sync('api')
+        response = jsonify({
+            'status': 'accepted',
+            'message': 'Data sync queued' if created else 'Data sync already in progress',
+            'job': job
+        })
+        response.status_code = 202
+        response.headers['Location'] = f"{request.path}/{job['id']}"
+        return response
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/config', methods=['GET'])
+@api.route('/sync/<job_id>', methods=['GET'])
+def get_sync_job(job_id):
+    """Get the status, progress and timing of a sync job."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown sync job'}), 404
+    return jsonify(job)
+
+@api.route('/config', methods=['GET'])
 def get_config():
     """Get current configuration."""
+    tenant = tenants.current()
     return jsonify({
-        'offline_mode': OFFLINE_MODE,
-        'spreadsheet_configured': bool(SPREADSHEET_ID),
-        'update_interval_minutes': UPDATE_INTERVAL_MINUTES,
-        'sheet_range': SHEET_RANGE
+        'tenant': tenant.name,
+        'offline_mode': tenant.offline_mode,
+        'spreadsheet_configured': bool(tenant.spreadsheet_id),
+        'update_interval_minutes': tenant.update_interval_minutes,
+        'sheet_range': tenant.sheet_range
     })
 
-@app.route('/api/objectif', methods=['GET'])
+@api.route('/objectif', methods=['GET'])
+@conditional
+@microcache.cached
 def get_objectif():
     """Get the annual objective."""
     try:
-        objectif = database.get_objectif_annuel()
+        kpi = snapshot.get_snapshot().kpi
+        objectif = kpi['objectif_annuel'] if kpi else 100000
         return jsonify({'objectif_annuel': objectif})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/last-modified', methods=['GET'])
+@api.route('/last-modified', methods=['GET'])
+@conditional
 def get_last_modified():
-    """Get the last modification timestamp of config.json."""
+    """Get the current data version, which changes whenever the data does."""
     try:
-        if OFFLINE_MODE:
-            import os
-            mtime = os.path.getmtime(CONFIG_FILE_PATH)
-            return jsonify({'last_modified': mtime})
-        else:
-            # En mode online, utiliser le timestamp de la dernière sync
-            timestamp = database.get_last_update()
-            if timestamp:
-                from datetime import datetime
-                dt = datetime.fromisoformat(timestamp)
-                return jsonify({'last_modified': dt.timestamp()})
-            return jsonify({'last_modified': 0})
+        return jsonify({'last_modified': snapshot.get_snapshot().version})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/config', methods=['GET'])
+@api.route('/admin/config', methods=['GET'])
 def get_admin_config():
-    """Get the current config.json for admin interface."""
+    """Get the current config.json for admin interface, its version as ETag."""
     try:
-        if not OFFLINE_MODE:
+        if not tenants.current().offline_mode:
             return jsonify({'error': 'Admin interface only available in offline mode'}), 400
 
         # Load the raw config file for admin interface
-        with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config, version = admin_config.read(tenants.current().config_file_path)
 
-        return jsonify(config)
+        response = jsonify(config)
+        response.set_etag(version)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/config', methods=['PUT'])
+def if_match_version():
+    """Return the config version of the If-Match header, None if absent or *."""
+    if_match = request.if_match
+    return None if not if_match or if_match.star_tag else next(iter(if_match.as_set()))
+
+def version_conflict_response(e):
+    """Answer 412 to a write started from an outdated config version."""
+    response = jsonify({
+        'error': 'Configuration changed since it was loaded, reload it and apply your changes again',
+        'version': e.current_version
+    })
+    response.status_code = 412
+    if e.current_version:
+        response.set_etag(e.current_version)
+    return response
+
+@api.route('/admin/config', methods=['PUT'])
 def update_admin_config():
-    """Update the config.json file from admin interface."""
+    """
+    Update the config.json file from admin interface and apply it right away.
+
+    The body is validated against the config schema (400 with the list of
+    errors). With If-Match, the file must still be at that version (the
+    ETag of GET /api/admin/config), otherwise nothing is written and the
+    answer is 412. The validated config is then written atomically and
+    applied to the database and the dashboard in the same request.
+    """
     try:
-        if not OFFLINE_MODE:
+        tenant = tenants.current()
+        if not tenant.offline_mode:
             return jsonify({'error': 'Admin interface only available in offline mode'}), 400
 
-        new_config = request.get_json()
-
-        # Validate the structure
-        required_fields = ['objectif_annuel', 'chiffre_affaire_total', 'chefs_projet']
-        if not all(field in new_config for field in required_fields):
-            return jsonify({'error': 'Invalid config structure'}), 400
-
-        # Ensure new fields exist with defaults
-        if 'objectif_decembre' not in new_config:
-            new_config['objectif_decembre'] = 0
-        if 'wr' not in new_config:
-            new_config['wr'] = 0
-        if 'autres_objectifs' not in new_config:
-            new_config['autres_objectifs'] = []
-
-        # Save to config.json
-        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(new_config, f, indent=2, ensure_ascii=False)
+        new_config = request.get_json(silent=True)
+        errors = admin_config.validate(new_config)
+        if errors:
+            return jsonify({'error': 'Invalid config structure', 'details': errors}), 400
+
+        try:
+            version = admin_config.write(tenant.config_file_path, new_config, if_match_version())
+        except admin_config.VersionConflict as e:
+            return version_conflict_response(e)
+
+        data = config_to_data(new_config)
+        message = f"[ADMIN] Config updated via web interface: {len(data['cdp_list'])} CDPs, total: {data['total']}€"
+        _, data_version, rows_changed = store_data(data, message)
+
+        response = jsonify({
+            'status': 'success',
+            'message': 'Configuration updated successfully',
+            'version': version,
+            'data_version': data_version,
+            'rows_changed': rows_changed
+        })
+        response.set_etag(version)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Log the update
-        database.log_update('success', f"[ADMIN] Config updated via web interface")
+@api.route('/admin/config', methods=['PATCH'])
+def patch_admin_config():
+    """
+    Apply targeted changes to config.json and the database.
+
+    The body is {"operations": [...]}, applied in order (see
+    admin_config.OPERATIONS), e.g. {"op": "update_cdp", "nom": "Dupont",
+    "prenom": "Marie", "chiffre_affaire": 52000}. Operations that are
+    malformed, do not apply or give an invalid config are answered 400 with
+    the list of errors, If-Match like PUT. Only the rows the operations
+    name are written, in one transaction, without re-reading the file or
+    diffing the whole config.
+    """
+    try:
+        tenant = tenants.current()
+        if not tenant.offline_mode:
+            return jsonify({'error': 'Admin interface only available in offline mode'}), 400
 
-        return jsonify({'status': 'success', 'message': 'Configuration updated successfully'})
+        body = request.get_json(silent=True)
+        operations = body.get('operations') if isinstance(body, dict) else None
+        try:
+            previous, config, version, changes = admin_config.patch(tenant.config_file_path, operations, if_match_version())
+        except admin_config.InvalidPatch as e:
+            return jsonify({'error': 'Invalid patch', 'details': e.errors}), 400
+        except admin_config.VersionConflict as e:
+            return version_conflict_response(e)
+
+        data_version, rows_changed = None, 0
+        if changes is not None:
+            data = config_to_data(config)
+            message = f"[ADMIN] Config patched via web interface: {len(operations)} operations"
+            with SYNC_PHASE_SECONDS.time(tenant=tenant.name, phase='write'):
+                data_version, rows_changed = database.apply_patch(
+                    data, changes, payload_hash(config_to_data(previous)), payload_hash(data), message
+                )
+            if data_version is not None:
+                with SYNC_PHASE_SECONDS.time(tenant=tenant.name, phase='publish'):
+                    snapshot.rebuild()
+
+        response = jsonify({
+            'status': 'success',
+            'message': 'Configuration updated successfully',
+            'version': version,
+            'data_version': data_version,
+            'rows_changed': rows_changed
+        })
+        response.set_etag(version)
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/upload-photo', methods=['POST'])
+def rename_photo(old_filename, new_filename):
+    """
+    Point the current tenant's chefs de projet using an uploaded file name
+    at the processed photo, in config.json and in the database.
+
+    Returns:
+        (previous, version) of config.json as returned by
+        admin_config.update, (None, None) in online mode
+    """
+    tenant = tenants.current()
+    previous, version = None, None
+    if tenant.offline_mode:
+        def rename(config):
+            renamed = False
+            for cdp in config.get('chefs_projet', []):
+                if cdp.get('photo_filename') == old_filename:
+                    cdp['photo_filename'] = new_filename
+                    renamed = True
+            return renamed
+
+        previous, version = admin_config.update(tenant.config_file_path, rename)
+
+    if database.rename_photo(old_filename, new_filename) is not None:
+        snapshot.rebuild()
+    return previous, version
+
+@api.route('/admin/upload-photo', methods=['POST'])
 def upload_photo():
-    """Upload a CDP photo."""
+    """
+    Upload a CDP photo.
+
+    Chefs de projet already using the uploaded file name are pointed at the
+    processed photo, which changes config.json. When the request carries
+    the config version the page was loaded from (If-Match) and the file was
+    still at it, the answer includes the new 'version', so the page keeps
+    saving over its own rename instead of getting a 412.
+    """
     try:
-        if not OFFLINE_MODE:
+        if not tenants.current().offline_mode:
             return jsonify({'error': 'Photo upload only available in offline mode'}), 400
 
         # Check if the post request has the file part
@@ -255,60 +692,142 @@ def upload_photo():
             return jsonify({'error': 'No selected file'}), 400
 
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-
-            # Create upload folder if it doesn't exist
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-            # Save the file
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
+            original = secure_filename(file.filename)
+            data = file.read()
+            try:
+                images.verify(data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            # Resized and re-encoded on the photo worker, one upload at a time
+            entry = images.submit(data).result()
+            previous, version = rename_photo(original, entry['src'])
+            expected_version = if_match_version()
 
             return jsonify({
                 'status': 'success',
-                'filename': filename,
-                'message': f'Photo {filename} uploaded successfully'
+                'filename': entry['src'],
+                'original': original,
+                'srcset': images.srcset(entry),
+                'version': version if expected_version is not None and previous == expected_version else None,
+                'message': f'Photo {original} uploaded successfully'
             })
         else:
             return jsonify({'error': 'File type not allowed. Only images are accepted.'}), 400
 
+    except RequestEntityTooLarge:
+        return jsonify({'error': f"Photo too large (max {images.MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/autres-objectifs', methods=['GET'])
+@api.route('/autres-objectifs', methods=['GET'])
+@conditional
+@microcache.cached
 def get_autres_objectifs():
     """Get all autres objectifs."""
     try:
-        objectifs = database.get_all_autres_objectifs()
+        objectifs = snapshot.get_snapshot().autres_objectifs
         return jsonify(objectifs)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
-    # Initialize database
-    print("Initializing database...")
-    database.init_db()
-
-    # Set up scheduler for periodic updates
+def create_app():
+    """Create the Flask application."""
+    flask_app = Flask(__name__)
+    # Larger uploads are refused before being buffered (multipart framing on top of the photo)
+    flask_app.config['MAX_CONTENT_LENGTH'] = images.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+    CORS(flask_app, resources={
+        r"/api/*": {
+            "origins": "*",
+            "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "If-Match"],
+            "expose_headers": ["ETag"]
+        }
+    })
+    # /api/... serves the default tenant, /api/<tenant>/... any tenant
+    flask_app.register_blueprint(api, url_prefix='/api')
+    flask_app.register_blueprint(api, url_prefix='/api/<tenant>', name='tenant_api')
+    return flask_app
+
+def start_scheduler():
+    """
+    Schedule the periodic jobs of every tenant, watch the config.json of
+    offline tenants and queue their initial syncs.
+
+    Returns:
+        The list of initial sync jobs
+    """
     scheduler = BackgroundScheduler()
+    for tenant in tenants.all_tenants():
+        scheduler.add_job(
+            func=tenants.call,
+            args=[tenant, queue_sync, 'scheduler'],
+            trigger="interval",
+            minutes=tenant.update_interval_minutes,
+            id=f'sync_sheets_{tenant.name}',
+            name=f'Sync data of tenant {tenant.name}',
+            replace_existing=True
+        )
+        print(f"Tenant {tenant.name}: data will sync every {tenant.update_interval_minutes} minutes")
     scheduler.add_job(
-        func=sync_data_from_sheets,
-        trigger="interval",
-        minutes=UPDATE_INTERVAL_MINUTES,
-        id='sync_sheets',
-        name='Sync data from Google Sheets',
+        func=compact_history,
+        trigger="cron",
+        hour=3,
+        id='compact_history',
+        name='Downsample history and prune old rows',
         replace_existing=True
     )
     scheduler.start()
 
-    # Initial sync
-    try:
-        sync_data_from_sheets()
-    except Exception as e:
-        print(f"Initial sync failed: {e}")
-        print("The application will continue and retry at the next scheduled interval")
+    initial_jobs = []
+    for tenant in tenants.all_tenants():
+        # In offline mode, also reload config.json as soon as it is edited
+        if tenant.offline_mode:
+            config_watcher.start(
+                tenant.config_file_path,
+                lambda tenant=tenant: tenants.call(tenant, queue_sync, 'config-watcher'),
+                interval=CONFIG_WATCH_INTERVAL_SECONDS
+            )
+            print(f"Watching {tenant.config_file_path} for changes")
+
+        # Initial sync, on the same executor as the scheduled and manual ones
+        job, _ = tenants.call(tenant, queue_sync, 'startup')
+        initial_jobs.append(job)
+    return initial_jobs
+
+def start_background_services():
+    """
+    Start the background work of a serving process.
+
+    Every process follows the data version of each tenant to keep its
+    snapshots current; only the one holding the scheduler lock runs the
+    scheduler, so several gunicorn workers never schedule the same syncs.
+
+    Returns:
+        The initial sync jobs if this process became the leader, else []
+    """
+    for tenant in tenants.all_tenants():
+        tenants.call(tenant, database.init_db)
+        # Answer the first requests with the last saved snapshot, not a rebuild
+        try:
+            tenants.call(tenant, snapshot.warm_start)
+        except Exception as e:
+            print(f"Could not load the saved snapshot of tenant {tenant.name}: {e}")
+    snapshot.start_follower(SNAPSHOT_POLL_SECONDS)
+    metrics.start_exporter()
+
+    elected = []
+    leader.run_when_leader(SCHEDULER_LOCK_PATH, lambda: elected.extend(start_scheduler()))
+    return elected
+
+app = create_app()
+
+if __name__ == '__main__':
+    # Initialize database and background jobs; the initial syncs run in the
+    # background while the saved snapshots are served
+    print("Initializing database...")
+    start_background_services()
 
-    # Run Flask app
+    # Run Flask app (development server, see gunicorn.conf.py for production)
     print(f"Starting Flask app on port 5000...")
-    print(f"Data will sync every {UPDATE_INTERVAL_MINUTES} minutes")
     app.run(host='0.0.0.0', port=5000, debug=False)
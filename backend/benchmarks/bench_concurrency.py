@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Concurrency check: syncs keep writing while 50 readers hit the API.
+
+Readers alternate between the whole and the per-CDP /api/history, which
+query SQLite (the other read endpoints serve the in-memory snapshot), on a
+threaded local server while a writer thread runs back-to-back syncs with
+changing data. Fails if any request errors out, if a sync hits
+'database is locked', or if the p99 latency exceeds --max-p99-ms.
+
+Usage: python benchmarks/bench_concurrency.py [--readers 50] [--duration 10]
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from common import make_config, percentile, setup_environment, write_config
+
+def reader(base_url, stop, latencies, errors):
+    """Hit the read endpoints until told to stop."""
+    paths = ['/api/history', '/api/history?cdp=Nom0,Prenom0']
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=10) as response:
+                response.read()
+        except Exception as e:
+            errors.append(f"{path}: {e}")
+            continue
+        latencies.append(time.perf_counter() - start)
+
+def writer(config_path, stop, syncs):
+    """Run syncs with changing data until told to stop."""
+    import app as backend
+
+    seed = 0
+    while not stop.is_set():
+        seed += 1
+        write_config(config_path, make_config(cdp_count=30, seed=seed))
+        backend.sync_data_from_sheets()
+        syncs.append(seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--max-p99-ms', type=float, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = setup_environment(workdir)
+        from werkzeug.serving import make_server
+        import database
+        import app as backend
+
+        database.init_db()
+        backend.sync_data_from_sheets()
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        stop = threading.Event()
+        latencies, errors, syncs = [], [], []
+        threads = [threading.Thread(target=writer, args=(config_path, stop, syncs))]
+        threads += [
+            threading.Thread(target=reader, args=(base_url, stop, latencies, errors))
+            for _ in range(args.readers)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        server.shutdown()
+
+        conn = database.get_db_connection()
+        sync_errors = conn.execute(
+            "SELECT message FROM update_log WHERE status = 'error'"
+        ).fetchall()
+
+    p99_ms = percentile(latencies, 99) * 1000
+    print(f"requests: {len(latencies)} ({len(latencies) / args.duration:.0f} req/s), syncs: {len(syncs)}")
+    print(f"p50: {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p95: {percentile(latencies, 95) * 1000:.1f} ms, p99: {p99_ms:.1f} ms")
+    print(f"request errors: {len(errors)}, sync errors: {len(sync_errors)}")
+    for message in (errors + [row['message'] for row in sync_errors])[:10]:
+        print(f"  {message}")
+
+    if errors or sync_errors or p99_ms > args.max_p99_ms:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
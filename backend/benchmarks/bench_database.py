@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark the database functions on a seeded database of realistic size.
+
+Seeds a SQLite file with years of history as written by a sync every
+--interval minutes (one kpi_global row, one update_log row and one changed
+CDP revenue per sync), then times each read and write function, and the
+history queries again after compact_history has downsampled the old rows.
+
+Usage: python benchmarks/bench_database.py [--years 3] [--cdps 30] [--json out.json]
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import make_config, setup_environment, summarize, write_results
+
+def seed(path, years, interval_minutes, cdp_count):
+    """Fill the history tables as if the backend had been syncing for years."""
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start = now - timedelta(days=365 * years)
+    steps = int((now - start).total_seconds() // (interval_minutes * 60))
+    revenues = [0.0] * cdp_count
+
+    kpi_rows, log_rows, history_rows = [], [], []
+    for step in range(steps):
+        ts = start + timedelta(minutes=step * interval_minutes)
+        text = ts.strftime('%Y-%m-%d %H:%M:%S')
+        cdp = rng.randrange(cdp_count)
+        revenues[cdp] += rng.randrange(50, 2000)
+        kpi_rows.append((sum(revenues), 100000, 42000, 81000, text))
+        log_rows.append(('success', f'[ONLINE] Synced {cdp_count} CDPs, total: {sum(revenues)}€', 2, text))
+        history_rows.append((f'Nom{cdp}', f'Prenom{cdp}', int(ts.timestamp()), revenues[cdp]))
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO kpi_global (chiffre_affaire, objectif_annuel, objectif_decembre, wr, timestamp) VALUES (?, ?, ?, ?, ?)',
+        kpi_rows
+    )
+    conn.executemany('INSERT INTO update_log (status, message, rows_changed, timestamp) VALUES (?, ?, ?, ?)', log_rows)
+    conn.executemany(
+        'INSERT OR REPLACE INTO cdp_history (nom, prenom, ts, chiffre_affaire) VALUES (?, ?, ?, ?)', history_rows
+    )
+    conn.commit()
+    conn.close()
+    return steps
+
+def bench(func, repeat, max_seconds):
+    """Call func up to repeat times (stopping after max_seconds) and summarize the durations."""
+    func()  # warm up the connection and page cache
+    durations = []
+    deadline = time.perf_counter() + max_seconds
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+        if start > deadline:
+            break
+    return summarize(durations)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--interval', type=int, default=15, help='minutes between seeded syncs')
+    parser.add_argument('--cdps', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--max-seconds', type=float, default=5, help='time budget per function')
+    parser.add_argument('--json', default='', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_environment(workdir, args.cdps)
+        import app
+        import database
+        import tenants
+
+        database.init_db()
+        app.sync_data_from_sheets()
+        start = time.perf_counter()
+        steps = seed(tenants.current().database_path, args.years, args.interval, args.cdps)
+        print(f"Seeded {steps} syncs ({args.years} years every {args.interval} min) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        now = int(time.time())
+        config = make_config(args.cdps)
+        data = {
+            'total': config['chiffre_affaire_total'],
+            'cdp_list': config['chefs_projet'],
+            'objectif_annuel': config['objectif_annuel'],
+            'objectif_decembre': config['objectif_decembre'],
+            'wr': config['wr'],
+            'autres_objectifs': config['autres_objectifs']
+        }
+        changes = iter(range(10 ** 9))
+
+        def sync_one_change():
+            cdp = data['cdp_list'][0]
+            cdp['chiffre_affaire'] = next(changes)
+            database.apply_sync(data, 'bench', 'bench')
+
+        cases = {
+            'get_dashboard_data': database.get_dashboard_data,
+            'get_latest_kpi_global': database.get_latest_kpi_global,
+            'get_last_update': database.get_last_update,
+            'get_state': lambda: database.get_state('data_version'),
+            'get_history_30d': lambda: database.get_history(now - 30 * 86400, now),
+            'get_history_365d': lambda: database.get_history(now - 365 * 86400, now),
+            'get_history_365d_one_cdp': lambda: database.get_history(now - 365 * 86400, now, 'Nom0', 'Prenom0'),
+            'apply_sync_unchanged': lambda: database.apply_sync(data, 'bench', 'bench'),
+            'apply_sync_one_change': sync_one_change,
+        }
+
+        results = {}
+        print(f"{'function':<28s} {'calls':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s}")
+
+        def report(name, result):
+            results[name] = result
+            print(f"{name:<28s} {result['count']:6d} {result['p50_ms']:9.3f} "
+                  f"{result['p95_ms']:9.3f} {result['max_ms']:9.3f}")
+
+        for name, func in cases.items():
+            report(name, bench(func, args.repeat, args.max_seconds))
+
+        start = time.perf_counter()
+        database.compact_history(app.HISTORY_RAW_RETENTION_DAYS, app.HISTORY_HOURLY_RETENTION_DAYS,
+                                 app.HISTORY_DAILY_RETENTION_DAYS, app.UPDATE_LOG_RETENTION_DAYS)
+        database.optimize_db()
+        report('compact_history', summarize([time.perf_counter() - start]))
+        for name in ('get_history_30d', 'get_history_365d', 'get_dashboard_data'):
+            report(f'{name}_compacted', bench(cases[name], args.repeat, args.max_seconds))
+
+        write_results(args.json, 'database', results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Macro-benchmark the API under N kiosks polling like the dashboard does.
+
+Starts the production server (gunicorn.conf.py) on a throwaway offline
+database and simulates kiosks with one keep-alive connection each: a kiosk
+loads /api/dashboard, then polls /api/last-modified every --interval
+seconds (the dashboard's fallback without SSE) and reloads the dashboard,
+conditionally on its ETag, whenever the date changes. config.json is
+edited every --change-every seconds so the kiosks really refresh.
+
+Usage: python benchmarks/bench_endpoints.py [--kiosks 10 50 100] [--duration 20] [--json out.json]
+"""
+import argparse
+import http.client
+import json
+import random
+import tempfile
+import threading
+import time
+
+from common import gunicorn_server, make_config, setup_environment, summarize, write_config, write_results
+
+class Kiosk(threading.Thread):
+    """One dashboard screen: a connection, a poll loop and its request latencies."""
+
+    def __init__(self, port, interval, deadline):
+        super().__init__(daemon=True)
+        self.port = port
+        self.interval = interval
+        self.deadline = deadline
+        self.latencies = {'last_modified': [], 'dashboard': []}
+        self.errors = 0
+        self.not_modified = 0
+        self.conn = None
+
+    def get(self, path, headers=None):
+        """GET path and return (response, body, seconds), or None on error."""
+        headers = dict({'Accept-Encoding': 'gzip, br'}, **(headers or {}))
+        start = time.perf_counter()
+        # Like browsers, retry once on a new connection when the server closed an idle keep-alive one
+        for retry in (self.conn is not None, False):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+                self.conn.request('GET', path, headers=headers)
+                response = self.conn.getresponse()
+                body = response.read()
+                break
+            except OSError:
+                self.conn.close()
+                self.conn = None
+                if not retry:
+                    self.errors += 1
+                    return None
+        elapsed = time.perf_counter() - start
+        if response.status >= 400:
+            self.errors += 1
+            return None
+        return response, body, elapsed
+
+    def load_dashboard(self, etag):
+        result = self.get('/api/dashboard', {'If-None-Match': etag} if etag else None)
+        if result is None:
+            return etag
+        response, _, elapsed = result
+        self.latencies['dashboard'].append(elapsed)
+        if response.status == 304:
+            self.not_modified += 1
+        return response.getheader('ETag', etag)
+
+    def run(self):
+        # Screens do not all start in the same millisecond
+        time.sleep(random.uniform(0, self.interval))
+        etag = self.load_dashboard(None)
+        last_modified = None
+        while time.time() < self.deadline:
+            result = self.get('/api/last-modified')
+            if result is not None:
+                _, body, elapsed = result
+                self.latencies['last_modified'].append(elapsed)
+                modified = json.loads(body).get('last_modified')
+                if last_modified is not None and modified != last_modified:
+                    etag = self.load_dashboard(etag)
+                last_modified = modified
+            time.sleep(self.interval)
+
+def run(port, kiosks, interval, duration, config_path, config, change_every):
+    """Run kiosks against the server for duration seconds, editing config.json meanwhile."""
+    deadline = time.time() + duration
+    threads = [Kiosk(port, interval, deadline) for _ in range(kiosks)]
+    for thread in threads:
+        thread.start()
+
+    changes = 0
+    next_change = time.time() + change_every
+    while time.time() < deadline:
+        time.sleep(min(0.1, max(0, deadline - time.time())))
+        if time.time() >= next_change:
+            config['chiffre_affaire_total'] += 1000
+            config['chefs_projet'][0]['chiffre_affaire'] += 1000
+            write_config(config_path, config)
+            changes += 1
+            next_change += change_every
+    for thread in threads:
+        thread.join()
+
+    result = {'kiosks': kiosks, 'changes': changes}
+    for name in ('last_modified', 'dashboard'):
+        latencies = [latency for thread in threads for latency in thread.latencies[name]]
+        for key, value in summarize(latencies).items():
+            result[f'{name}_{key}'] = value
+    every = [latency for thread in threads for values in thread.latencies.values() for latency in values]
+    result['requests_per_second'] = len(every) / duration
+    result.update({f'all_{key}': value for key, value in summarize(every).items()})
+    result['not_modified'] = sum(thread.not_modified for thread in threads)
+    result['errors'] = sum(thread.errors for thread in threads)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--kiosks', type=int, nargs='+', default=[10, 50, 100])
+    parser.add_argument('--interval', type=float, default=5, help='seconds between polls (dashboard: 5)')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--change-every', type=float, default=5, help='seconds between config.json edits')
+    parser.add_argument('--cdps', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gevent')
+    parser.add_argument('--json', default='', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = setup_environment(workdir, args.cdps)
+        config = make_config(args.cdps)
+        import database
+        database.init_db()
+
+        results = {}
+        print(f"{'kiosks':>7s} {'req/s':>8s} {'poll p50':>9s} {'poll p99':>9s} "
+              f"{'dash p50':>9s} {'dash p99':>9s} {'304s':>6s} {'errors':>7s}")
+        for kiosks in args.kiosks:
+            with gunicorn_server(args.workers, args.worker_class, CONFIG_WATCH_INTERVAL_SECONDS='0.25') as port:
+                result = run(port, kiosks, args.interval, args.duration, config_path, config, args.change_every)
+            results[f'{kiosks}_kiosks'] = result
+            print(f"{kiosks:7d} {result['requests_per_second']:8.1f} "
+                  f"{result['last_modified_p50_ms']:9.2f} {result['last_modified_p99_ms']:9.2f} "
+                  f"{result['dashboard_p50_ms']:9.2f} {result['dashboard_p99_ms']:9.2f} "
+                  f"{result['not_modified']:6d} {result['errors']:7d}")
+
+        write_results(args.json, 'endpoints', results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Load-test the read endpoints while N kiosks react to data changes at once.
+
+Starts the production server (gunicorn.conf.py) on a throwaway offline
+database and edits config.json every --change-every seconds. Like the
+dashboard notified over SSE, every kiosk learns about each new data version
+at the same moment, waits a random delay of up to --jitter seconds (the
+dashboard's REFRESH_JITTER_MS) and reloads --paths. The p99 latency of
+these reloads is compared with the one of a single idle client: with the
+single-flight microcache it should stay flat.
+
+Cases: microcache off without jitter, microcache on without jitter, and
+microcache on with the dashboard's jitter.
+
+Usage: python benchmarks/bench_herd.py [--kiosks 100] [--changes 5] [--json out.json]
+"""
+import argparse
+import http.client
+import json
+import random
+import tempfile
+import threading
+import time
+
+from common import gunicorn_server, make_config, setup_environment, summarize, write_config, write_results
+
+CASES = {
+    'no_microcache': {'ttl': '0', 'jitter': False},
+    'microcache': {'ttl': '1', 'jitter': False},
+    'microcache_jitter': {'ttl': '1', 'jitter': True},
+}
+
+def get(conn, path):
+    conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+class Kiosk(threading.Thread):
+    """One screen: waits for change notifications and reloads paths on its own connection."""
+
+    def __init__(self, port, paths, jitter, changed, stop):
+        super().__init__(daemon=True)
+        self.port = port
+        self.paths = paths
+        self.jitter = jitter
+        self.changed = changed
+        self.stop = stop
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        seen = 0
+        while not self.stop.is_set():
+            with self.changed:
+                self.changed.wait_for(lambda: self.changed.version != seen or self.stop.is_set())
+                seen = self.changed.version
+            if self.stop.is_set():
+                break
+            time.sleep(random.uniform(0, self.jitter))
+            for path in self.paths:
+                start = time.perf_counter()
+                # Like browsers, retry once on a new connection when the server closed an idle keep-alive one
+                for retry in (True, False):
+                    try:
+                        status = get(conn, path)
+                        break
+                    except OSError:
+                        conn.close()
+                        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+                        if not retry:
+                            status = None
+                if status is None:
+                    self.errors += 1
+                    continue
+                self.latencies.append(time.perf_counter() - start)
+                self.errors += status >= 400
+        conn.close()
+
+def idle_latencies(port, paths, repeat):
+    """Latencies of one client reloading paths with nobody else around."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies = []
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            get(conn, path)
+            latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies
+
+def wait_for_version(port, version, timeout=30):
+    """Wait until the server serves a data version other than version, and return it."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        conn.request('GET', '/api/last-modified')
+        current = json.loads(conn.getresponse().read())['last_modified']
+        if current != version:
+            return current
+        time.sleep(0.02)
+    raise RuntimeError("The data change was not picked up")
+
+def run(port, kiosks, paths, jitter, changes, change_every, config_path, config):
+    """Run one case: idle latencies, then kiosks reacting to changes."""
+    idle = idle_latencies(port, paths, 20)
+
+    changed = threading.Condition()
+    changed.version = 0
+    stop = threading.Event()
+    threads = [Kiosk(port, paths, jitter, changed, stop) for _ in range(kiosks)]
+    for thread in threads:
+        thread.start()
+
+    version = wait_for_version(port, None)
+    for _ in range(changes):
+        config['chiffre_affaire_total'] += 1000
+        config['chefs_projet'][0]['chiffre_affaire'] += 1000
+        write_config(config_path, config)
+        version = wait_for_version(port, version)
+        # Every kiosk is notified at once, like SSE clients
+        with changed:
+            changed.version += 1
+            changed.notify_all()
+        time.sleep(change_every)
+
+    stop.set()
+    with changed:
+        changed.notify_all()
+    for thread in threads:
+        thread.join()
+
+    result = {'kiosks': kiosks, 'changes': changes}
+    result.update({f'idle_{key}': value for key, value in summarize(idle).items()})
+    burst = [latency for thread in threads for latency in thread.latencies]
+    result.update({f'burst_{key}': value for key, value in summarize(burst).items()})
+    result['errors'] = sum(thread.errors for thread in threads)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--kiosks', type=int, default=100)
+    parser.add_argument('--cdps', type=int, default=1000)
+    parser.add_argument('--paths', nargs='+', default=['/api/kpi', '/api/cdp', '/api/last-update', '/api/history'])
+    parser.add_argument('--changes', type=int, default=5)
+    parser.add_argument('--change-every', type=float, default=4, help='seconds between config.json edits')
+    parser.add_argument('--jitter', type=float, default=2, help='max refresh delay (dashboard: 2 s)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gevent')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--json', default='', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = setup_environment(workdir, args.cdps)
+        config = make_config(args.cdps)
+        import database
+        database.init_db()
+
+        results = {}
+        print(f"{'case':>18s} {'idle p99':>9s} {'burst p50':>10s} {'burst p99':>10s} {'errors':>7s}")
+        for case in args.cases:
+            settings = CASES[case]
+            with gunicorn_server(args.workers, args.worker_class, MICROCACHE_TTL_SECONDS=settings['ttl'],
+                                 CONFIG_WATCH_INTERVAL_SECONDS='0.1') as port:
+                result = run(port, args.kiosks, args.paths, args.jitter if settings['jitter'] else 0,
+                             args.changes, args.change_every, config_path, config)
+            results[case] = result
+            print(f"{case:>18s} {result['idle_p99_ms']:9.2f} {result['burst_p50_ms']:10.2f} "
+                  f"{result['burst_p99_ms']:10.2f} {result['errors']:7d}")
+
+        write_results(args.json, 'herd', results)
+
+if __name__ == '__main__':
+    main()
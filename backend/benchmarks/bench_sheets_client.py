@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Exercise the cached Google Sheets client against the local fake server.
+
+Checks that concurrent fetches of the same range are coalesced into one
+HTTP request, that 429/5xx answers are retried until success, and compares
+the time of a first fetch (service build) with later ones.
+
+Usage: python benchmarks/bench_sheets_client.py [--concurrent 10]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import common  # noqa: F401 (puts the backend on sys.path)
+from fake_sheets import FakeSheets, make_values
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrent', type=int, default=10)
+    parser.add_argument('--fetches', type=int, default=50)
+    args = parser.parse_args()
+
+    fake = FakeSheets({'Sheet1': make_values(100)})
+    os.environ['GOOGLE_SHEETS_API_ENDPOINT'] = fake.start()
+    os.environ['GOOGLE_SHEETS_RETRY_BASE_SECONDS'] = '0.05'
+    import google_sheets
+
+    failures = []
+
+    start = time.perf_counter()
+    data = google_sheets.fetch_kpi_data('fake-id', 'Sheet1!A1:C200')
+    first = time.perf_counter() - start
+    if len(data['cdp_list']) != 100:
+        failures.append(f"expected 100 CDPs, got {len(data['cdp_list'])}")
+
+    start = time.perf_counter()
+    for _ in range(args.fetches):
+        google_sheets.fetch_kpi_data('fake-id', 'Sheet1!A1:C200')
+    cached = (time.perf_counter() - start) / args.fetches
+    print(f"first fetch (service build): {first * 1000:.1f} ms, cached fetch: {cached * 1000:.1f} ms")
+
+    # Coalescing: concurrent callers share one in-flight request
+    fake.requests = 0
+    fake.delay = 0.3
+    threads = [
+        threading.Thread(target=google_sheets.fetch_kpi_data, args=('fake-id', 'Sheet1!A1:C200'))
+        for _ in range(args.concurrent)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    fake.delay = 0
+    print(f"{args.concurrent} concurrent fetches -> {fake.requests} HTTP request(s)")
+    if fake.requests != 1:
+        failures.append(f"expected 1 coalesced request, got {fake.requests}")
+
+    # Retries: two 503s then a 429 before the fetch succeeds
+    fake.requests = 0
+    fake.fail_next, fake.fail_status = 2, 503
+    google_sheets.fetch_kpi_data('fake-id', 'Sheet1!A1:C200')
+    fake.fail_next, fake.fail_status = 1, 429
+    google_sheets.fetch_kpi_data('fake-id', 'Sheet1!A1:C200')
+    print(f"fetches with injected 503/503/429 -> {fake.requests} HTTP requests")
+    if fake.requests != 5:
+        failures.append(f"expected 5 requests with retries, got {fake.requests}")
+
+    fake.stop()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
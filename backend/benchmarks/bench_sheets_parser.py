@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Measure the paged Google Sheets reader on a large synthetic sheet.
+
+Streams a 50k-row sheet from the local fake server, page by page and as a
+single page, and reports time, request count and tracemalloc peak. Also
+checks that several tabs are read with one batchGet, that malformed rows are
+reported, and times the number parser against the old replace() chain.
+
+Usage: python benchmarks/bench_sheets_parser.py [--rows 50000] [--page-rows 5000]
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+
+import common  # noqa: F401 (puts the backend on sys.path)
+from fake_sheets import FakeSheets, make_values
+
+def measure(func):
+    """Run func() under tracemalloc and return (result, seconds, peak MiB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--page-rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    broken = make_values(3)
+    broken[1][2] = 'n/a'
+    broken[2] = broken[2][:2]
+    fake = FakeSheets({
+        'Big': make_values(args.rows),
+        'Pole1': make_values(10, seed=1),
+        'Pole2': make_values(20, seed=2),
+        'Broken': broken
+    })
+    os.environ['GOOGLE_SHEETS_API_ENDPOINT'] = fake.start()
+    import google_sheets
+
+    failures = []
+    big_range = 'Big!A1:C'
+
+    def count_rows():
+        return sum(1 for _ in google_sheets.iter_rows('fake-id', [big_range]))
+
+    print(f"{'mode':<22s} {'rows':>8s} {'requests':>9s} {'seconds':>8s} {'peak MiB':>9s}")
+    peaks = {}
+    for label, page_rows, func in [
+        ('stream, paged', args.page_rows, count_rows),
+        ('stream, single page', 10 ** 9, count_rows),
+        ('parse, paged', args.page_rows, lambda: len(google_sheets.parse_rows(
+            google_sheets.iter_rows('fake-id', [big_range]))['cdp_list'])),
+    ]:
+        google_sheets.PAGE_ROWS = page_rows
+        func()  # warm up (service, connection, lazy imports)
+        fake.requests = 0
+        rows, elapsed, peak = measure(func)
+        peaks[label] = peak
+        print(f"{label:<22s} {rows:8d} {fake.requests:9d} {elapsed:8.2f} {peak:9.1f}")
+    google_sheets.PAGE_ROWS = args.page_rows
+
+    if peaks['stream, paged'] * 2 > peaks['stream, single page']:
+        failures.append("paged streaming did not bound memory")
+
+    # Several tabs in one batchGet (after spreadsheets.get for the size of the
+    # open-ended Pole2!A:C), totals summed, malformed rows reported
+    fake.requests = 0
+    data = google_sheets.fetch_kpi_data('fake-id', 'Pole1!A1:C100;Pole2!A:C;Broken!A1:C10')
+    print(f"3 tabs -> {fake.requests} request(s), {len(data['cdp_list'])} CDPs, "
+          f"total {data['total']}, {data['rejected']['count']} rejected")
+    for row in data['rejected']['rows']:
+        print(f"  rejected {row['range']} row {row['row']}: {row['reason']}")
+    expected_total = sum(float(values[-1][2].replace(' €', '')) for values in (
+        fake.sheets['Pole1'], fake.sheets['Pole2'], fake.sheets['Broken']))
+    if fake.requests != 2:
+        failures.append(f"expected 2 requests (spreadsheets.get and 1 batchGet), got {fake.requests}")
+    if len(data['cdp_list']) != 31 or data['rejected']['count'] != 2:
+        failures.append("unexpected CDP or rejected row count")
+    if data['total'] != expected_total:
+        failures.append(f"expected total {expected_total}, got {data['total']}")
+
+    # Number parsing
+    for label, samples in [('formatted', ['12 345,50 €', '1 234,5', '987'] * 30000),
+                           ('unformatted', [12345.5, 1234.5, 987] * 30000)]:
+        new = timeit.timeit(lambda: [google_sheets.parse_number(value) for value in samples], number=1)
+        old = timeit.timeit(lambda: [
+            float(str(value).replace(',', '.').replace(' ', '').replace('€', '')) for value in samples
+        ], number=1)
+        print(f"parse_number, {label} values: {new / len(samples) * 1e9:.0f} ns/value "
+              f"(old replace chain: {old / len(samples) * 1e9:.0f} ns/value)")
+    for text, expected in [('12 345,50 €', 12345.5), ('12,345.50', 12345.5), ('1.234,5', 1234.5),
+                           ('1,234,567', 1234567.0), ('-3,25', -3.25), (42, 42.0)]:
+        if google_sheets.parse_number(text) != expected:
+            failures.append(f"parse_number({text!r}) != {expected}")
+
+    fake.stop()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark the read endpoints before and after the in-memory snapshot.
+
+"before" serves each endpoint straight from SQLite like the original
+handlers did, "after" goes through the real app and its snapshot.
+
+Usage: python benchmarks/bench_snapshot.py [--requests 2000]
+"""
+import argparse
+import tempfile
+import time
+
+from common import setup_environment
+
+ENDPOINTS = ['/api/kpi', '/api/cdp', '/api/last-update', '/api/objectif', '/api/autres-objectifs']
+
+def make_legacy_app():
+    """Build an app whose handlers query SQLite on every request."""
+    from flask import Flask, jsonify
+    import database
+
+    legacy = Flask('legacy')
+
+    @legacy.route('/api/kpi')
+    def kpi():
+        return jsonify(database.get_latest_kpi_global() or {'chiffre_affaire': 0, 'timestamp': None})
+
+    @legacy.route('/api/cdp')
+    def cdp():
+        return jsonify(database.get_all_chefs_projet())
+
+    @legacy.route('/api/last-update')
+    def last_update():
+        return jsonify({'last_update': database.get_last_update()})
+
+    @legacy.route('/api/objectif')
+    def objectif():
+        return jsonify({'objectif_annuel': database.get_objectif_annuel()})
+
+    @legacy.route('/api/autres-objectifs')
+    def autres_objectifs():
+        return jsonify(database.get_all_autres_objectifs())
+
+    return legacy
+
+def measure(client, path, requests):
+    """Return the requests/sec achieved on one endpoint."""
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+    return requests / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_environment(workdir)
+        import database
+        import app as backend
+
+        database.init_db()
+        backend.sync_data_from_sheets()
+
+        before = make_legacy_app().test_client()
+        after = backend.app.test_client()
+
+        print(f"{'endpoint':24s} {'before req/s':>14s} {'after req/s':>14s} {'speedup':>8s}")
+        for path in ENDPOINTS:
+            rps_before = measure(before, path, args.requests)
+            rps_after = measure(after, path, args.requests)
+            print(f"{path:24s} {rps_before:14.0f} {rps_after:14.0f} {rps_after / rps_before:7.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Measure how long the backend takes to start serving the dashboard.
+
+"import" times `import app` in a fresh interpreter (offline mode, so the
+Google client libraries must not be loaded). "cold" and "warm" start the
+production server (gunicorn.conf.py) on a synced database and time the
+first successful /api/dashboard, without and with the snapshot saved by the
+previous run (see snapshot.warm_start).
+
+Usage: python benchmarks/bench_startup.py [--cdps 2000] [--repeat 5] [--json out.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, free_port, setup_environment, summarize, write_results
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'google_imported': any(name.startswith(('googleapiclient', 'google.oauth2')) for name in sys.modules)
+}))
+'''
+
+def time_import():
+    """Return (seconds, google_imported) of importing app in a new interpreter."""
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT], cwd=BACKEND_DIR, env=os.environ,
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['seconds'], result['google_imported']
+
+def time_first_dashboard(workers, worker_class, timeout=60):
+    """Start gunicorn and return the seconds until /api/dashboard first answers 200, and its version."""
+    port = free_port()
+    env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_BIND=f'127.0.0.1:{port}')
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:create_app()'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+                conn.request('GET', '/api/dashboard')
+                response = conn.getresponse()
+                body = response.read()
+                if response.status == 200:
+                    return time.perf_counter() - start, json.loads(body)['version']
+            except OSError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Server on port {port} did not serve the dashboard")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cdps', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gevent')
+    parser.add_argument('--json', default='', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_environment(workdir, args.cdps)
+        db_path = os.environ['DATABASE_PATH']
+
+        results = {}
+        samples = [time_import() for _ in range(args.repeat)]
+        results['import'] = dict(summarize([seconds for seconds, _ in samples]),
+                                 google_imported=any(imported for _, imported in samples))
+
+        # Sync once in this process: the database holds the data and its saved snapshot
+        import app
+        import database
+        import tenants
+        database.init_db()
+        with tenants.use(tenants.default()):
+            version = app.sync_data_from_sheets()['version']
+        database.close_db_connection()
+
+        for case in ('cold', 'warm'):
+            seconds = []
+            for _ in range(args.repeat):
+                if case == 'cold':
+                    with sqlite3.connect(db_path) as conn:
+                        conn.execute('DELETE FROM snapshot_cache')
+                elapsed, served = time_first_dashboard(args.workers, args.worker_class)
+                if served != version:
+                    raise RuntimeError(f"Served version {served}, expected {version}")
+                seconds.append(elapsed)
+            results[case] = summarize(seconds)
+
+        print(f"{'case':>8s} {'p50 ms':>9s} {'max ms':>9s}")
+        for case, result in results.items():
+            print(f"{case:>8s} {result['p50_ms']:9.1f} {result['max_ms']:9.1f}")
+        print(f"Google client imported in offline mode: {results['import']['google_imported']}")
+
+        write_results(args.json, 'startup', results)
+
+if __name__ == '__main__':
+    main()
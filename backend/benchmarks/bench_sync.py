@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Time sync_data_from_sheets on config.json and fake Google Sheets sources.
+
+For each source and size (10, 100 and 10k CDPs by default), times the first
+sync of an empty database, a sync of unchanged data and a sync where one CDP
+revenue changed, split into the fetch (read, parse, hash), write and
+publish phases reported by the sync's progress callback.
+
+Usage: python benchmarks/bench_sync.py [--sizes 10 100 10000] [--repeat 5] [--json out.json]
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+from common import make_config, setup_environment, summarize, write_config, write_results
+from fake_sheets import FakeSheets, make_values
+
+def timed_sync(app):
+    """Run one sync and return (status, {phase: seconds, 'total': seconds})."""
+    marks = [('start', time.perf_counter())]
+    result = app.sync_data_from_sheets(lambda phase: marks.append((phase, time.perf_counter())))
+    marks.append(('end', time.perf_counter()))
+    phases = {name: end - start for (name, start), (_, end) in zip(marks[1:], marks[2:])}
+    phases['total'] = marks[-1][1] - marks[0][1]
+    return result['status'], phases
+
+def run_case(app, repeat, change):
+    """Time the first, unchanged and one-change syncs of the current tenant."""
+    results = {}
+    status, phases = timed_sync(app)
+    if status != 'success':
+        raise RuntimeError(f"First sync failed: {status}")
+    results['first'] = {f'{phase}_ms': seconds * 1000 for phase, seconds in phases.items()}
+
+    for name, before in [('unchanged', lambda i: None), ('one_change', change)]:
+        runs = []
+        for i in range(repeat):
+            before(i)
+            status, phases = timed_sync(app)
+            expected = 'unchanged' if name == 'unchanged' else 'success'
+            if status != expected:
+                raise RuntimeError(f"{name} sync returned {status}, expected {expected}")
+            runs.append(phases)
+        result = summarize([run['total'] for run in runs])
+        for phase in ('fetch', 'write', 'publish'):
+            seconds = [run[phase] for run in runs if phase in run]
+            if seconds:
+                result[f'{phase}_p50_ms'] = summarize(seconds)['p50_ms']
+        results[name] = result
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', default='', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    fake = FakeSheets({f'S{size}': make_values(size) for size in args.sizes})
+    os.environ['GOOGLE_SHEETS_API_ENDPOINT'] = fake.start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_environment(workdir)
+        import app
+        import database
+        import tenants
+
+        results = {}
+        print(f"{'case':<26s} {'first ms':>9s} {'unchanged p50':>14s} {'one change p50':>15s} "
+              f"{'fetch':>8s} {'write':>8s} {'publish':>8s}")
+        for size in args.sizes:
+            config_path = os.path.join(workdir, f'config-{size}.json')
+            config = make_config(size)
+            write_config(config_path, config)
+            values = fake.sheets[f'S{size}']
+
+            def change_config(i, config=config, config_path=config_path):
+                config['chefs_projet'][0]['chiffre_affaire'] += 1
+                write_config(config_path, config)
+
+            def change_sheet(i, size=size, values=values):
+                values = copy.copy(values)
+                values[1] = values[1][:2] + [f'{i + 1},25 €']
+                fake.sheets[f'S{size}'] = values
+
+            for source, offline, change in [('config', True, change_config), ('sheets', False, change_sheet)]:
+                tenant = tenants.Tenant(
+                    name=f'{source}-{size}',
+                    offline_mode=offline,
+                    spreadsheet_id='bench',
+                    sheet_range=f'S{size}!A1:C',
+                    config_file_path=config_path,
+                    database_path=os.path.join(workdir, f'{source}-{size}.db'),
+                    update_interval_minutes=15
+                )
+                with tenants.use(tenant):
+                    database.init_db()
+                    case = run_case(app, args.repeat, change)
+                for name, result in case.items():
+                    results[f'{source}_{size}_{name}'] = result
+                print(f"{tenant.name:<26s} {case['first']['total_ms']:9.1f} "
+                      f"{case['unchanged']['p50_ms']:14.1f} {case['one_change']['p50_ms']:15.1f} "
+                      f"{case['one_change']['fetch_p50_ms']:8.1f} {case['one_change']['write_p50_ms']:8.1f} "
+                      f"{case['one_change'].get('publish_p50_ms', 0):8.1f}")
+
+        database.close_db_connection()
+        write_results(args.json, 'sync', results)
+
+    fake.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Helpers shared by the benchmark scripts."""
+import datetime
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def make_config(cdp_count=30, objectif_count=5, seed=0):
+    """Build a config.json payload with cdp_count chefs de projet."""
+    return {
+        'objectif_annuel': 100000,
+        'objectif_decembre': 42000,
+        'wr': 81000,
+        'chiffre_affaire_total': 50000 + seed,
+        'autres_objectifs': [{'nom': f'Objectif {i}', 'valeur': i * 1000} for i in range(objectif_count)],
+        'chefs_projet': [{
+            'nom': f'Nom{i}',
+            'prenom': f'Prenom{i}',
+            'chiffre_affaire': i * 250 + seed,
+            'photo_filename': f'cdp_{i}.jpg'
+        } for i in range(cdp_count)]
+    }
+
+def write_config(path, config):
+    """Write a config.json payload."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+def setup_environment(workdir, cdp_count=30):
+    """
+    Point the backend at a throwaway database and config.json in workdir.
+
+    Must run before the backend modules are imported, since they read their
+    configuration from the environment at import time.
+    """
+    config_path = os.path.join(workdir, 'config.json')
+    write_config(config_path, make_config(cdp_count))
+
+    os.environ['OFFLINE_MODE'] = 'true'
+    os.environ['CONFIG_FILE_PATH'] = config_path
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+    return config_path
+
+def percentile(values, pct):
+    """Return the pct-th percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(seconds):
+    """Return the usual latency statistics of a list of durations, in milliseconds."""
+    return {
+        'count': len(seconds),
+        'mean_ms': sum(seconds) / len(seconds) * 1000 if seconds else 0.0,
+        'p50_ms': percentile(seconds, 50) * 1000,
+        'p95_ms': percentile(seconds, 95) * 1000,
+        'p99_ms': percentile(seconds, 99) * 1000,
+        'max_ms': max(seconds) * 1000 if seconds else 0.0
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_metadata():
+    """Describe the run: date, commit and machine, to tell which results are comparable."""
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+def write_results(path, benchmark, results, meta=None):
+    """
+    Write benchmark results as JSON, with what is needed to compare runs.
+
+    Args:
+        path: Output file ('' to skip)
+        benchmark: Name of the benchmark, or None when results already maps
+            benchmark names to their results (a whole suite)
+        results: dict of case name -> dict of metric -> number (see compare.py)
+        meta: Run metadata (default: run_metadata())
+    """
+    if not path:
+        return
+    document = {
+        'meta': meta or run_metadata(),
+        'benchmarks': results if benchmark is None else {benchmark: results}
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+
+def free_port():
+    """Return a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(port, timeout=30):
+    """Wait for the server to answer /api/health."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+@contextmanager
+def gunicorn_server(workers=2, worker_class='gevent', **env):
+    """Run the production server (gunicorn.conf.py) on a free port and yield the port."""
+    port = free_port()
+    env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_BIND=f'127.0.0.1:{port}', **env)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:create_app()'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_up(port)
+        time.sleep(1)  # let every worker finish starting
+        yield port
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files and report regressions.
+
+Timings (*_ms) are better when lower, throughputs (*_per_second) when
+higher, and errors should stay at zero. A change counts as a regression
+when it is worse by more than --threshold percent and, for timings, by more
+than --min-ms (sub-millisecond timings are noisy on a Raspberry Pi).
+Exits with status 1 when there is a regression.
+
+Usage: python benchmarks/compare.py baseline.json current.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+# Maxima are single samples: too noisy to fail a run on
+IGNORED_SUFFIXES = ('max_ms',)
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def direction(metric):
+    """Return 1 if higher is better, -1 if lower is better, None if not compared."""
+    if metric.endswith(IGNORED_SUFFIXES):
+        return None
+    if metric.endswith('per_second'):
+        return 1
+    if metric.endswith('_ms') or metric == 'errors':
+        return -1
+    return None
+
+def compare(baseline, current, threshold, min_ms):
+    """Yield (name, before, after, change %, regression) for every compared metric."""
+    for benchmark, cases in sorted(current['benchmarks'].items()):
+        for case, metrics in sorted(cases.items()):
+            before_metrics = baseline['benchmarks'].get(benchmark, {}).get(case)
+            if before_metrics is None:
+                continue
+            for metric, after in sorted(metrics.items()):
+                before = before_metrics.get(metric)
+                sign = direction(metric)
+                if sign is None or not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+                    continue
+                change = (after - before) / before * 100 if before else (0.0 if after == before else float('inf'))
+                worse = -sign * change > threshold
+                if metric.endswith('_ms') and abs(after - before) < min_ms:
+                    worse = False
+                if metric == 'errors':
+                    worse = after > before
+                yield f'{benchmark}.{case}.{metric}', before, after, change, worse
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10, help='percent')
+    parser.add_argument('--min-ms', type=float, default=0.5, help='ignore timing changes below this')
+    parser.add_argument('--all', action='store_true', help='list every metric, not only the changes')
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    print(f"baseline: {baseline['meta'].get('commit')} ({baseline['meta'].get('date')}), "
+          f"current: {current['meta'].get('commit')} ({current['meta'].get('date')})")
+    if baseline['meta'].get('machine') != current['meta'].get('machine'):
+        print("warning: results come from different machines")
+
+    regressions = 0
+    for name, before, after, change, worse in compare(baseline, current, args.threshold, args.min_ms):
+        regressions += worse
+        if worse or args.all or abs(change) > args.threshold:
+            flag = 'REGRESSION' if worse else ''
+            print(f"{name:<60s} {before:12.3f} -> {after:12.3f} {change:+8.1f}% {flag}")
+
+    print(f"{regressions} regression(s) above {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
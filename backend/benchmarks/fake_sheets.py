@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Google Sheets API values endpoints and spreadsheets.get.
+
+Point the backend at it with GOOGLE_SHEETS_API_ENDPOINT=http://127.0.0.1:<port>/
+(credentials are not needed in that case).
+
+Usage: python benchmarks/fake_sheets.py [--port 8085] [--rows 100]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+def make_values(rows, seed=0):
+    """Build a sheet with a header, `rows` CDP rows and a JEECE total row."""
+    values = [['Nom', 'Prénom', "Chiffre d'Affaires"]]
+    total = 0
+    for i in range(rows):
+        amount = (i * 137 + seed) % 20000
+        total += amount
+        values.append([f'Nom{i}', f'Prenom{i}', f'{amount:,}'.replace(',', ' ') + ',50 €'])
+    values.append(['JEECE', 'TOTAL', f'{total} €'])
+    return values
+
+class FakeSheets:
+    """
+    A fake Sheets server holding one grid of values per sheet name.
+
+    Attributes:
+        sheets: dict mapping sheet name to a list of rows
+        fail_next: Number of upcoming requests to answer with fail_status
+        fail_status: HTTP status used for injected failures
+        delay: Seconds to wait before answering each request
+        requests: Number of requests received
+    """
+
+    def __init__(self, sheets=None):
+        self.sheets = sheets if sheets is not None else {'Sheet1': make_values(100)}
+        self.fail_next = 0
+        self.fail_status = 503
+        self.delay = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self, port=0):
+        """Serve in a background thread and return the endpoint URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}/"
+
+    def stop(self):
+        """Stop serving."""
+        self.server.shutdown()
+
+    def get_range(self, range_name):
+        """Resolve 'Sheet!A1:C10' (rows only, columns are ignored) to values."""
+        sheet, _, cells = range_name.rpartition('!')
+        values = self.sheets.get(sheet.strip("'") or 'Sheet1', [])
+        if ':' not in cells:
+            return values
+        first, last = cells.split(':')
+        start = int(''.join(c for c in first if c.isdigit()) or 1)
+        end = int(''.join(c for c in last if c.isdigit()) or len(values))
+        return values[start - 1:end]
+
+    def handle(self, handler):
+        with self.lock:
+            self.requests += 1
+            fail = self.fail_next > 0
+            if fail:
+                self.fail_next -= 1
+        if self.delay:
+            time.sleep(self.delay)
+
+        if fail:
+            return self.respond(handler, self.fail_status, {'error': {'code': self.fail_status, 'message': 'Injected failure'}})
+
+        url = urlparse(handler.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        # v4/spreadsheets/{id}: the tabs and their size
+        if len(parts) == 3 and parts[:2] == ['v4', 'spreadsheets']:
+            return self.respond(handler, 200, {
+                'sheets': [{
+                    'properties': {'title': name, 'gridProperties': {'rowCount': len(values), 'columnCount': 3}}
+                } for name, values in self.sheets.items()]
+            })
+        # v4/spreadsheets/{id}/values/{range}
+        if len(parts) == 5 and parts[:2] == ['v4', 'spreadsheets'] and parts[3] == 'values':
+            range_name = parts[4]
+            return self.respond(handler, 200, {
+                'range': range_name,
+                'majorDimension': 'ROWS',
+                'values': self.get_range(range_name)
+            })
+        # v4/spreadsheets/{id}/values:batchGet?ranges=...
+        if len(parts) == 4 and parts[:2] == ['v4', 'spreadsheets'] and parts[3] == 'values:batchGet':
+            query = [pair.split('=', 1) for pair in url.query.split('&') if pair]
+            ranges = [unquote(value.replace('+', ' ')) for key, value in query if key == 'ranges']
+            return self.respond(handler, 200, {
+                'valueRanges': [{
+                    'range': range_name,
+                    'majorDimension': 'ROWS',
+                    'values': self.get_range(range_name)
+                } for range_name in ranges]
+            })
+        return self.respond(handler, 404, {'error': {'code': 404, 'message': 'Not found'}})
+
+    def respond(self, handler, status, body):
+        data = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--rows', type=int, default=100)
+    args = parser.parse_args()
+
+    fake = FakeSheets({'Sheet1': make_values(args.rows)})
+    print(f"Fake Sheets API listening on {fake.start(args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == '__main__':
+    main()
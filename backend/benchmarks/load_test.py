@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Load-test the production server with an increasing number of workers.
+
+For each worker count, starts gunicorn (gunicorn.conf.py) on a throwaway
+database, hammers /api/dashboard from several client processes using
+keep-alive connections, and reports throughput and latency.
+
+Usage: python benchmarks/load_test.py [--workers 1 2 4] [--clients 4] [--duration 10] [--json out.json]
+"""
+import argparse
+import http.client
+import multiprocessing
+import tempfile
+import time
+
+from common import gunicorn_server, percentile, setup_environment, write_results
+
+def client(args):
+    """Send requests over keep-alive connections until the deadline."""
+    port, path, connections, deadline = args
+    conns = [http.client.HTTPConnection('127.0.0.1', port, timeout=10) for _ in range(connections)]
+    latencies, errors = [], 0
+    i = 0
+    while time.time() < deadline:
+        conn = conns[i % connections]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+        except OSError:
+            errors += 1
+            conns[(i - 1) % connections] = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+def run(workers, worker_class, clients, connections, duration, path):
+    """Start gunicorn with the given workers and measure one load run."""
+    with gunicorn_server(workers, worker_class) as port:
+        deadline = time.time() + duration
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client, [(port, path, connections, deadline)] * clients)
+
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    return {
+        'workers': workers,
+        'requests_per_second': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': errors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--worker-class', default='gevent')
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--connections', type=int, default=8, help='keep-alive connections per client')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--path', default='/api/dashboard')
+    parser.add_argument('--json', default='', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_environment(workdir)
+        import database
+        database.init_db()
+
+        results = {}
+        print(f"{'workers':>8s} {'req/s':>10s} {'p50 ms':>8s} {'p99 ms':>8s} {'errors':>7s}")
+        for workers in args.workers:
+            result = run(workers, args.worker_class, args.clients, args.connections, args.duration, args.path)
+            results[f'{workers}_workers'] = result
+            print(f"{result['workers']:8d} {result['requests_per_second']:10.0f} "
+                  f"{result['p50_ms']:8.1f} {result['p99_ms']:8.1f} {result['errors']:7d}")
+        write_results(args.json, 'load_test', results)
+
+if __name__ == '__main__':
+    main()
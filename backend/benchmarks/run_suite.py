@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Run the benchmark suite and write its results to one JSON file.
+
+Runs bench_database.py (database functions on years of history),
+bench_sync.py (syncs of 10 to 10k CDPs), bench_endpoints.py (N kiosks
+polling the production server), bench_startup.py (time until the server
+serves the dashboard) and bench_herd.py (kiosks all refreshing after a
+change), each in its own process so they do not
+share imported modules, and merges their results in
+results/<date>-<commit>.json. With --baseline, compares the run with an
+earlier one (see compare.py).
+
+Usage: python benchmarks/run_suite.py [--quick] [--baseline results/old.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import run_metadata, write_results
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SUITE = {
+    'database': 'bench_database.py',
+    'sync': 'bench_sync.py',
+    'endpoints': 'bench_endpoints.py',
+    'startup': 'bench_startup.py',
+    'herd': 'bench_herd.py',
+}
+# Smaller runs, to check a change quickly (results are only comparable with other quick runs)
+QUICK_ARGS = {
+    'database': ['--years', '1', '--repeat', '50'],
+    'sync': ['--sizes', '10', '100', '1000', '--repeat', '3'],
+    'endpoints': ['--kiosks', '10', '50', '--duration', '10'],
+    'startup': ['--cdps', '500', '--repeat', '3'],
+    'herd': ['--kiosks', '50', '--changes', '2', '--cdps', '200'],
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=sorted(SUITE), help='run these benchmarks only')
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--out', default='', help='output file (default: results/<date>-<commit>.json)')
+    parser.add_argument('--baseline', default='', help='compare with this earlier result file')
+    args = parser.parse_args()
+
+    merged = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.only or SUITE:
+            output = os.path.join(workdir, f'{name}.json')
+            command = [sys.executable, os.path.join(BENCHMARKS_DIR, SUITE[name])]
+            if args.quick:
+                command += QUICK_ARGS[name]
+            print(f"== {name}: {' '.join(command[1:])}", flush=True)
+            subprocess.run(command + ['--json', output], cwd=os.path.dirname(BENCHMARKS_DIR), check=True)
+            with open(output, 'r', encoding='utf-8') as f:
+                merged.update(json.load(f)['benchmarks'])
+
+    meta = run_metadata()
+    out = args.out or os.path.join(BENCHMARKS_DIR, 'results', '{}-{}{}.json'.format(
+        meta['date'].replace(':', ''), meta['commit'] or 'unknown', '-quick' if args.quick else ''
+    ))
+    write_results(out, None, merged, meta)
+
+    if args.baseline:
+        sys.exit(subprocess.run(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, 'compare.py'), args.baseline, out]
+        ).returncode)
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ Check database schema and latest KPI values
 """
 import sqlite3
 import os
+import migrations
 
 DATABASE_PATH = os.getenv('DATABASE_PATH', '/app/data/jeece.db')
 
@@ -14,6 +15,9 @@ def check_database():
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
+    # Check schema version (see migrations.py)
+    print(f"\n=== SCHEMA VERSION: {migrations.schema_version(conn)} ===")
+
     # Check table schema
     print("\n=== KPI_GLOBAL TABLE SCHEMA ===")
     cursor.execute('PRAGMA table_info(kpi_global)')
@@ -23,7 +27,7 @@ def check_database():
 
     # Check latest KPI entry
     print("\n=== LATEST KPI ENTRY ===")
-    cursor.execute('SELECT * FROM kpi_global ORDER BY timestamp DESC LIMIT 1')
+    cursor.execute('SELECT * FROM kpi_global ORDER BY timestamp DESC, id DESC LIMIT 1')
     row = cursor.fetchone()
     if row:
         for key in row.keys():
@@ -0,0 +1,51 @@
+"""
+Watch config.json and trigger a reload shortly after it changes.
+
+A background thread compares the file's (mtime, size, inode) signature at a
+short interval and fires once the file has stayed unchanged for the debounce
+delay, so an editor writing the file in several steps only triggers a single
+reload of the complete file. Nothing is stat'ed on the request path.
+"""
+import os
+import threading
+import time
+
+def _signature(path):
+    """Return what identifies a version of the file, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def start(path, on_change, interval=0.25, debounce=0.5):
+    """
+    Call on_change() from a background thread after each change of path.
+
+    Args:
+        path: File to watch
+        on_change: Callback, called once per settled change
+        interval: Seconds between two checks
+        debounce: Seconds the file must stay unchanged before on_change fires
+    """
+    def watch():
+        last = _signature(path)
+        changed_at = None
+
+        while True:
+            time.sleep(interval)
+            current = _signature(path)
+
+            if current != last:
+                last = current
+                changed_at = time.monotonic()
+            elif changed_at is not None and current is not None and time.monotonic() - changed_at >= debounce:
+                changed_at = None
+                try:
+                    on_change()
+                except Exception as e:
+                    print(f"Config reload failed: {e}")
+
+    thread = threading.Thread(target=watch, name='config-watcher', daemon=True)
+    thread.start()
+    return thread
@@ -1,154 +1,419 @@
 import sqlite3
+import json
 import os
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
+import metrics
+import migrations
+import tenants
 
-DATABASE_PATH = os.getenv('DATABASE_PATH', '/app/data/jeece.db')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))
 
-def get_db_connection():
-    """Create a database connection."""
-    conn = sqlite3.connect(DATABASE_PATH)
+QUERY_SECONDS = metrics.Histogram(
+    'db_query_duration_seconds', 'Duration of the database functions, in seconds', ['function']
+)
+
+# Columns of the dashboard reads, all guaranteed by the migrations
+KPI_COLUMNS = ('chiffre_affaire', 'objectif_annuel', 'objectif_decembre', 'wr', 'timestamp')
+CDP_COLUMNS = ('id', 'nom', 'prenom', 'chiffre_affaire', 'photo_filename', 'timestamp',
+               'rank', 'previous_rank', 'chiffre_affaire_delta')
+OBJECTIF_COLUMNS = ('id', 'nom', 'valeur', 'timestamp')
+SYNC_JOB_COLUMNS = ('id', 'source', 'status', 'phase', 'phases', 'attached', 'created_at', 'started_at',
+                    'finished_at', 'duration_ms', 'result', 'error', 'pid', 'process')
+# Stored as JSON text
+SYNC_JOB_JSON_COLUMNS = ('phases', 'result')
+
+_local = threading.local()
+
+def _connect(path):
+    """Open a connection in WAL mode with the pragmas tuned for this workload."""
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    # WAL lets the sync job write while Flask threads keep reading
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    return conn
+
+def get_db_connection():
+    """
+    Get this thread's connection to the current tenant's database.
+
+    Connections are opened on first use, kept per thread and tenant database
+    and reused, so callers must not close them. A transaction left open by a
+    failed call is rolled back before the connection is handed out again.
+    """
+    path = tenants.current().database_path
+    conns = getattr(_local, 'conns', None)
+    if conns is None or _local.pid != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _connect(path)
+    elif conn.in_transaction:
+        conn.rollback()
     return conn
 
+def close_db_connection():
+    """Close this thread's database connections, if any."""
+    conns = getattr(_local, 'conns', None) or {}
+    _local.conns = None
+    for conn in conns.values():
+        conn.close()
+
+@metrics.timed(QUERY_SECONDS)
 def init_db():
-    """Initialize the database with required tables."""
+    """Bring the current tenant's database to the latest schema (see migrations.py)."""
     conn = get_db_connection()
-    cursor = conn.cursor()
+    for version, name in migrations.migrate(conn):
+        print(f"Database {tenants.current().database_path}: applied migration {version} ({name})")
 
-    # Table pour les KPI globaux
+def _bump_data_version(cursor):
+    """Increment the data version counter within the current transaction."""
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS kpi_global (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chiffre_affaire REAL NOT NULL,
-            objectif_annuel REAL DEFAULT 100000,
-            objectif_decembre REAL DEFAULT 0,
-            wr REAL DEFAULT 0,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
+        INSERT INTO app_state (key, value) VALUES ('data_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
     ''')
+    cursor.execute("SELECT value FROM app_state WHERE key = 'data_version'")
+    return cursor.fetchone()['value']
 
-    # Table pour les chefs de projet
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chef_projet (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nom TEXT NOT NULL,
-            prenom TEXT NOT NULL,
-            chiffre_affaire REAL NOT NULL,
-            photo_filename TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(nom, prenom)
-        )
-    ''')
+@metrics.timed(QUERY_SECONDS)
+def get_state(key, default=None):
+    """Get a value from the application state table."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT value FROM app_state WHERE key = ?', (key,))
+    row = cursor.fetchone()
 
-    # Table pour l'historique des mises à jour
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS update_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            status TEXT NOT NULL,
-            message TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    return row['value'] if row else default
 
-    # Table pour les autres objectifs
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS autres_objectifs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nom TEXT NOT NULL,
-            valeur REAL NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+@metrics.timed(QUERY_SECONDS)
+def save_snapshot(version, built_at, payload, payload_gzip, payload_br):
+    """
+    Keep the encoded dashboard payload of a data version for the next start.
 
+    Every process rebuilding a version stores the same payload: it is only
+    written again when the version is newer or the payload differs (built by
+    another version of the code).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO snapshot_cache (id, version, built_at, payload, payload_gzip, payload_br)
+        VALUES (1, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            version = excluded.version,
+            built_at = excluded.built_at,
+            payload = excluded.payload,
+            payload_gzip = excluded.payload_gzip,
+            payload_br = excluded.payload_br
+        WHERE excluded.version > snapshot_cache.version
+            OR (excluded.version = snapshot_cache.version AND excluded.payload != snapshot_cache.payload)
+    ''', (version, built_at, payload, payload_gzip, payload_br))
     conn.commit()
-    conn.close()
 
-def save_kpi_global(chiffre_affaire, objectif_annuel=100000, objectif_decembre=0, wr=0):
-    """Save global KPI data."""
+@metrics.timed(QUERY_SECONDS)
+def get_saved_snapshot():
+    """Get the last stored snapshot (version, built_at and payloads), or None."""
     conn = get_db_connection()
     cursor = conn.cursor()
+    cursor.execute('SELECT version, built_at, payload, payload_gzip, payload_br FROM snapshot_cache WHERE id = 1')
+    return cursor.fetchone()
+
+def _diff_kpi_global(cursor, data):
+    """Insert a global KPI row if one of the payload's values moved; return the rows changed."""
+    kpi = (
+        data['total'],
+        data.get('objectif_annuel', 100000),
+        data.get('objectif_decembre', 0),
+        data.get('wr', 0)
+    )
+    cursor.execute(
+        'SELECT chiffre_affaire, objectif_annuel, objectif_decembre, wr FROM kpi_global ORDER BY timestamp DESC, id DESC LIMIT 1'
+    )
+    row = cursor.fetchone()
+    if row is not None and tuple(row) == kpi:
+        return 0
     cursor.execute(
         'INSERT INTO kpi_global (chiffre_affaire, objectif_annuel, objectif_decembre, wr) VALUES (?, ?, ?, ?)',
-        (chiffre_affaire, objectif_annuel, objectif_decembre, wr)
+        kpi
     )
-    conn.commit()
-    conn.close()
+    return 1
 
-def get_latest_kpi_global():
-    """Get the latest global KPI."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _diff_chefs_projet(cursor, cdp_list, ts, keys=None):
+    """
+    Upsert changed chefs de projet and delete removed ones, keyed on (nom, prenom).
+
+    Every new or changed revenue is also appended to cdp_history at epoch ts.
+
+    Args:
+        keys: Only compare the chefs de projet with these (nom, prenom),
+            cdp_list holding those that remain (None: cdp_list is everyone)
+
+    Returns:
+        (rows_changed, deltas): deltas maps the (nom, prenom) of each new or
+        changed revenue to its change, None for a new chef de projet
+    """
+    if keys is None:
+        cursor.execute('SELECT id, nom, prenom, chiffre_affaire, photo_filename FROM chef_projet')
+        existing = {(row['nom'], row['prenom']): row for row in cursor.fetchall()}
+    else:
+        existing = {}
+        for key in keys:
+            cursor.execute(
+                'SELECT id, nom, prenom, chiffre_affaire, photo_filename FROM chef_projet WHERE nom = ? AND prenom = ?',
+                key
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                existing[key] = row
+
+    upserts, history, deltas = [], [], {}
+    for cdp in cdp_list:
+        key = (cdp['nom'], cdp['prenom'])
+        # Sources without photos (Google Sheets) leave the stored one; None clears it
+        has_photo = 'photo_filename' in cdp
+        photo_filename = cdp.get('photo_filename')
+        row = existing.pop(key, None)
+        revenue_changed = row is None or row['chiffre_affaire'] != cdp['chiffre_affaire']
+        photo_changed = has_photo and (row is None or photo_filename != row['photo_filename'])
+        if not revenue_changed and not photo_changed:
+            continue
+        upserts.append((cdp['nom'], cdp['prenom'], cdp['chiffre_affaire'], photo_filename, has_photo))
+        if revenue_changed:
+            history.append((cdp['nom'], cdp['prenom'], ts, cdp['chiffre_affaire']))
+            deltas[key] = None if row is None else cdp['chiffre_affaire'] - row['chiffre_affaire']
+
+    cursor.executemany('''
+        INSERT INTO chef_projet (nom, prenom, chiffre_affaire, photo_filename)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(nom, prenom)
+        DO UPDATE SET
+            chiffre_affaire = excluded.chiffre_affaire,
+            photo_filename = CASE WHEN ? THEN excluded.photo_filename ELSE chef_projet.photo_filename END,
+            timestamp = CURRENT_TIMESTAMP
+    ''', upserts)
+    cursor.executemany('DELETE FROM chef_projet WHERE id = ?', [(row['id'],) for row in existing.values()])
+    cursor.executemany(
+        'INSERT OR REPLACE INTO cdp_history (nom, prenom, ts, chiffre_affaire) VALUES (?, ?, ?, ?)',
+        history
+    )
+
+    return len(upserts) + len(existing), deltas
+
+def _update_leaderboard(cursor, deltas):
+    """
+    Store each chef de projet's rank and its changes since the previous version.
+
+    Ranks follow the revenue, ties broken by name so they are stable.
+    previous_rank is the rank before this sync (None when new) and
+    chiffre_affaire_delta the revenue change (0 when unchanged, None when
+    new). Only the rows whose values move are written.
+
+    Args:
+        deltas: Revenue changes of this sync, as returned by _diff_chefs_projet
+    """
+    cursor.execute('''
+        SELECT id, nom, prenom, rank, previous_rank, chiffre_affaire_delta FROM chef_projet
+        ORDER BY chiffre_affaire DESC, nom, prenom
+    ''')
+    updates = []
+    for rank, row in enumerate(cursor.fetchall(), start=1):
+        values = (rank, row['rank'], deltas.get((row['nom'], row['prenom']), 0))
+        if values != (row['rank'], row['previous_rank'], row['chiffre_affaire_delta']):
+            updates.append(values + (row['id'],))
+
+    cursor.executemany(
+        'UPDATE chef_projet SET rank = ?, previous_rank = ?, chiffre_affaire_delta = ? WHERE id = ?',
+        updates
+    )
+
+def _diff_autres_objectifs(cursor, objectifs):
+    """Insert, update or delete autres objectifs, matched by name in order."""
+    cursor.execute('SELECT id, nom, valeur FROM autres_objectifs ORDER BY id')
+    existing = {}
+    for row in cursor.fetchall():
+        existing.setdefault(row['nom'], []).append(row)
+
+    inserts, updates = [], []
+    for obj in objectifs:
+        rows = existing.get(obj['nom'])
+        if not rows:
+            inserts.append((obj['nom'], obj['valeur']))
+            continue
+        row = rows.pop(0)
+        if row['valeur'] != obj['valeur']:
+            updates.append((obj['valeur'], row['id']))
+    deletes = [(row['id'],) for rows in existing.values() for row in rows]
+
+    cursor.executemany('INSERT INTO autres_objectifs (nom, valeur) VALUES (?, ?)', inserts)
+    cursor.executemany(
+        'UPDATE autres_objectifs SET valeur = ?, timestamp = CURRENT_TIMESTAMP WHERE id = ?',
+        updates
+    )
+    cursor.executemany('DELETE FROM autres_objectifs WHERE id = ?', deletes)
+
+    return len(inserts) + len(updates) + len(deletes)
+
+def _patch_autres_objectifs(cursor, operations):
+    """
+    Apply (op, nom, valeur) objective operations, in order.
+
+    Like _diff_autres_objectifs, an objective name designates the first
+    row of that name (lowest id).
+    """
+    rows_changed = 0
+    first = 'SELECT MIN(id) FROM autres_objectifs WHERE nom = ?'
+    for op, nom, valeur in operations:
+        if op == 'add_objectif':
+            cursor.execute('INSERT INTO autres_objectifs (nom, valeur) VALUES (?, ?)', (nom, valeur))
+        elif op == 'update_objectif':
+            cursor.execute(f'''
+                UPDATE autres_objectifs SET valeur = ?, timestamp = CURRENT_TIMESTAMP
+                WHERE id = ({first}) AND valeur != ?
+            ''', (valeur, nom, valeur))
+        else:
+            cursor.execute(f'DELETE FROM autres_objectifs WHERE id = ({first})', (nom,))
+        rows_changed += cursor.rowcount
+    return rows_changed
+
+def _finish_sync(cursor, payload_hash, rows_changed, deltas, log_message):
+    """Record the payload hash (unless None) and, if rows changed, the leaderboard, log entry and new data version."""
+    if payload_hash is not None:
+        cursor.execute('''
+            INSERT INTO app_state (key, value) VALUES ('sync_hash', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (payload_hash,))
+
+    if not rows_changed:
+        return None
+    # New data version: ranks and deltas are relative to the previous one
+    _update_leaderboard(cursor, deltas)
     cursor.execute(
-        'SELECT * FROM kpi_global ORDER BY timestamp DESC LIMIT 1'
+        'INSERT INTO update_log (status, message, rows_changed) VALUES (?, ?, ?)',
+        ('success', log_message, rows_changed)
     )
-    row = cursor.fetchone()
-    conn.close()
-
-    if row:
-        return {
-            'chiffre_affaire': row['chiffre_affaire'],
-            'objectif_annuel': row['objectif_annuel'],
-            'objectif_decembre': row['objectif_decembre'] if 'objectif_decembre' in row.keys() else 0,
-            'wr': row['wr'] if 'wr' in row.keys() else 0,
-            'timestamp': row['timestamp']
-        }
-    return None
+    return _bump_data_version(cursor)
 
-def get_objectif_annuel():
-    """Get the latest annual objective."""
+@metrics.timed(QUERY_SECONDS)
+def apply_sync(data, payload_hash, log_message):
+    """
+    Apply a freshly synced payload as a row-level diff.
+
+    Only the rows that actually changed are written: a new global KPI row if
+    one of its values moved, the inserted/updated/deleted chefs de projet and
+    autres objectifs, and the leaderboard (ranks and changes since the
+    previous version). Everything happens on a single connection and is
+    committed once together with the revenue history points, the payload hash, the success log entry and
+    the data version bump, so readers never see a half-applied sync.
+
+    Args:
+        data: The synced payload ('total', 'cdp_list', objectives...)
+        payload_hash: Hash of the payload, stored to skip identical syncs
+        log_message: Message recorded in update_log
+
+    Returns:
+        (version, rows_changed), version being None when nothing changed
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        'SELECT objectif_annuel FROM kpi_global ORDER BY timestamp DESC LIMIT 1'
-    )
-    row = cursor.fetchone()
-    conn.close()
 
-    return row['objectif_annuel'] if row else 100000
+    try:
+        # Take the write lock up front: the diff below must not go stale
+        cursor.execute('BEGIN IMMEDIATE')
+        rows_changed = _diff_kpi_global(cursor, data)
+        cdp_changed, deltas = _diff_chefs_projet(cursor, data['cdp_list'], int(time.time()))
+        rows_changed += cdp_changed
+        rows_changed += _diff_autres_objectifs(cursor, data.get('autres_objectifs', []))
+        version = _finish_sync(cursor, payload_hash, rows_changed, deltas, log_message)
+
+        conn.commit()
+        return version, rows_changed
+    except Exception as e:
+        conn.rollback()
+        raise e
+
+@metrics.timed(QUERY_SECONDS)
+def apply_patch(data, changes, previous_hash, payload_hash, log_message):
+    """
+    Apply the changes of an admin patch, without diffing the whole payload.
+
+    Only the rows named by changes are read and written: the global KPI
+    row if a KPI field was set, the patched chefs de projet and the patched
+    autres objectifs. The rest is committed like apply_sync (leaderboard,
+    payload hash, log entry, data version) in the same transaction.
 
-def save_chef_projet(nom, prenom, chiffre_affaire, photo_filename=None):
-    """Save or update chef de projet data."""
+    Args:
+        data: The whole payload after the patch (for the payload hash and KPI values)
+        changes: The changes returned by admin_config.apply_operations
+        previous_hash: Hash of the payload before the patch
+        payload_hash: Hash of data, stored so the follow-up sync of the file
+            is skipped; only if the database held the previous payload,
+            otherwise that sync still runs and catches up on the rest
+        log_message: Message recorded in update_log
+
+    Returns:
+        (version, rows_changed), version being None when nothing changed
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute('''
-            INSERT INTO chef_projet (nom, prenom, chiffre_affaire, photo_filename)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(nom, prenom)
-            DO UPDATE SET
-                chiffre_affaire = excluded.chiffre_affaire,
-                photo_filename = COALESCE(excluded.photo_filename, chef_projet.photo_filename),
-                timestamp = CURRENT_TIMESTAMP
-        ''', (nom, prenom, chiffre_affaire, photo_filename))
+        cursor.execute('BEGIN IMMEDIATE')
+        rows_changed = _diff_kpi_global(cursor, data) if changes['kpi'] else 0
+        cdps = changes['cdps']
+        cdp_changed, deltas = _diff_chefs_projet(
+            cursor, [cdp for cdp in cdps.values() if cdp is not None], int(time.time()), keys=cdps
+        )
+        rows_changed += cdp_changed
+        rows_changed += _patch_autres_objectifs(cursor, changes['objectifs'])
+        cursor.execute("SELECT value FROM app_state WHERE key = 'sync_hash'")
+        row = cursor.fetchone()
+        synced = row is not None and row['value'] == previous_hash
+        version = _finish_sync(cursor, payload_hash if synced else None, rows_changed, deltas, log_message)
 
         conn.commit()
+        return version, rows_changed
     except Exception as e:
         conn.rollback()
         raise e
-    finally:
-        conn.close()
 
+@metrics.timed(QUERY_SECONDS)
+def get_latest_kpi_global():
+    """Get the latest global KPI."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(KPI_COLUMNS)} FROM kpi_global ORDER BY timestamp DESC, id DESC LIMIT 1")
+    row = cursor.fetchone()
+
+    return dict(zip(KPI_COLUMNS, row)) if row else None
+
+@metrics.timed(QUERY_SECONDS)
+def get_objectif_annuel():
+    """Get the latest annual objective."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT objectif_annuel FROM kpi_global ORDER BY timestamp DESC, id DESC LIMIT 1'
+    )
+    row = cursor.fetchone()
+
+    return row['objectif_annuel'] if row else 100000
+
+@metrics.timed(QUERY_SECONDS)
 def get_all_chefs_projet():
     """Get all chefs de projet ordered by revenue (descending)."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM chef_projet
-        ORDER BY chiffre_affaire DESC
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-
-    return [{
-        'id': row['id'],
-        'nom': row['nom'],
-        'prenom': row['prenom'],
-        'chiffre_affaire': row['chiffre_affaire'],
-        'photo_filename': row['photo_filename'],
-        'timestamp': row['timestamp']
-    } for row in rows]
+    cursor.execute(f"SELECT {', '.join(CDP_COLUMNS)} FROM chef_projet ORDER BY chiffre_affaire DESC, nom, prenom")
+    return [dict(zip(CDP_COLUMNS, row)) for row in cursor.fetchall()]
 
+@metrics.timed(QUERY_SECONDS)
 def log_update(status, message=None):
     """Log an update attempt."""
     conn = get_db_connection()
@@ -158,8 +423,8 @@ def log_update(status, message=None):
         (status, message)
     )
     conn.commit()
-    conn.close()
 
+@metrics.timed(QUERY_SECONDS)
 def get_last_update():
     """Get the last successful update timestamp."""
     conn = get_db_connection()
@@ -171,56 +436,381 @@ def get_last_update():
         LIMIT 1
     ''')
     row = cursor.fetchone()
-    conn.close()
 
     return row['timestamp'] if row else None
 
-def save_autre_objectif(nom, valeur):
-    """Save a new 'autre objectif'."""
+@metrics.timed(QUERY_SECONDS)
+def get_all_autres_objectifs():
+    """Get all 'autres objectifs'."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(OBJECTIF_COLUMNS)} FROM autres_objectifs ORDER BY timestamp DESC")
+    rows = cursor.fetchall()
+
+    return [dict(zip(OBJECTIF_COLUMNS, row)) for row in rows]
+
+@metrics.timed(QUERY_SECONDS)
+def rename_photo(old_filename, new_filename):
+    """
+    Point the chefs de projet using a photo file at its new name.
+
+    Returns:
+        The new data version, or None if no chef de projet used that photo
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        'INSERT INTO autres_objectifs (nom, valeur) VALUES (?, ?)',
-        (nom, valeur)
+        'UPDATE chef_projet SET photo_filename = ? WHERE photo_filename = ?',
+        (new_filename, old_filename)
     )
+    version = _bump_data_version(cursor) if cursor.rowcount else None
     conn.commit()
-    conn.close()
 
-def get_all_autres_objectifs():
-    """Get all 'autres objectifs'."""
+    return version
+
+@metrics.timed(QUERY_SECONDS)
+def get_dashboard_data():
+    """Get everything the dashboard displays, from one consistent read transaction."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM autres_objectifs ORDER BY timestamp DESC')
-    rows = cursor.fetchall()
-    conn.close()
+    cursor.execute('BEGIN')
+
+    cursor.execute(f"SELECT {', '.join(KPI_COLUMNS)} FROM kpi_global ORDER BY timestamp DESC, id DESC LIMIT 1")
+    kpi_row = cursor.fetchone()
 
-    return [{
-        'id': row['id'],
-        'nom': row['nom'],
-        'valeur': row['valeur'],
-        'timestamp': row['timestamp']
-    } for row in rows]
+    cursor.execute(f"SELECT {', '.join(CDP_COLUMNS)} FROM chef_projet ORDER BY chiffre_affaire DESC, nom, prenom")
+    cdp_rows = cursor.fetchall()
 
-def delete_autre_objectif(objectif_id):
-    """Delete an 'autre objectif' by ID."""
+    cursor.execute(f"SELECT {', '.join(OBJECTIF_COLUMNS)} FROM autres_objectifs ORDER BY timestamp DESC")
+    objectif_rows = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT timestamp FROM update_log
+        WHERE status = 'success'
+        ORDER BY timestamp DESC
+        LIMIT 1
+    ''')
+    update_row = cursor.fetchone()
+
+    cursor.execute("SELECT value FROM app_state WHERE key = 'data_version'")
+    version_row = cursor.fetchone()
+    conn.commit()
+
+    return {
+        'version': version_row['value'] if version_row else 0,
+        'kpi': dict(zip(KPI_COLUMNS, kpi_row)) if kpi_row else None,
+        'cdp_list': [dict(zip(CDP_COLUMNS, row)) for row in cdp_rows],
+        'autres_objectifs': [dict(zip(OBJECTIF_COLUMNS, row)) for row in objectif_rows],
+        'last_update': update_row['timestamp'] if update_row else None
+    }
+
+@metrics.timed(QUERY_SECONDS)
+def get_history(start, end, nom=None, prenom=None):
+    """
+    Get the revenue history between two epoch timestamps, column-oriented.
+
+    Compaction moves old KPI rows from kpi_global to coarser kpi_rollup tiers,
+    and each period lives in exactly one tier, so the KPI series reads all of
+    them and naturally gets raw points for recent data and hourly, daily or
+    monthly points (with their min/max) further back.
+
+    History only stores a point when a value changes, so each CDP series
+    starts with the last value known before `start` (clamped to `start`) to
+    give charts a complete step line over the requested range.
+
+    Args:
+        start: Range start (epoch seconds, inclusive)
+        end: Range end (epoch seconds, inclusive)
+        nom, prenom: Restrict the CDP series to a single chef de projet
+
+    Returns:
+        dict with the 'kpi' series and one 'cdp' series per chef de projet
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM autres_objectifs WHERE id = ?', (objectif_id,))
-    conn.commit()
-    conn.close()
 
-def clear_autres_objectifs():
-    """Clear all 'autres objectifs'."""
+    cursor.execute('''
+        SELECT CAST(strftime('%s', timestamp) AS INTEGER) AS ts,
+               chiffre_affaire, chiffre_affaire AS min, chiffre_affaire AS max
+        FROM kpi_global
+        WHERE timestamp BETWEEN datetime(?, 'unixepoch') AND datetime(?, 'unixepoch')
+        UNION ALL
+        SELECT bucket, chiffre_affaire_last, chiffre_affaire_min, chiffre_affaire_max
+        FROM kpi_rollup
+        WHERE resolution IN ('hour', 'day', 'month') AND bucket BETWEEN ? AND ?
+        ORDER BY ts
+    ''', (start, end, start, end))
+    kpi_rows = cursor.fetchall()
+
+    if nom is not None:
+        cursor.execute('''
+            SELECT nom, prenom, ts, chiffre_affaire FROM cdp_history
+            WHERE nom = ? AND prenom = ? AND ts BETWEEN ? AND ?
+            ORDER BY ts
+        ''', (nom, prenom, start, end))
+        history_rows = cursor.fetchall()
+        keys = [(nom, prenom)]
+    else:
+        cursor.execute('''
+            SELECT nom, prenom, ts, chiffre_affaire FROM cdp_history
+            WHERE ts BETWEEN ? AND ?
+            ORDER BY ts
+        ''', (start, end))
+        history_rows = cursor.fetchall()
+        cursor.execute('SELECT nom, prenom FROM chef_projet ORDER BY chiffre_affaire DESC')
+        keys = [(row['nom'], row['prenom']) for row in cursor.fetchall()]
+
+    series = {}
+    for key in keys + [(row['nom'], row['prenom']) for row in history_rows]:
+        if key in series:
+            continue
+        series[key] = {'nom': key[0], 'prenom': key[1], 't': [], 'chiffre_affaire': []}
+        cursor.execute('''
+            SELECT chiffre_affaire FROM cdp_history
+            WHERE nom = ? AND prenom = ? AND ts < ?
+            ORDER BY ts DESC
+            LIMIT 1
+        ''', (key[0], key[1], start))
+        row = cursor.fetchone()
+        if row:
+            series[key]['t'].append(start)
+            series[key]['chiffre_affaire'].append(row['chiffre_affaire'])
+
+    for row in history_rows:
+        points = series[(row['nom'], row['prenom'])]
+        points['t'].append(row['ts'])
+        points['chiffre_affaire'].append(row['chiffre_affaire'])
+
+    return {
+        'kpi': {
+            't': [row['ts'] for row in kpi_rows],
+            'chiffre_affaire': [row['chiffre_affaire'] for row in kpi_rows],
+            'min': [row['min'] for row in kpi_rows],
+            'max': [row['max'] for row in kpi_rows]
+        },
+        'cdp': list(series.values())
+    }
+
+ROLLUP_RESOLUTIONS = ('hour', 'day', 'month')
+
+def _bucket_start(resolution, ts):
+    """Return the UTC start (epoch) of the bucket containing ts."""
+    if resolution == 'hour':
+        return ts - ts % 3600
+    if resolution == 'day':
+        return ts - ts % 86400
+    dt = datetime.fromtimestamp(ts, timezone.utc)
+    return int(datetime(dt.year, dt.month, 1, tzinfo=timezone.utc).timestamp())
+
+def _rollup(cursor, resolution, points):
+    """
+    Merge points into the rollup tier of the given resolution.
+
+    Args:
+        points: Iterable of (ts, min, max, last, objectif_annuel,
+            objectif_decembre, wr, samples), ordered by ts
+    """
+    buckets = {}
+    for ts, low, high, last, objectif_annuel, objectif_decembre, wr, samples in points:
+        bucket = _bucket_start(resolution, ts)
+        current = buckets.get(bucket)
+        if current is None:
+            buckets[bucket] = [low, high, last, objectif_annuel, objectif_decembre, wr, ts, samples]
+        else:
+            current[0] = min(current[0], low)
+            current[1] = max(current[1], high)
+            current[2:7] = [last, objectif_annuel, objectif_decembre, wr, ts]
+            current[7] += samples
+
+    cursor.executemany('''
+        INSERT INTO kpi_rollup (
+            resolution, bucket, chiffre_affaire_min, chiffre_affaire_max, chiffre_affaire_last,
+            objectif_annuel, objectif_decembre, wr, last_ts, samples
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(resolution, bucket) DO UPDATE SET
+            chiffre_affaire_min = MIN(chiffre_affaire_min, excluded.chiffre_affaire_min),
+            chiffre_affaire_max = MAX(chiffre_affaire_max, excluded.chiffre_affaire_max),
+            chiffre_affaire_last = CASE WHEN excluded.last_ts >= last_ts
+                THEN excluded.chiffre_affaire_last ELSE chiffre_affaire_last END,
+            objectif_annuel = CASE WHEN excluded.last_ts >= last_ts
+                THEN excluded.objectif_annuel ELSE objectif_annuel END,
+            objectif_decembre = CASE WHEN excluded.last_ts >= last_ts
+                THEN excluded.objectif_decembre ELSE objectif_decembre END,
+            wr = CASE WHEN excluded.last_ts >= last_ts THEN excluded.wr ELSE wr END,
+            last_ts = MAX(last_ts, excluded.last_ts),
+            samples = samples + excluded.samples
+    ''', [(resolution, bucket, *values) for bucket, values in buckets.items()])
+
+@metrics.timed(QUERY_SECONDS)
+def compact_history(raw_days, hourly_days, daily_days, log_days):
+    """
+    Downsample old KPI history and prune the update log.
+
+    Raw kpi_global rows older than raw_days are rolled into hourly buckets,
+    hourly buckets older than hourly_days into daily ones and daily buckets
+    older than daily_days into monthly ones (kept forever), each bucket
+    keeping the min, max and last revenue. The latest KPI row and the latest
+    successful update log entry are always kept since the dashboard reads
+    them. Everything is committed in one transaction.
+
+    Returns:
+        dict with the number of rows rolled up or deleted per table
+    """
+    now = int(time.time())
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM autres_objectifs')
-    conn.commit()
-    conn.close()
 
-def clear_chefs_projet():
-    """Clear all chefs de projet."""
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+
+        # Raw rows -> hourly buckets
+        cutoff = _bucket_start('hour', now - raw_days * 86400)
+        cursor.execute('''
+            SELECT id, CAST(strftime('%s', timestamp) AS INTEGER) AS ts, chiffre_affaire,
+                   objectif_annuel, objectif_decembre, wr
+            FROM kpi_global
+            WHERE timestamp < datetime(?, 'unixepoch')
+              AND id <> (SELECT id FROM kpi_global ORDER BY timestamp DESC, id DESC LIMIT 1)
+            ORDER BY timestamp, id
+        ''', (cutoff,))
+        rows = cursor.fetchall()
+        _rollup(cursor, 'hour', [
+            (row['ts'], row['chiffre_affaire'], row['chiffre_affaire'], row['chiffre_affaire'],
+             row['objectif_annuel'], row['objectif_decembre'], row['wr'], 1)
+            for row in rows
+        ])
+        cursor.executemany('DELETE FROM kpi_global WHERE id = ?', [(row['id'],) for row in rows])
+        stats = {'kpi_global': len(rows)}
+
+        # Hourly -> daily -> monthly buckets
+        for source, target, days in (('hour', 'day', hourly_days), ('day', 'month', daily_days)):
+            cutoff = _bucket_start(target, now - days * 86400)
+            cursor.execute('''
+                SELECT last_ts, chiffre_affaire_min, chiffre_affaire_max, chiffre_affaire_last,
+                       objectif_annuel, objectif_decembre, wr, samples
+                FROM kpi_rollup
+                WHERE resolution = ? AND bucket < ?
+                ORDER BY bucket
+            ''', (source, cutoff))
+            rows = cursor.fetchall()
+            _rollup(cursor, target, [tuple(row) for row in rows])
+            cursor.execute('DELETE FROM kpi_rollup WHERE resolution = ? AND bucket < ?', (source, cutoff))
+            stats[f'kpi_rollup_{source}'] = len(rows)
+
+        cursor.execute('''
+            DELETE FROM update_log
+            WHERE timestamp < datetime(?, 'unixepoch')
+              AND id <> COALESCE((
+                  SELECT id FROM update_log WHERE status = 'success'
+                  ORDER BY timestamp DESC, id DESC LIMIT 1
+              ), -1)
+        ''', (now - log_days * 86400,))
+        stats['update_log'] = cursor.rowcount
+
+        conn.commit()
+        return stats
+    except Exception as e:
+        conn.rollback()
+        raise e
+
+@metrics.timed(QUERY_SECONDS)
+def optimize_db(vacuum_threshold=0.25):
+    """
+    Refresh the query planner statistics and reclaim free pages.
+
+    VACUUM rewrites the whole file, so it only runs once the free pages
+    exceed vacuum_threshold of the database size.
+
+    Returns:
+        True if the database was vacuumed
+    """
+    conn = get_db_connection()
+    conn.execute('ANALYZE')
+
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist_count = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if page_count and freelist_count / page_count > vacuum_threshold:
+        conn.execute('VACUUM')
+        return True
+    return False
+
+def _sync_job(row):
+    job = dict(zip(SYNC_JOB_COLUMNS, row))
+    for column in SYNC_JOB_JSON_COLUMNS:
+        job[column] = json.loads(job[column]) if job[column] is not None else None
+    return job
+
+@metrics.timed(QUERY_SECONDS)
+def create_sync_job(job, is_running, keep):
+    """
+    Record a new queued sync job, unless one is already in flight.
+
+    Unfinished jobs whose process is gone (is_running returns False) are
+    marked failed on the way. The check and the insert share one write
+    transaction, so processes requesting a sync together get the same job.
+
+    Args:
+        job: The new job (every SYNC_JOB_COLUMNS field)
+        is_running: Callable telling whether an unfinished job still runs
+        keep: Number of finished jobs kept, the oldest are deleted
+
+    Returns:
+        (job, created): the job in flight, its 'attached' count incremented,
+        or the new job
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM chef_projet')
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(
+            f"SELECT {', '.join(SYNC_JOB_COLUMNS)} FROM sync_jobs WHERE finished_at IS NULL ORDER BY created_at"
+        )
+        for active in map(_sync_job, cursor.fetchall()):
+            if is_running(active):
+                cursor.execute('UPDATE sync_jobs SET attached = attached + 1 WHERE id = ?', (active['id'],))
+                conn.commit()
+                active['attached'] += 1
+                return active, False
+            cursor.execute(
+                "UPDATE sync_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                ('Interrupted: its process exited', datetime.now().isoformat(), active['id'])
+            )
+
+        values = [json.dumps(job[column]) if column in SYNC_JOB_JSON_COLUMNS else job[column]
+                  for column in SYNC_JOB_COLUMNS]
+        cursor.execute(
+            f"INSERT INTO sync_jobs ({', '.join(SYNC_JOB_COLUMNS)}) VALUES ({', '.join('?' * len(SYNC_JOB_COLUMNS))})",
+            values
+        )
+        cursor.execute('''
+            DELETE FROM sync_jobs
+            WHERE finished_at IS NOT NULL AND id NOT IN (
+                SELECT id FROM sync_jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?
+            )
+        ''', (keep,))
+        conn.commit()
+        return job, True
+    except Exception as e:
+        conn.rollback()
+        raise e
+
+@metrics.timed(QUERY_SECONDS)
+def update_sync_job(job_id, **fields):
+    """Update fields (SYNC_JOB_COLUMNS) of a sync job."""
+    conn = get_db_connection()
+    conn.execute(
+        f"UPDATE sync_jobs SET {', '.join(f'{column} = ?' for column in fields)} WHERE id = ?",
+        [json.dumps(value) if column in SYNC_JOB_JSON_COLUMNS else value for column, value in fields.items()]
+        + [job_id]
+    )
     conn.commit()
-    conn.close()
+
+@metrics.timed(QUERY_SECONDS)
+def get_sync_job(job_id):
+    """Get a sync job by id, or None if unknown."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(SYNC_JOB_COLUMNS)} FROM sync_jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+    return _sync_job(row) if row else None
@@ -0,0 +1,99 @@
+"""
+Broadcast hub for the Server-Sent Events stream.
+
+Every connected client waits on one shared condition instead of owning a
+queue: publishing a snapshot just swaps the latest one in and wakes everyone
+up, and each client only remembers the last version it has sent. An idle
+connection therefore costs a suspended generator and nothing else, which
+lets a cooperative server (gevent/eventlet workers) hold hundreds of them.
+
+Each tenant has its own hub; the functions below work on the current tenant
+(see tenants.current()).
+"""
+import threading
+import metrics
+import tenants
+
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+class _Hub:
+    """The latest snapshot of one tenant and the condition its clients wait on."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.latest = None
+        self.subscribers = 0
+
+_hubs_lock = threading.Lock()
+_hubs = {}
+
+def _hub():
+    """Return the current tenant's hub, creating it on first use."""
+    name = tenants.current().name
+    with _hubs_lock:
+        hub = _hubs.get(name)
+        if hub is None:
+            hub = _hubs[name] = _Hub()
+        return hub
+
+metrics.Gauge(
+    'stream_clients', 'Clients connected to the SSE stream', ['tenant'],
+    callback=lambda: {(name,): hub.subscribers for name, hub in list(_hubs.items())}
+)
+
+def _publish(hub, snapshot):
+    with hub.condition:
+        hub.latest = snapshot
+        hub.condition.notify_all()
+
+def publish(snapshot):
+    """Publish a new snapshot to every connected client."""
+    _publish(_hub(), snapshot)
+
+def format_event(snapshot, full=False):
+    """Format a snapshot as an SSE 'update' event."""
+    if full:
+        data = snapshot.payload.decode('utf-8')
+    else:
+        data = f'{{"version":{snapshot.version}}}'
+    return f"id: {snapshot.version}\nevent: update\ndata: {data}\n\n"
+
+def stream(snapshot, last_version=None, full=False):
+    """
+    Return a generator of SSE frames for one client, until it disconnects.
+
+    The hub is picked now, in the request's tenant context, since the frames
+    are generated after the view has returned.
+
+    Args:
+        snapshot: The snapshot the client should be brought up to date with
+        last_version: Version the client already has (Last-Event-ID), if any
+        full: Send the whole dashboard payload instead of the version only
+    """
+    return _stream(_hub(), snapshot, last_version, full)
+
+def _stream(hub, snapshot, last_version, full):
+    with hub.condition:
+        if hub.latest is None or hub.latest.version < snapshot.version:
+            _publish(hub, snapshot)
+        hub.subscribers += 1
+
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+
+        while True:
+            with hub.condition:
+                if last_version is not None and hub.latest.version <= last_version:
+                    hub.condition.wait(HEARTBEAT_SECONDS)
+                current = hub.latest
+
+            if last_version is None or current.version > last_version:
+                last_version = current.version
+                yield format_event(current, full)
+            else:
+                # Keep proxies from closing the idle connection
+                yield ": ping\n\n"
+    finally:
+        with hub.condition:
+            hub.subscribers -= 1
@@ -0,0 +1,42 @@
+"""
+Atomic file writes.
+
+A file is written to a temporary file in its folder, then renamed over it:
+readers (nginx, other workers, the config watcher) see the old content or
+the new one, never a half-written file. The temporary file has a unique
+name, so concurrent writers of the same file do not write into each other's
+temporary file, and it is removed when the write fails.
+"""
+import os
+import tempfile
+
+def replace(path, write, mode=None, durable=False):
+    """
+    Atomically replace a file with what write(f) writes to a binary file.
+
+    Args:
+        path: The file to replace (created if missing)
+        write: Callable writing the new content to the file object it gets
+        mode: Permissions of the new file; by default those of the file
+            replaced, 0644 for a new file (mkstemp creates it 0600)
+        durable: Whether to fsync the content before the rename
+    """
+    folder, filename = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f'.{filename}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        if mode is None:
+            try:
+                mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,13 +1,73 @@
+import math
 import os
-from google.oauth2.credentials import Credentials
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+from concurrent.futures import Future
+import google_auth_httplib2
+import httplib2
+from google.auth.credentials import AnonymousCredentials
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import metrics
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
 
-def get_google_sheets_service():
-    """Create and return a Google Sheets API service."""
+# Point the client at another server (e.g. a local fake Sheets API for tests)
+SHEETS_API_ENDPOINT = os.getenv('GOOGLE_SHEETS_API_ENDPOINT', '')
+MAX_RETRIES = int(os.getenv('GOOGLE_SHEETS_MAX_RETRIES', '5'))
+RETRY_BASE_SECONDS = float(os.getenv('GOOGLE_SHEETS_RETRY_BASE_SECONDS', '1'))
+RETRY_MAX_SECONDS = 60
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+AUTH_STATUSES = {401, 403}
+HTTP_TIMEOUT_SECONDS = 30
+
+# Large ranges are read in pages so memory stays bounded whatever the sheet size
+PAGE_ROWS = int(os.getenv('GOOGLE_SHEETS_PAGE_ROWS', '5000'))
+RANGES_PER_BATCH = 10
+MAX_REJECTED_REPORTED = 100
+
+Columns = namedtuple('Columns', ['nom', 'prenom', 'chiffre_affaire'])
+DEFAULT_COLUMNS = Columns(0, 1, 2)
+HEADER_ALIASES = {
+    'nom': {'nom', 'nomcdp', 'name', 'lastname'},
+    'prenom': {'prenom', 'prenomcdp', 'firstname'},
+    'chiffre_affaire': {'chiffredaffaire', 'chiffredaffaires', 'chiffredaffairecdp', 'chiffreaffaire', 'ca', 'revenue'}
+}
+TOTAL_LABELS = {'TOTAL', 'JEECE'}
+
+# Columns run up to ZZZ, so 'Sheet1' or 'MyNamedRange' cannot pass for cells
+_A1_RANGE = re.compile(
+    r"^(?:(?P<sheet>.+)!)?(?P<first_col>[A-Za-z]{1,3})(?P<first_row>\d*)(?::(?P<last_col>[A-Za-z]{1,3})(?P<last_row>\d*))?$"
+)
+CURRENCY_SIGNS = '€$£'
+
+_service = None
+_spreadsheets_api = None
+_values_api = None
+_credentials = None
+_service_lock = threading.Lock()
+_local = threading.local()
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+API_SECONDS = metrics.Histogram(
+    'google_api_duration_seconds', 'Duration of Google Sheets API calls (each attempt), in seconds', ['method']
+)
+API_ERRORS = metrics.Counter(
+    'google_api_errors_total', 'Failed Google Sheets API calls, by HTTP status or connection error', ['method', 'status']
+)
+
+def _load_credentials():
+    """Load the service account credentials (anonymous for a custom endpoint)."""
+    if SHEETS_API_ENDPOINT:
+        return AnonymousCredentials()
+
     creds_path = os.getenv('GOOGLE_CREDENTIALS_PATH', '/app/credentials/credentials.json')
 
     if not os.path.exists(creds_path):
@@ -17,79 +77,421 @@ def get_google_sheets_service():
         )
 
     # Use service account credentials
-    creds = service_account.Credentials.from_service_account_file(
+    return service_account.Credentials.from_service_account_file(
         creds_path, scopes=SCOPES
     )
 
-    service = build('sheets', 'v4', credentials=creds)
-    return service
+def get_google_sheets_service():
+    """
+    Return the Google Sheets API service, building it on first use.
+
+    Building the service (credentials file + discovery document) is slow, so
+    the service and its credentials are cached for the life of the process;
+    the credentials keep and refresh their access token between fetches.
+    """
+    global _service, _credentials
+
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _credentials = _load_credentials()
+                client_options = {'api_endpoint': SHEETS_API_ENDPOINT} if SHEETS_API_ENDPOINT else None
+                _service = build(
+                    'sheets', 'v4',
+                    credentials=_credentials,
+                    client_options=client_options,
+                    cache_discovery=False
+                )
+    return _service
+
+def _get_spreadsheets_api():
+    """
+    Return the cached spreadsheets() resource.
+
+    googleapiclient deep-copies the discovery document for every resource
+    it creates (about 20 MB of transient allocations), so the resource is
+    built once rather than per fetch.
+    """
+    global _spreadsheets_api
+
+    if _spreadsheets_api is None:
+        service = get_google_sheets_service()
+        with _service_lock:
+            if _spreadsheets_api is None:
+                _spreadsheets_api = service.spreadsheets()
+    return _spreadsheets_api
+
+def _get_values_api():
+    """Return the cached spreadsheets().values() resource."""
+    global _values_api
+
+    if _values_api is None:
+        spreadsheets = _get_spreadsheets_api()
+        with _service_lock:
+            if _values_api is None:
+                _values_api = spreadsheets.values()
+    return _values_api
+
+def _get_http():
+    """Return this thread's authorized HTTP client (httplib2 is not thread-safe)."""
+    http = getattr(_local, 'http', None)
+    if http is None:
+        http = google_auth_httplib2.AuthorizedHttp(
+            _credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+        )
+        _local.http = http
+    return http
+
+def reset_service():
+    """Drop the cached service and credentials, so the next call loads them again."""
+    global _service, _spreadsheets_api, _values_api, _credentials
+    with _service_lock:
+        _service = None
+        _spreadsheets_api = None
+        _values_api = None
+        _credentials = None
+        _local.__dict__.clear()
+
+def _retry_delay(attempt, error):
+    """Exponential backoff with full jitter, honouring Retry-After when sent."""
+    retry_after = error.resp.get('retry-after') if error is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(RETRY_MAX_SECONDS, int(retry_after))
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+def execute(request):
+    """
+    Execute an API request, retrying rate limits and server errors.
+
+    HttpError 429 and 5xx, and connection errors, are retried up to
+    MAX_RETRIES times with exponential backoff; other errors are raised.
+    """
+    method = getattr(request, 'methodId', None) or 'unknown'
+    started = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                return request.execute(http=_get_http())
+            except HttpError as error:
+                API_ERRORS.inc(method=method, status=error.resp.status)
+                if error.resp.status not in RETRYABLE_STATUSES or attempt >= MAX_RETRIES:
+                    raise
+                delay = _retry_delay(attempt, error)
+                print(f"Google Sheets API returned {error.resp.status}, retrying in {delay:.1f}s")
+            except (ConnectionError, TimeoutError) as error:
+                API_ERRORS.inc(method=method, status='connection')
+                if attempt >= MAX_RETRIES:
+                    raise
+                delay = _retry_delay(attempt, None)
+                print(f"Google Sheets API unreachable ({error}), retrying in {delay:.1f}s")
+            finally:
+                API_SECONDS.observe(time.perf_counter() - start, method=method)
+            attempt += 1
+            time.sleep(delay)
+    finally:
+        # Time spent waiting for the API (retries included), to split a fetch into its fetch and parse phases
+        _local.api_seconds = getattr(_local, 'api_seconds', 0.0) + time.perf_counter() - started
 
 def fetch_kpi_data(spreadsheet_id, range_name):
+    """
+    Fetch KPI data from Google Sheets, coalescing concurrent identical fetches.
+
+    A manual sync racing the scheduled one would fetch the same range twice:
+    callers arriving while a fetch of the same range is in flight wait for
+    it and share its result (or its error) instead.
+    """
+    key = (spreadsheet_id, range_name)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        return future.result()
+
+    try:
+        future.set_result(_fetch_kpi_data(spreadsheet_id, range_name))
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+    return future.result()
+
+def split_ranges(range_spec):
+    """Split a GOOGLE_SHEET_RANGE value into its ranges ('Pole1!A1:C500;Pole2!A:C')."""
+    return [range_name.strip() for range_name in range_spec.split(';') if range_name.strip()]
+
+def _match_a1(range_name):
+    """
+    Match the A1 cells of a range, or return None.
+
+    Only a range naming its tab ('Sheet1!A:C') or with row numbers ('A1:C50')
+    is taken as cells: a bare word is a tab ('KPI') or a named range.
+    """
+    match = _A1_RANGE.match(range_name)
+    if match is None or not (match['sheet'] or match['first_row']):
+        return None
+    return match
+
+def _sheet_title(sheet):
+    """Unquote the tab of a range ("'Pôle 1'" -> "Pôle 1"), None for the first tab."""
+    if sheet and len(sheet) > 1 and sheet[0] == sheet[-1] == "'":
+        return sheet[1:-1].replace("''", "'")
+    return sheet
+
+def _page_ranges(range_name, row_counts):
+    """
+    Yield (page_range, first_row, last_row) for successive PAGE_ROWS-row pages.
+
+    Bounded ranges ('Sheet1!A2:C5000') yield pages up to their last row,
+    open-ended ranges ('Sheet1!A:C') up to the last row of their tab, from
+    row_counts (tab title -> row count, None for the first tab). Tabs and
+    named ranges ('Sheet1', 'MyNamedRange') are fetched as a single page
+    with last_row None.
+    """
+    match = _match_a1(range_name)
+    last_row = None
+    if match is not None:
+        last_row = int(match['last_row']) if match['last_row'] else row_counts.get(_sheet_title(match['sheet']))
+    if last_row is None:
+        yield range_name, 1, None
+        return
+
+    sheet = match['sheet']
+    prefix = f"{sheet}!" if sheet else ''
+    first_col = match['first_col']
+    last_col = match['last_col'] or first_col
+    row = int(match['first_row'] or 1)
+
+    while row <= last_row:
+        end = min(row + PAGE_ROWS - 1, last_row)
+        yield f"{prefix}{first_col}{row}:{last_col}{end}", row, end
+        row = end + 1
+
+def _is_open_ended(range_name):
+    """Whether an A1 range has no end row ('Sheet1!A:C', 'Sheet1!A2:C')."""
+    match = _match_a1(range_name)
+    return match is not None and not match['last_row']
+
+def _row_counts(spreadsheet_id, ranges):
+    """
+    Return the row count of each tab (title -> count, None -> the first tab),
+    empty when every range is bounded: spreadsheets.get is then not called.
+    """
+    if not any(_is_open_ended(range_name) for range_name in ranges):
+        return {}
+    result = execute(_get_spreadsheets_api().get(
+        spreadsheetId=spreadsheet_id,
+        fields='sheets.properties(title,gridProperties.rowCount)'
+    ))
+    row_counts = {}
+    for sheet in result.get('sheets', []):
+        properties = sheet['properties']
+        row_count = properties.get('gridProperties', {}).get('rowCount')
+        row_counts.setdefault(None, row_count)
+        row_counts[properties['title']] = row_count
+    return row_counts
+
+def iter_rows(spreadsheet_id, ranges):
+    """
+    Stream the rows of one or several ranges, page by page.
+
+    Each values.batchGet call fetches the next page of up to RANGES_PER_BATCH
+    unfinished ranges, so several tabs are read in one request and at most
+    one page per range of raw values is held in memory. Open-ended ranges
+    end at the last row of their tab, read once with spreadsheets.get.
+
+    Yields:
+        (range_name, index, row_number, row): index is the position of the
+        row in its range (0 for the header), row_number its sheet row
+    """
+    values = _get_values_api()
+    row_counts = _row_counts(spreadsheet_id, ranges)
+    # [range_name, page generator, rows yielded so far] for each unfinished range
+    pending = [[range_name, _page_ranges(range_name, row_counts), 0] for range_name in ranges]
+
+    while pending:
+        batch = []
+        for entry in pending[:RANGES_PER_BATCH]:
+            page = next(entry[1], None)
+            if page is not None:
+                batch.append((entry, page))
+        finished = {entry[0] for entry in pending[:RANGES_PER_BATCH]} - {entry[0] for entry, _ in batch}
+
+        if batch:
+            result = execute(values.batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=[page_range for _, (page_range, _, _) in batch],
+                majorDimension='ROWS',
+                valueRenderOption='UNFORMATTED_VALUE'
+            ))
+
+            # The API trims trailing empty rows: a short page is not the end
+            # of the data, every page up to the last row is read
+            for (entry, (_, first_row, _)), value_range in zip(batch, result.get('valueRanges', [])):
+                for offset, row in enumerate(value_range.get('values', [])):
+                    yield entry[0], entry[2], first_row + offset, row
+                    entry[2] += 1
+
+        pending = [entry for entry in pending if entry[0] not in finished]
+
+def _normalize_header(cell):
+    """'Chiffre d'Affaires' -> 'chiffredaffaires', 'Prénom' -> 'prenom'."""
+    text = unicodedata.normalize('NFKD', str(cell)).lower()
+    return ''.join(char for char in text if char.isalnum() and not unicodedata.combining(char))
+
+def compile_columns(header):
+    """
+    Map each field to its column index from the header row.
+
+    Columns are found by name (accents, case and punctuation ignored), so
+    they may be reordered in the sheet; when a field cannot be found the
+    historical layout (A: Nom, B: Prénom, C: Chiffre d'affaire) is used.
+    """
+    normalized = [_normalize_header(cell) for cell in header]
+    indexes = {}
+    for field, aliases in HEADER_ALIASES.items():
+        for index, name in enumerate(normalized):
+            if name in aliases:
+                indexes[field] = index
+                break
+
+    if len(indexes) < len(HEADER_ALIASES) or len(set(indexes.values())) < len(indexes):
+        return DEFAULT_COLUMNS
+    return Columns(**indexes)
+
+def parse_number(value):
+    """
+    Parse an amount as written in the sheet ('12 345,50 €', '12,345.50', 1234.5).
+
+    Numbers (unformatted cells) are taken as is. In text, whitespace (including
+    non-breaking spaces) and currency signs are dropped, also after a leading
+    sign ('-€12'); when both ',' and '.'
+    appear the last one is the decimal separator, a lone ',' is a decimal
+    separator (French locale) unless it appears several times.
+
+    Raises:
+        ValueError: If the value is not a finite number
+    """
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = ''.join(str(value).split())
+        sign = text[0] if text[:1] in ('-', '+') else ''
+        text = sign + text[len(sign):].strip(CURRENCY_SIGNS)
+        if ',' in text:
+            if '.' in text:
+                if text.rfind(',') > text.rfind('.'):
+                    text = text.replace('.', '').replace(',', '.')
+                else:
+                    text = text.replace(',', '')
+            elif text.count(',') > 1:
+                text = text.replace(',', '')
+            else:
+                text = text.replace(',', '.')
+        number = float(text)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+def parse_rows(rows):
+    """
+    Validate streamed rows and build the sync payload.
+
+    The first row of each range is its header. The first row of a range whose
+    first cell is a TOTAL_LABELS entry is its total (summed across ranges),
+    further total rows of the range are skipped; blank rows are ignored and
+    any other row that cannot be parsed is rejected.
+
+    Returns:
+        dict with 'total', 'cdp_list' and 'rejected' ({'count', 'rows'},
+        the first MAX_REJECTED_REPORTED rejected rows with the reason)
+    """
+    cdp_list = []
+    totals = {}
+    rejected_rows = []
+    rejected_count = 0
+    columns = {}
+
+    for range_name, index, row_number, row in rows:
+        if index == 0:
+            columns[range_name] = compile_columns(row)
+            continue
+        if not row or not any(str(cell).strip() for cell in row):
+            continue
+
+        nom_col, prenom_col, ca_col = columns[range_name]
+        try:
+            label = str(row[0]).strip()
+            if label.upper() in TOTAL_LABELS:
+                # A tab may hold both a TOTAL and a JEECE row for the same amount
+                if range_name not in totals:
+                    totals[range_name] = parse_number(row[ca_col])
+                continue
+
+            nom = str(row[nom_col]).strip()
+            prenom = str(row[prenom_col]).strip()
+            if not nom:
+                raise ValueError("empty name")
+            cdp_list.append({
+                'nom': nom,
+                'prenom': prenom,
+                'chiffre_affaire': parse_number(row[ca_col])
+            })
+        except IndexError:
+            reason = f"expected {max(columns[range_name]) + 1} columns, got {len(row)}"
+        except ValueError as e:
+            reason = str(e)
+        else:
+            continue
+
+        rejected_count += 1
+        if len(rejected_rows) < MAX_REJECTED_REPORTED:
+            rejected_rows.append({'range': range_name, 'row': row_number, 'reason': reason, 'values': row})
+
+    return {
+        'total': sum(totals.values()),
+        'cdp_list': cdp_list,
+        'rejected': {'count': rejected_count, 'rows': rejected_rows}
+    }
+
+def _fetch_kpi_data(spreadsheet_id, range_name):
     """
     Fetch KPI data from Google Sheets.
 
-    Expected format:
-    - First row: headers
-    - Column A: Nom CDP
-    - Column B: Prénom CDP
-    - Column C: Chiffre d'affaire CDP
-    - Last row should contain total in a specific cell
+    Expected format of each range:
+    - First row: headers (Nom, Prénom, Chiffre d'affaire, in any order)
+    - One row per CDP
+    - A row whose first cell is TOTAL or JEECE holds the total
 
     Args:
         spreadsheet_id: The ID of the Google Sheet
-        range_name: The range to fetch (e.g., 'Sheet1!A1:C100')
+        range_name: The range(s) to fetch, ';'-separated
+            (e.g. 'Sheet1!A1:C100' or 'Pole1!A:C;Pole2!A:C')
 
     Returns:
-        dict with 'total' and 'cdp_list'
+        dict with 'total', 'cdp_list', the 'rejected' rows report and the
+        'timings' of the fetch (waiting for the API) and parse phases, in seconds
     """
     try:
-        service = get_google_sheets_service()
-        sheet = service.spreadsheets()
-        result = sheet.values().get(
-            spreadsheetId=spreadsheet_id,
-            range=range_name
-        ).execute()
-
-        values = result.get('values', [])
-
-        if not values:
-            return {'total': 0, 'cdp_list': []}
-
-        # Parse the data
-        # Assuming: Row 1 = headers, Last row = total, middle rows = CDP data
-        cdp_list = []
-        total = 0
-
-        # Skip header row
-        for i, row in enumerate(values[1:], start=1):
-            if len(row) >= 3:
-                try:
-                    # Check if this is the total row (you can customize this logic)
-                    # For example, if first column is "TOTAL" or empty
-                    if row[0].upper() == 'TOTAL' or row[0].upper() == 'JEECE':
-                        total = float(row[2].replace(',', '.').replace(' ', '').replace('€', ''))
-                    else:
-                        nom = row[0].strip()
-                        prenom = row[1].strip()
-                        ca = float(row[2].replace(',', '.').replace(' ', '').replace('€', ''))
-
-                        cdp_list.append({
-                            'nom': nom,
-                            'prenom': prenom,
-                            'chiffre_affaire': ca
-                        })
-                except (ValueError, IndexError) as e:
-                    # Skip malformed rows
-                    print(f"Skipping row {i}: {e}")
-                    continue
-
-        return {
-            'total': total,
-            'cdp_list': cdp_list
-        }
+        # Pages are parsed as they arrive: the parse time is what is left once the API time is taken out
+        _local.api_seconds = 0.0
+        start = time.perf_counter()
+        data = parse_rows(iter_rows(spreadsheet_id, split_ranges(range_name)))
+        api_seconds = getattr(_local, 'api_seconds', 0.0)
+        data['timings'] = {'fetch': api_seconds, 'parse': max(0.0, time.perf_counter() - start - api_seconds)}
+        return data
 
     except HttpError as error:
         print(f"An error occurred: {error}")
+        if error.resp.status in AUTH_STATUSES:
+            # Rejected credentials (rotated key, revoked access): reload them on the next sync
+            reset_service()
         raise error
     except Exception as e:
         print(f"Error fetching data from Google Sheets: {e}")
@@ -0,0 +1,48 @@
+"""
+Gunicorn configuration for production serving.
+
+Run with: gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+The default gevent workers keep idle /api/stream (SSE) connections on
+greenlets instead of threads. Each worker serves its own in-memory snapshot
+and follows the data version in SQLite; only the worker holding the
+scheduler lock runs the periodic syncs (see app.start_background_services).
+Workers share their metrics through METRICS_DIR, so /api/metrics answers
+for the whole server whichever worker serves it (see metrics.py).
+"""
+import os
+import subprocess
+import sys
+
+os.environ.setdefault('METRICS_DIR', os.path.join(
+    os.path.dirname(os.getenv('DATABASE_PATH', '/app/data/jeece.db')), 'metrics'
+))
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))  # gthread workers only
+timeout = 60
+graceful_timeout = 5  # SSE streams never finish on their own
+accesslog = None
+errorlog = '-'
+
+# Run by on_starting in a separate interpreter: the master must not import the
+# backend modules, or the workers would inherit them (their threading.local,
+# locks...) created before gevent monkey-patches them
+PREPARE = """
+import database, metrics, tenants
+for tenant in tenants.all_tenants():
+    tenants.call(tenant, database.init_db)
+metrics.clear_exports()
+"""
+
+def on_starting(server):
+    """Create the schema of every tenant once and forget the metrics of the previous run, before the workers start."""
+    subprocess.run([sys.executable, '-c', PREPARE], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+def post_worker_init(worker):
+    """Start the snapshot follower, and the scheduler in the leader worker."""
+    import app
+    app.start_background_services()
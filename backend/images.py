@@ -0,0 +1,139 @@
+"""
+CDP photo pipeline.
+
+Uploaded photos are decoded, turned upright and stripped of their metadata
+(EXIF, GPS position...), then cropped square and re-encoded at a thumbnail
+and a display size as WebP, plus AVIF when Pillow supports it. Photos are
+processed one at a time on a worker thread, so a burst of multi-megabyte
+phone photos cannot take all the CPU and memory of a Raspberry Pi.
+
+Files are named after a hash of the uploaded content (<hash>-<width>.webp),
+so a new photo always gets new URLs and nginx may cache them forever. The
+manifest.json file of the photos folder lists the variants of each photo,
+ready to use in an <img srcset> (see srcset()).
+"""
+import contextvars
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, features
+import files
+
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/app/frontend/public/images/cdp')
+PHOTOS_URL = os.getenv('PHOTOS_URL', '/images/cdp/')
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_PHOTO_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+MANIFEST_FILENAME = 'manifest.json'
+
+# Displayed at 45px (list) and 110px (podium): both sizes cover 2x screens
+PHOTO_WIDTHS = {'thumb': 96, 'display': 256}
+WEBP_QUALITY = 80
+AVIF_QUALITY = 55
+AVIF_SUPPORTED = features.check('avif')
+# Refuse decompression bombs: a 64 MP photo already decodes to ~200 MB
+MAX_PIXELS = 64_000_000
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='images')
+_manifest_lock = threading.Lock()
+
+def content_name(data):
+    """Return the name shared by the variants of a photo: a hash of its content."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def variant_filename(name, size, ext='webp'):
+    """Return the file name of one variant, e.g. '3f2a...-256.webp'."""
+    return f"{name}-{PHOTO_WIDTHS[size]}.{ext}"
+
+def verify(data):
+    """
+    Check that data is an image Pillow can decode, without decoding it.
+
+    Raises:
+        ValueError: If the data is too large or not a supported image
+    """
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Photo too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            size = image.size
+            image.verify()
+    except Exception as e:
+        raise ValueError("Not a valid image") from e
+    if size[0] * size[1] > MAX_PIXELS:
+        raise ValueError(f"Photo too large ({size[0]}x{size[1]} pixels)")
+
+def load_manifest(folder=UPLOAD_FOLDER):
+    """Return the manifest of the processed photos, by display file name."""
+    try:
+        with open(os.path.join(folder, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _add_to_manifest(folder, entry):
+    with _manifest_lock:
+        manifest = load_manifest(folder)
+        manifest[entry['src']] = entry
+        files.replace(
+            os.path.join(folder, MANIFEST_FILENAME),
+            lambda f: f.write(json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        )
+
+def process(data, folder=UPLOAD_FOLDER):
+    """
+    Generate the variants of a photo and record them in the manifest.
+
+    Variants that already exist (same content uploaded before) are not
+    generated again.
+
+    Returns:
+        The manifest entry of the photo
+    """
+    name = content_name(data)
+    os.makedirs(folder, exist_ok=True)
+
+    with Image.open(io.BytesIO(data)) as source:
+        # Apply the EXIF orientation, then drop every metadata with the source
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    entry = {'src': variant_filename(name, 'display'), 'variants': {}}
+    for size, width in PHOTO_WIDTHS.items():
+        variant = ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS, centering=(0.5, 0.4))
+        formats = [('webp', {'quality': WEBP_QUALITY, 'method': 6})]
+        if AVIF_SUPPORTED:
+            formats.append(('avif', {'quality': AVIF_QUALITY}))
+
+        for ext, options in formats:
+            filename = variant_filename(name, size, ext)
+            path = os.path.join(folder, filename)
+            if not os.path.exists(path):
+                files.replace(path, lambda f: variant.save(f, format=ext.upper(), **options))
+            entry['variants'].setdefault(ext, {})[str(width)] = filename
+
+    _add_to_manifest(folder, entry)
+    return entry
+
+def submit(data, folder=UPLOAD_FOLDER):
+    """
+    Process a photo on the worker thread.
+
+    Args:
+        data: The uploaded bytes (already checked with verify())
+        folder: Where to store the variants
+
+    Returns:
+        A Future of the manifest entry
+    """
+    return _executor.submit(contextvars.copy_context().run, process, data, folder)
+
+def srcset(entry, ext='webp'):
+    """Return the srcset attribute of a manifest entry, or None without that format."""
+    variants = entry['variants'].get(ext)
+    if not variants:
+        return None
+    widths = sorted(variants, key=int)
+    return ', '.join(f"{PHOTOS_URL}{variants[width]} {width}w" for width in widths)
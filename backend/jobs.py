@@ -0,0 +1,177 @@
+"""
+Background sync jobs.
+
+Syncs run on a small executor shared by the scheduler, the /api/sync
+endpoint and every tenant, so the number of concurrent syncs stays bounded
+(SYNC_WORKERS) whatever the number of tenants. A tenant never has two syncs
+in flight: a sync requested while another one of the same tenant is queued
+or running attaches to it instead of starting a new one.
+
+Jobs are recorded in the tenant's database (sync_jobs), not in memory: every
+gunicorn worker sees the jobs of the others, so GET /api/sync/<job_id>
+answers on whichever worker gets the request, and a sync requested on one
+worker attaches to the one the leader's scheduler is running. A job left
+unfinished by a process that exited is marked failed by the next request;
+processes are identified by their pid together with the host boot and their
+start time, since a restarted container hands out the same pids again.
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import database
+import tenants
+
+MAX_JOBS_KEPT = 50
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', '2'))
+# Seconds between two lookups of a job running in another process
+WAIT_POLL_SECONDS = 0.1
+
+_executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix='sync')
+_lock = threading.Lock()
+# job id -> Event set when the job finishes, for the jobs this process runs
+_done = {}
+
+def _process_token(pid):
+    """
+    Identify a process beyond its pid: the host boot id and the process
+    start time (in clock ticks since boot), None where /proc is missing.
+    """
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r') as f:
+            boot_id = f.read().strip()
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # starttime is field 22; the fields after the command name start at field 3
+    return f"{boot_id}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+def _is_running(job):
+    """Whether the process running an unfinished job is still alive."""
+    if job['pid'] == os.getpid():
+        with _lock:
+            return job['id'] in _done
+    if job['process'] is not None:
+        # The pid alone may have been handed out again since a restart
+        return _process_token(job['pid']) == job['process']
+    try:
+        os.kill(job['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return True
+
+def _public(job):
+    """Return the API representation of a job."""
+    job = dict(job, tenant=tenants.current().name)
+    del job['pid'], job['process']
+    return job
+
+def submit(func, source):
+    """
+    Queue func(progress) as a job of the current tenant, or attach to the
+    tenant's job already in flight, in this process or another one.
+
+    Args:
+        func: Callable taking a progress(phase) callback and returning a
+            result dict whose 'status' is 'error' on failure
+        source: What triggered the job ('api', 'scheduler', ...)
+
+    Returns:
+        (job, created): the job and whether it was newly created
+    """
+    job = {
+        'id': uuid.uuid4().hex[:12],
+        'source': source,
+        'status': 'queued',
+        'phase': None,
+        'phases': {},
+        'attached': 0,
+        'created_at': datetime.now().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+        'duration_ms': None,
+        'result': None,
+        'error': None,
+        'pid': os.getpid(),
+        'process': _process_token(os.getpid())
+    }
+    with _lock:
+        # Registered first: the job counts as running as soon as it is recorded
+        _done[job['id']] = threading.Event()
+    new_id, created = job['id'], False
+    try:
+        job, created = database.create_sync_job(job, _is_running, MAX_JOBS_KEPT)
+    finally:
+        if not created:
+            with _lock:
+                del _done[new_id]
+
+    if created:
+        # The job runs in a copy of the caller's context, i.e. for the same tenant
+        _executor.submit(contextvars.copy_context().run, _run, job, func)
+    return _public(job), created
+
+def _run(job, func):
+    """Run a job on the executor, recording its progress and timing."""
+    start = time.perf_counter()
+    phase = [None, start]
+    phases = {}
+
+    def progress(name):
+        now = time.perf_counter()
+        if phase[0] is not None:
+            phases[phase[0]] = round((now - phase[1]) * 1000, 1)
+        phase[:] = [name, now]
+        database.update_sync_job(job['id'], phase=name, phases=phases)
+
+    try:
+        database.update_sync_job(job['id'], status='running', started_at=datetime.now().isoformat())
+        result = func(progress)
+        error = result.get('message') if result and result.get('status') == 'error' else None
+    except Exception as e:
+        result, error = None, str(e)
+
+    if phase[0] is not None:
+        phases[phase[0]] = round((time.perf_counter() - phase[1]) * 1000, 1)
+    try:
+        database.update_sync_job(
+            job['id'],
+            status='failed' if error else 'succeeded',
+            phase=None,
+            phases=phases,
+            result=result,
+            error=error,
+            finished_at=datetime.now().isoformat(),
+            duration_ms=round((time.perf_counter() - start) * 1000, 1)
+        )
+    finally:
+        with _lock:
+            _done.pop(job['id']).set()
+
+def get(job_id):
+    """Return a job of the current tenant by id, or None if unknown."""
+    job = database.get_sync_job(job_id)
+    return _public(job) if job else None
+
+def wait(job_id, timeout=None):
+    """Block until a job finishes and return it, or None if unknown."""
+    with _lock:
+        done = _done.get(job_id)
+    if done is not None:
+        done.wait(timeout)
+        return get(job_id)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = get(job_id)
+        if job is None or job['finished_at'] is not None:
+            return job
+        if deadline is not None and time.monotonic() >= deadline:
+            return job
+        time.sleep(WAIT_POLL_SECONDS)
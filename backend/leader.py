@@ -0,0 +1,55 @@
+"""
+Scheduler leadership across serving processes.
+
+When several processes serve the same database (e.g. gunicorn workers),
+exactly one of them must schedule syncs: the one holding an exclusive flock
+on a lock file next to the database. The kernel releases the lock when its
+holder exits, and one of the waiting processes takes over.
+"""
+import fcntl
+import os
+import threading
+import time
+
+_lock_file = None
+
+def try_acquire(path):
+    """Try to take the leader lock without blocking, return True if held."""
+    global _lock_file
+
+    if _lock_file is not None:
+        return True
+
+    lock_file = open(path, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    _lock_file = lock_file
+    return True
+
+def run_when_leader(path, on_elected, retry_seconds=5):
+    """
+    Call on_elected once this process becomes the leader.
+
+    Returns True if the lock was taken right away (on_elected has run),
+    otherwise keeps retrying in a background thread and returns False.
+    """
+    if try_acquire(path):
+        on_elected()
+        return True
+
+    def wait_for_lock():
+        while not try_acquire(path):
+            time.sleep(retry_seconds)
+        print(f"Process {os.getpid()} became the scheduler leader")
+        on_elected()
+
+    threading.Thread(target=wait_for_lock, name='leader-election', daemon=True).start()
+    return False
@@ -0,0 +1,267 @@
+"""
+Prometheus-style metrics, served in the text exposition format by /api/metrics.
+
+Metrics are plain in-process counters, histograms and gauges, updated by
+decorators and context managers around the hot paths (request handling,
+database queries, sync phases, Google API calls): recording a sample costs
+a perf_counter() call and a few dict operations under a lock, so it can stay
+on in production on a Raspberry Pi.
+
+With several gunicorn workers, each worker only sees its own requests.
+When METRICS_DIR is set (gunicorn.conf.py sets it), every worker writes its
+samples to <METRICS_DIR>/<pid>.json every METRICS_EXPORT_SECONDS and
+render() merges the files of the other workers with its own live values:
+counters and histograms are summed (including those of exited workers, so
+they never go backwards), gauges of live workers are summed or maxed.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+import files
+
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+EXPORT_SECONDS = float(os.getenv('METRICS_EXPORT_SECONDS', '5'))
+PREFIX = 'jeece_'
+
+# Seconds: from a cached SQLite read (~100 µs) to a slow Google API call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+class _Metric:
+    """A metric family: one value per combination of label values."""
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            if self.name in _registry:
+                raise ValueError(f"Duplicate metric {self.name}")
+            _registry[self.name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        """Return {label values: value} (a copy, safe to serialize)."""
+        with self._lock:
+            return dict(self._values)
+
+class Counter(_Metric):
+    """A value that only goes up (requests served, errors...)."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Histogram(_Metric):
+    """Observations (durations) counted in cumulative buckets, with their sum."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, +Inf, then the sum of the observations
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            return {key: list(counts) for key, counts in self._values.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+class Gauge(_Metric):
+    """
+    A value read when rendered, from a callback returning {label values: value}.
+
+    merge tells how the values of several workers combine: 'sum' (clients
+    connected to each worker) or 'max' (data version).
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), callback=None, merge='sum'):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+        self.merge = merge
+
+    def samples(self):
+        return {tuple(str(value) for value in key): value for key, value in self.callback().items()}
+
+def timed(histogram, **labels):
+    """
+    Decorate a function to observe its duration in histogram.
+
+    A 'function' label, if the histogram has one, is set to the function name.
+    """
+    def decorator(func):
+        func_labels = dict(labels, function=func.__name__) if 'function' in histogram.labels else labels
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **func_labels)
+        return wrapper
+    return decorator
+
+def _collect():
+    """Return {metric name: samples} for this process."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.samples() for metric in metrics}
+
+def _dump_path(pid):
+    return os.path.join(METRICS_DIR, f'{pid}.json')
+
+def export():
+    """Write this process's samples where the other workers can merge them."""
+    collected = {
+        name: [[list(key), value] for key, value in samples.items()]
+        for name, samples in _collect().items()
+    }
+    content = json.dumps(collected, separators=(',', ':')).encode('utf-8')
+    files.replace(_dump_path(os.getpid()), lambda f: f.write(content))
+
+def _export_loop():
+    while True:
+        time.sleep(EXPORT_SECONDS)
+        try:
+            export()
+        except Exception as e:
+            print(f"Metrics export failed: {e}")
+
+def start_exporter():
+    """Start exporting this process's samples (only when METRICS_DIR is set)."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    export()
+    threading.Thread(target=_export_loop, name='metrics-exporter', daemon=True).start()
+
+def clear_exports():
+    """Forget the samples of previous runs (called by the gunicorn master at startup)."""
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return
+    for filename in os.listdir(METRICS_DIR):
+        if filename.endswith('.json') or filename.endswith('.tmp'):
+            os.remove(os.path.join(METRICS_DIR, filename))
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merge(metric, merged, samples, alive):
+    for key, value in samples.items():
+        key = tuple(key)
+        current = merged.get(key)
+        if metric.type == 'histogram':
+            merged[key] = value if current is None else [a + b for a, b in zip(current, value)]
+        elif metric.type == 'counter':
+            merged[key] = value + (current or 0)
+        elif alive:
+            merged[key] = value if current is None else (
+                max(current, value) if metric.merge == 'max' else current + value
+            )
+
+def _collect_all():
+    """Return {metric name: samples} merged over every worker."""
+    collected = _collect()
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return collected
+
+    with _registry_lock:
+        metrics = dict(_registry)
+    merged = {name: {} for name in collected}
+    for name, samples in collected.items():
+        _merge(metrics[name], merged[name], samples, True)
+
+    own = f'{os.getpid()}.json'
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith('.json') or filename == own:
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename), 'r', encoding='utf-8') as f:
+                exported = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _alive(int(filename[:-len('.json')]))
+        for name, samples in exported.items():
+            if name in metrics:
+                _merge(metrics[name], merged[name], {tuple(key): value for key, value in samples}, alive)
+    return merged
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = dict(_registry)
+    lines = []
+    for name, samples in sorted(_collect_all().items()):
+        metric = metrics[name]
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for key, value in sorted(samples.items()):
+            if metric.type != 'histogram':
+                lines.append(f'{name}{_format_labels(metric.labels, key)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                labels = _format_labels(metric.labels, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{name}_bucket{labels} {cumulative}')
+            labels = _format_labels(metric.labels, key)
+            lines.append(f'{name}_sum{labels} {_format_value(float(value[-1]))}')
+            lines.append(f'{name}_count{labels} {cumulative}')
+    return '\n'.join(lines) + '\n'
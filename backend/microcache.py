@@ -0,0 +1,91 @@
+"""
+Single-flight microcache for the read endpoints.
+
+Right after a data change, every kiosk refreshes at the same moment. A
+request arriving while an identical one (same tenant, URL and data version)
+is being computed waits for it and shares its response, like
+google_sheets.fetch_kpi_data does for fetches; the response is then kept
+for MICROCACHE_TTL_SECONDS. A burst therefore costs one computation per
+endpoint and worker instead of one per kiosk.
+
+The data version is part of the key, so a new version is never answered
+with a response computed from the previous one. Only 200 responses are
+kept past their computation.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+from flask import current_app, request
+import metrics
+import snapshot
+import tenants
+
+TTL_SECONDS = float(os.getenv('MICROCACHE_TTL_SECONDS', '1'))
+MAX_ENTRIES = 64
+
+REQUESTS = metrics.Counter(
+    'microcache_requests_total', 'Read requests by microcache outcome (computed, shared, cached)',
+    ['endpoint', 'outcome']
+)
+
+_lock = threading.Lock()
+# key -> (expiry, future); expiry is None while the response is being computed
+_entries = OrderedDict()
+
+def _lookup(key):
+    """Return (future, outcome), outcome being 'computed' when the caller must compute it."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            expiry, future = entry
+            if expiry is None:
+                return future, 'shared'
+            if expiry > now:
+                return future, 'cached'
+            del _entries[key]
+
+        future = Future()
+        _entries[key] = (None, future)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+        return future, 'computed'
+
+def _settle(key, future, keep):
+    """Keep the computed response for TTL_SECONDS, or forget it."""
+    with _lock:
+        if _entries.get(key, (None, None))[1] is not future:
+            return  # Evicted meanwhile
+        if keep:
+            _entries[key] = (time.monotonic() + TTL_SECONDS, future)
+        else:
+            del _entries[key]
+
+def cached(view):
+    """Share the response of a read view between identical concurrent requests."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if TTL_SECONDS <= 0:
+            return view(*args, **kwargs)
+
+        key = (tenants.current().name, snapshot.get_snapshot().version, request.full_path)
+        future, outcome = _lookup(key)
+        REQUESTS.inc(endpoint=view.__name__, outcome=outcome)
+
+        if outcome != 'computed':
+            body, status, headers = future.result()
+            return current_app.response_class(body, status=status, headers=headers)
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+            future.set_result((response.get_data(), response.status_code, list(response.headers)))
+        except Exception as e:
+            future.set_exception(e)
+            _settle(key, future, keep=False)
+            raise
+        _settle(key, future, keep=response.status_code == 200)
+        return response
+    return wrapper
@@ -0,0 +1,237 @@
+"""
+Versioned schema migrations of the tenant databases.
+
+The schema_version table records the migrations applied to a database.
+database.init_db() applies the missing ones at startup, each in its own
+transaction together with its schema_version row: a failed migration leaves
+the database at the previous version and runs again at the next start. The
+runner takes the write lock (BEGIN IMMEDIATE) before checking the version,
+so processes starting together (gunicorn workers) never apply one twice.
+
+Databases created before schema_version existed already have part of the
+schema, so every migration is idempotent (IF NOT EXISTS, columns only added
+when missing). Once a database is migrated, the rest of the code can rely on
+every table, column and index below.
+
+To change the schema, append a migration to MIGRATIONS; never edit or
+reorder the released ones.
+"""
+
+def _add_column_if_missing(cursor, table, column, definition):
+    """Add a column to a table created by an older version of the schema."""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def _initial_schema(cursor):
+    # Table pour les KPI globaux
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kpi_global (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chiffre_affaire REAL NOT NULL,
+            objectif_annuel REAL DEFAULT 100000,
+            objectif_decembre REAL DEFAULT 0,
+            wr REAL DEFAULT 0,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Table pour les chefs de projet
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chef_projet (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom TEXT NOT NULL,
+            prenom TEXT NOT NULL,
+            chiffre_affaire REAL NOT NULL,
+            photo_filename TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(nom, prenom)
+        )
+    ''')
+
+    # Table pour l'historique des mises à jour
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS update_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            message TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Table pour les autres objectifs
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS autres_objectifs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom TEXT NOT NULL,
+            valeur REAL NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _kpi_objectives(cursor):
+    # Bases créées avant les objectifs de décembre et WR (ancien migrate_db.py)
+    _add_column_if_missing(cursor, 'kpi_global', 'objectif_decembre', 'REAL DEFAULT 0')
+    _add_column_if_missing(cursor, 'kpi_global', 'wr', 'REAL DEFAULT 0')
+
+def _app_state(cursor):
+    # Table pour l'état de l'application (version des données, ...)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value
+        )
+    ''')
+
+def _leaderboard(cursor):
+    # Classement et variations depuis la version précédente, calculés à la synchro
+    _add_column_if_missing(cursor, 'chef_projet', 'rank', 'INTEGER')
+    _add_column_if_missing(cursor, 'chef_projet', 'previous_rank', 'INTEGER')
+    _add_column_if_missing(cursor, 'chef_projet', 'chiffre_affaire_delta', 'REAL')
+    _add_column_if_missing(cursor, 'update_log', 'rows_changed', 'INTEGER DEFAULT 0')
+
+def _cdp_history(cursor):
+    # Table pour l'historique du CA par chef de projet (un point par changement)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cdp_history (
+            nom TEXT NOT NULL,
+            prenom TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            chiffre_affaire REAL NOT NULL,
+            PRIMARY KEY (nom, prenom, ts)
+        ) WITHOUT ROWID
+    ''')
+    # Covering index for time-range queries over every CDP
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cdp_history_ts
+        ON cdp_history (ts, nom, prenom, chiffre_affaire)
+    ''')
+    # Seed the history with the current values of existing databases
+    cursor.execute('''
+        INSERT OR IGNORE INTO cdp_history (nom, prenom, ts, chiffre_affaire)
+        SELECT nom, prenom, CAST(strftime('%s', timestamp) AS INTEGER), chiffre_affaire
+        FROM chef_projet
+        WHERE NOT EXISTS (SELECT 1 FROM cdp_history)
+    ''')
+
+def _kpi_rollup(cursor):
+    # Table pour les agrégats horaires/journaliers/mensuels des KPI globaux
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kpi_rollup (
+            resolution TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            chiffre_affaire_min REAL NOT NULL,
+            chiffre_affaire_max REAL NOT NULL,
+            chiffre_affaire_last REAL NOT NULL,
+            objectif_annuel REAL,
+            objectif_decembre REAL,
+            wr REAL,
+            last_ts INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (resolution, bucket)
+        ) WITHOUT ROWID
+    ''')
+
+def _snapshot_cache(cursor):
+    # Table pour le dernier snapshot encodé (démarrage sans reconstruction)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_cache (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            built_at TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            payload_gzip BLOB NOT NULL,
+            payload_br BLOB
+        )
+    ''')
+
+def _read_indexes(cursor):
+    # Latest KPI row, history ranges and compaction
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_kpi_global_timestamp ON kpi_global (timestamp)')
+    # Update log pruning
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_update_log_timestamp ON update_log (timestamp)')
+    # Last successful update (WHERE status = 'success' ORDER BY timestamp DESC LIMIT 1)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_update_log_status_timestamp ON update_log (status, timestamp)')
+
+def _sync_jobs(cursor):
+    # Table des synchronisations en arrière-plan, partagée par les workers gunicorn
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_jobs (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL,
+            phase TEXT,
+            phases TEXT NOT NULL DEFAULT '{}',
+            attached INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            duration_ms REAL,
+            result TEXT,
+            error TEXT,
+            pid INTEGER NOT NULL
+        )
+    ''')
+    # Jobs in flight (dedupe) and pruning of the finished ones
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_jobs_finished_at ON sync_jobs (finished_at)')
+
+def _sync_job_process(cursor):
+    # Identité du processus d'un job (les pid sont réutilisés après un redémarrage)
+    _add_column_if_missing(cursor, 'sync_jobs', 'process', 'TEXT')
+
+MIGRATIONS = [
+    ('initial schema', _initial_schema),
+    ('kpi_global objectif_decembre and wr', _kpi_objectives),
+    ('app_state', _app_state),
+    ('leaderboard ranks and deltas', _leaderboard),
+    ('cdp_history', _cdp_history),
+    ('kpi_rollup', _kpi_rollup),
+    ('snapshot_cache', _snapshot_cache),
+    ('read indexes', _read_indexes),
+    ('sync_jobs', _sync_jobs),
+    ('sync_jobs process', _sync_job_process),
+]
+LATEST_VERSION = len(MIGRATIONS)
+
+def _schema_version(cursor):
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    return cursor.fetchone()[0] or 0
+
+def migrate(conn):
+    """
+    Apply the missing migrations to a database.
+
+    Returns:
+        The list of (version, name) applied, empty if it was up to date
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor = conn.cursor()
+    if _schema_version(cursor) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for version, (name, migration) in enumerate(MIGRATIONS, start=1):
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Checked under the write lock: another process may have just applied it
+            if _schema_version(cursor) < version:
+                migration(cursor)
+                cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+                applied.append((version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+def schema_version(conn):
+    """Return the schema version of a database (0 before any migration)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+    return _schema_version(cursor) if cursor.fetchone() else 0
@@ -0,0 +1,108 @@
+"""
+Static publishing of the dashboard reads.
+
+After each snapshot rebuild, the dashboard payload (with its pre-compressed
+.gz and .br siblings), the data version answered by /api/last-modified and a
+manifest describing them are written to PUBLISH_DIR, laid out like the API
+URLs:
+
+    <PUBLISH_DIR>/api/dashboard.json(.gz, .br)      default tenant
+    <PUBLISH_DIR>/api/last-modified.json
+    <PUBLISH_DIR>/api/manifest.json
+    <PUBLISH_DIR>/api/<tenant>/...                  every tenant
+
+The frontend nginx serves these files directly (gzip_static), so kiosk
+reads never reach Flask; it falls back to the backend while they do not
+exist yet. Every file is written to a temporary file and renamed into
+place, so nginx never serves a partial one.
+
+Every gunicorn worker rebuilds its snapshots, so several processes may
+publish the same tenant: a flock per folder and the version in the manifest
+make sure an older snapshot never replaces a newer one.
+"""
+import fcntl
+import hashlib
+import json
+import os
+from datetime import datetime
+import files
+import tenants
+
+PUBLISH_DIR = os.getenv('PUBLISH_DIR', '')
+MANIFEST_FILENAME = 'manifest.json'
+
+# Folders this process has published to: the first publish always overwrites,
+# in case the database (and its version counter) was reset since the last run
+_published = set()
+
+def tenant_dirs(tenant):
+    """Return the folders the files of tenant are published to."""
+    base = os.path.join(PUBLISH_DIR, 'api')
+    dirs = [os.path.join(base, tenant.name)]
+    if tenant.name == tenants.default().name:
+        # Also served by the legacy /api/... routes
+        dirs.append(base)
+    return dirs
+
+def _write(folder, filename, content):
+    """Write a file through a temporary file renamed into place."""
+    # nginx runs as another user
+    files.replace(os.path.join(folder, filename), lambda f: f.write(content), mode=0o644)
+
+def _published_version(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f).get('version')
+    except (OSError, ValueError):
+        return None
+
+def _publish_to(folder, snapshot):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, '.publish.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        published = _published_version(folder)
+        if folder in _published and published is not None and published >= snapshot.version:
+            return False
+
+        files = {
+            'dashboard.json.gz': snapshot.payload_gzip,
+            'dashboard.json.br': snapshot.payload_br,
+            # The uncompressed file last: it is what nginx looks up first
+            'dashboard.json': snapshot.payload,
+            'last-modified.json': json.dumps({'last_modified': snapshot.version}).encode('utf-8'),
+        }
+        manifest = {
+            'version': snapshot.version,
+            'last_update': snapshot.last_update,
+            'published_at': datetime.now().isoformat(),
+            'files': {}
+        }
+        for filename, content in files.items():
+            if content is None:
+                # No brotli here: do not let nginx serve an older payload
+                if os.path.exists(os.path.join(folder, filename)):
+                    os.remove(os.path.join(folder, filename))
+                continue
+            _write(folder, filename, content)
+            manifest['files'][filename] = {
+                'bytes': len(content),
+                'sha256': hashlib.sha256(content).hexdigest()
+            }
+        _write(folder, MANIFEST_FILENAME, json.dumps(manifest, indent=2).encode('utf-8'))
+        _published.add(folder)
+        return True
+
+def publish(snapshot):
+    """
+    Publish the current tenant's snapshot (no-op without PUBLISH_DIR).
+
+    Returns:
+        True if files were written, False if disabled or already published
+    """
+    if not PUBLISH_DIR:
+        return False
+    written = False
+    for folder in tenant_dirs(tenants.current()):
+        written = _publish_to(folder, snapshot) or written
+    return written
@@ -0,0 +1,238 @@
+"""
+In-memory snapshot of the dashboard data.
+
+The dashboard data only changes when a sync runs or when the admin interface
+saves the configuration, so read endpoints serve this snapshot from RAM
+instead of querying SQLite on every request. A new snapshot is built and
+swapped in atomically after each change; readers always see a complete one.
+
+The aggregated dashboard payload is serialized and compressed once per
+snapshot, so serving it costs no JSON encoding on the request path. The
+display metrics (progress, shares, rank changes) are derived at the same
+time, so neither the request path nor the kiosk browsers compute them.
+
+Each snapshot carries the data version counter stored in the database, which
+writers bump in the transaction of their change (syncs and admin patches in
+database._finish_sync, photo renames in database.rename_photo) before
+rebuilding. Processes sharing the database follow that counter to pick up
+each other's writes.
+
+Each rebuilt snapshot is also saved in the database, so a restarting process
+serves the last one right away (warm_start) instead of rebuilding and
+compressing it before the first request; the follower catches up with any
+newer data version in the background.
+
+Every tenant has its own snapshot; the functions below work on the current
+tenant (see tenants.current()).
+"""
+import gzip
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+import database
+import events
+import images
+import metrics
+import publish
+import tenants
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+Snapshot = namedtuple('Snapshot', [
+    'version',
+    'built_at',
+    'kpi',
+    'cdp_list',
+    'autres_objectifs',
+    'last_update',
+    'payload',
+    'payload_gzip',
+    'payload_br',
+])
+
+DEFAULT_KPI = {'chiffre_affaire': 0, 'objectif_annuel': 100000, 'objectif_decembre': 0, 'wr': 0, 'timestamp': None}
+
+def _percent(value, target):
+    """value as a percentage of target, rounded to 0.1, or None without a target."""
+    return round(value / target * 100, 1) if target else None
+
+def compute_metrics(data, photos=None):
+    """
+    Derive the display metrics of a data version, once, instead of per render.
+
+    Adds to the KPI the progress towards each objective ('progress', in % of
+    each objective, uncapped) and the position of the December objective and
+    WR lines on the annual progress bar ('markers', in % of the annual
+    objective, capped at 100). Adds to each chef de projet its 'share' of the
+    total revenue and 'rank_change' (positive when moving up, None when new),
+    and to each autre objectif its 'progress'. Ranks and revenue deltas are
+    stored by the sync (database._update_leaderboard).
+
+    photos is the manifest of processed photos (images.load_manifest()):
+    chefs de projet with a processed photo also get its 'photo_srcset' and
+    'photo_avif_srcset' (None without AVIF variants).
+    """
+    photos = photos or {}
+    kpi = dict(data['kpi'] or DEFAULT_KPI)
+    total = kpi['chiffre_affaire']
+    objectif_annuel = kpi['objectif_annuel'] or DEFAULT_KPI['objectif_annuel']
+    kpi['progress'] = {
+        'objectif_annuel': _percent(total, objectif_annuel),
+        'objectif_decembre': _percent(total, kpi['objectif_decembre']),
+        'wr': _percent(total, kpi['wr'])
+    }
+    kpi['markers'] = {
+        'objectif_decembre': min(100, _percent(kpi['objectif_decembre'] or 0, objectif_annuel)),
+        'wr': min(100, _percent(kpi['wr'] or 0, objectif_annuel))
+    }
+
+    cdp_list = [dict(
+        cdp,
+        share=_percent(cdp['chiffre_affaire'], total) or 0,
+        rank_change=None if cdp['previous_rank'] is None or cdp['rank'] is None else cdp['previous_rank'] - cdp['rank']
+    ) for cdp in data['cdp_list']]
+    for cdp in cdp_list:
+        photo = photos.get(cdp['photo_filename'])
+        if photo is not None:
+            cdp['photo_srcset'] = images.srcset(photo)
+            cdp['photo_avif_srcset'] = images.srcset(photo, 'avif')
+
+    autres_objectifs = [dict(objectif, progress=_percent(total, objectif['valeur'])) for objectif in data['autres_objectifs']]
+
+    return dict(data, kpi=kpi, cdp_list=cdp_list, autres_objectifs=autres_objectifs)
+
+def encode_payload(version, data):
+    """Serialize the aggregated dashboard payload and its compressed variants."""
+    payload = json.dumps({
+        'version': version,
+        'kpi': data['kpi'],
+        'cdp': data['cdp_list'],
+        'autres_objectifs': data['autres_objectifs'],
+        'last_update': data['last_update']
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    payload_gzip = gzip.compress(payload, compresslevel=9, mtime=0)
+    payload_br = brotli.compress(payload, quality=11) if brotli else None
+    return payload, payload_gzip, payload_br
+
+_lock = threading.Lock()
+_rebuild_locks = {}
+_current = {}
+# Tenants served from their saved snapshot, not yet rebuilt by this process
+_warm = set()
+
+metrics.Gauge(
+    'snapshot_version', 'Data version served by the in-memory snapshot', ['tenant'],
+    callback=lambda: {(name,): current.version for name, current in list(_current.items())},
+    merge='max'
+)
+
+def _rebuild_lock(name):
+    """Return the lock serializing the rebuilds of a tenant's snapshot."""
+    with _lock:
+        return _rebuild_locks.setdefault(name, threading.Lock())
+
+def rebuild():
+    """Rebuild the snapshot from the database and publish it to SSE clients and PUBLISH_DIR."""
+    name = tenants.current().name
+
+    # Serialize rebuilds so versions are published in order
+    with _rebuild_lock(name):
+        data = compute_metrics(database.get_dashboard_data(), images.load_manifest())
+        payload, payload_gzip, payload_br = encode_payload(data['version'], data)
+        _warm.discard(name)
+        snapshot = _current[name] = Snapshot(
+            version=data['version'],
+            built_at=datetime.now().isoformat(),
+            kpi=data['kpi'],
+            cdp_list=tuple(data['cdp_list']),
+            autres_objectifs=tuple(data['autres_objectifs']),
+            last_update=data['last_update'],
+            payload=payload,
+            payload_gzip=payload_gzip,
+            payload_br=payload_br
+        )
+        events.publish(snapshot)
+        # Neither is needed to serve this snapshot: a failure only costs the
+        # next warm start, or sends nginx to the backend until the next rebuild
+        try:
+            database.save_snapshot(snapshot.version, snapshot.built_at, payload, payload_gzip, payload_br)
+        except Exception as e:
+            print(f"⚠️ Could not save the snapshot: {e}")
+        try:
+            publish.publish(snapshot)
+        except OSError as e:
+            print(f"⚠️ Could not publish the dashboard files: {e}")
+        return snapshot
+
+def warm_start():
+    """
+    Serve the current tenant's last saved snapshot until the next rebuild.
+
+    Costs a query and a JSON parse, instead of a rebuild. The saved snapshot
+    may be older than the database (e.g. the process stopped before saving
+    it) or come from an older version of this code, so the follower rebuilds
+    it in the background all the same.
+
+    Returns:
+        The loaded snapshot, or None if none was saved yet
+    """
+    name = tenants.current().name
+    row = database.get_saved_snapshot()
+    if row is None:
+        return None
+
+    data = json.loads(row['payload'])
+    saved = Snapshot(
+        version=row['version'],
+        built_at=row['built_at'],
+        kpi=data['kpi'],
+        cdp_list=tuple(data['cdp']),
+        autres_objectifs=tuple(data['autres_objectifs']),
+        last_update=data['last_update'],
+        payload=row['payload'],
+        payload_gzip=row['payload_gzip'],
+        payload_br=row['payload_br']
+    )
+    with _rebuild_lock(name):
+        # A rebuild that got there first is at least as recent
+        if name in _current:
+            return _current[name]
+        _current[name] = saved
+        _warm.add(name)
+        return saved
+
+def get_snapshot():
+    """Return the current snapshot, building it on first access."""
+    snapshot = _current.get(tenants.current().name)
+    if snapshot is None:
+        snapshot = rebuild()
+    return snapshot
+
+def start_follower(interval):
+    """
+    Rebuild each tenant's snapshot whenever its data version moves, and
+    once after warm_start.
+
+    Another process (e.g. another gunicorn worker) may have synced; polling
+    the version from a background thread keeps the request path DB-free.
+    """
+    def follow():
+        while True:
+            time.sleep(interval)
+            for tenant in tenants.all_tenants():
+                try:
+                    with tenants.use(tenant):
+                        version = database.get_state('data_version', 0)
+                        snapshot = _current.get(tenant.name)
+                        if snapshot is None or version != snapshot.version or tenant.name in _warm:
+                            rebuild()
+                except Exception as e:
+                    print(f"Snapshot refresh failed for tenant {tenant.name}: {e}")
+
+    threading.Thread(target=follow, name='snapshot-follower', daemon=True).start()
@@ -0,0 +1,140 @@
+"""
+Tenant registry: several dashboards served by one backend process.
+
+Each tenant has its own source (Google Sheet or config.json), sync interval,
+SQLite database and in-memory snapshot, while the process, the Flask app,
+the Google client and the sync worker pool are shared. Tenants are listed in
+TENANTS_FILE; without it the process serves a single 'default' tenant
+configured by the usual environment variables, as before.
+
+The tenant the running code works for is held in a context variable: request
+handlers, sync jobs and background threads enter it with use(tenant), and
+the database, snapshot, events and jobs modules read it with current().
+
+TENANTS_FILE example (fields left out take the environment defaults, the
+first tenant also answers the legacy /api/... routes):
+
+    {
+      "pole-conseil": {"spreadsheet_id": "1AbC...", "sheet_range": "Conseil!A:C"},
+      "2025": {"offline_mode": true, "update_interval_minutes": 60}
+    }
+"""
+import contextvars
+import json
+import os
+import re
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+TENANTS_FILE = os.getenv('TENANTS_FILE', '')
+DEFAULT_TENANT = 'default'
+
+# Names are used in URLs and file names; 'admin' and 'sync' would shadow API routes
+TENANT_NAME = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+RESERVED_NAMES = {'admin', 'sync'}
+
+Tenant = namedtuple('Tenant', [
+    'name',
+    'offline_mode',
+    'spreadsheet_id',
+    'sheet_range',
+    'config_file_path',
+    'database_path',
+    'update_interval_minutes',
+])
+
+_current = contextvars.ContextVar('tenant', default=None)
+
+def _from_env():
+    """Build the tenant described by the environment variables."""
+    return Tenant(
+        name=DEFAULT_TENANT,
+        offline_mode=os.getenv('OFFLINE_MODE', 'false').lower() == 'true',
+        spreadsheet_id=os.getenv('GOOGLE_SPREADSHEET_ID', ''),
+        sheet_range=os.getenv('GOOGLE_SHEET_RANGE', 'Sheet1!A1:C100'),
+        config_file_path=os.getenv('CONFIG_FILE_PATH', '/app/config.json'),
+        database_path=os.getenv('DATABASE_PATH', '/app/data/jeece.db'),
+        update_interval_minutes=int(os.getenv('UPDATE_INTERVAL_MINUTES', '15'))
+    )
+
+def load(path=TENANTS_FILE):
+    """
+    Load the tenant registry.
+
+    Args:
+        path: JSON file mapping tenant names to their settings, or '' for
+            the single tenant configured by the environment
+
+    Returns:
+        OrderedDict of Tenant by name, the default tenant first
+
+    Raises:
+        ValueError: If a tenant name or setting is invalid
+    """
+    base = _from_env()
+    if not path:
+        return OrderedDict([(base.name, base)])
+
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f, object_pairs_hook=OrderedDict)
+
+    registry = OrderedDict()
+    for name, settings in entries.items():
+        if not TENANT_NAME.match(name) or name in RESERVED_NAMES:
+            raise ValueError(f"Invalid tenant name: {name!r}")
+        unknown = set(settings) - set(Tenant._fields)
+        if unknown:
+            raise ValueError(f"Unknown settings for tenant {name!r}: {', '.join(sorted(unknown))}")
+
+        # Each tenant gets its own database and config.json next to the default ones
+        defaults = base._replace(
+            name=name,
+            spreadsheet_id='',
+            config_file_path=os.path.join(os.path.dirname(base.config_file_path), f'config.{name}.json'),
+            database_path=os.path.join(os.path.dirname(base.database_path), f'{name}.db')
+        )
+        registry[name] = defaults._replace(**{key: value for key, value in settings.items() if key != 'name'})
+
+    if not registry:
+        raise ValueError(f"No tenant defined in {path}")
+    return registry
+
+_registry = load()
+
+def all_tenants():
+    """Return every tenant, the default one first."""
+    return list(_registry.values())
+
+def get(name):
+    """Return a tenant by name, or None if unknown."""
+    return _registry.get(name)
+
+def default():
+    """Return the tenant served by the legacy /api/... routes."""
+    return next(iter(_registry.values()))
+
+def current():
+    """Return the tenant the running code works for (the default one outside use())."""
+    return _current.get() or default()
+
+def activate(tenant):
+    """Make tenant current and return the token to pass to deactivate()."""
+    return _current.set(tenant)
+
+def deactivate(token):
+    """Restore the tenant that was current before activate()."""
+    _current.reset(token)
+
+@contextmanager
+def use(tenant):
+    """Run the enclosed block for tenant."""
+    token = activate(tenant)
+    try:
+        yield tenant
+    finally:
+        deactivate(token)
+
+def call(tenant, func, *args, **kwargs):
+    """Call func for tenant, e.g. from a scheduler or watcher thread."""
+    with use(tenant):
+        return func(*args, **kwargs)
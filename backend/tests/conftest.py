@@ -0,0 +1,83 @@
+"""
+Fixtures shared by the backend tests.
+
+Every test runs against a fresh offline tenant: a throwaway config.json and
+SQLite database in a temporary folder, synced once. The backend modules read
+their configuration from the environment at import time, so it is set here,
+before any of them is imported.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix='jeece-tests-')
+os.environ.update({
+    'OFFLINE_MODE': 'true',
+    'CONFIG_FILE_PATH': os.path.join(WORKDIR, 'config.json'),
+    'DATABASE_PATH': os.path.join(WORKDIR, 'jeece.db'),
+    'UPLOAD_FOLDER': os.path.join(WORKDIR, 'photos'),
+    'PUBLISH_DIR': '',
+    'MICROCACHE_TTL_SECONDS': '0',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin_config  # noqa: E402
+import app  # noqa: E402
+import database  # noqa: E402
+import snapshot  # noqa: E402
+import tenants  # noqa: E402
+
+def make_config(cdp_count=3):
+    """A valid config.json payload with cdp_count chefs de projet."""
+    return {
+        'objectif_annuel': 100000,
+        'objectif_decembre': 40000,
+        'wr': 80000,
+        'chiffre_affaire_total': 50000,
+        'autres_objectifs': [{'nom': 'Formations', 'valeur': 12}],
+        'chefs_projet': [{
+            'nom': f'Nom{i}',
+            'prenom': f'Prenom{i}',
+            'chiffre_affaire': 1000 * (i + 1),
+            'photo_filename': f'cdp_{i}.jpg'
+        } for i in range(cdp_count)]
+    }
+
+def write_config(config):
+    """Replace the tenant's config.json, as a hand edit would."""
+    with open(os.environ['CONFIG_FILE_PATH'], 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+@pytest.fixture
+def tenant():
+    """Enter the default tenant, with a fresh config.json and database synced from it."""
+    # Emptied rather than deleted: sync threads keep their connection open
+    with sqlite3.connect(os.environ['DATABASE_PATH']) as conn:
+        tables = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        for (table,) in tables:
+            conn.execute(f'DROP TABLE {table}')
+    admin_config._cache.clear()
+    snapshot._current.clear()
+    os.makedirs(os.environ['UPLOAD_FOLDER'], exist_ok=True)
+    write_config(make_config())
+
+    database.init_db()
+    with tenants.use(tenants.default()):
+        assert app.sync_data_from_sheets()['status'] == 'success'
+        yield tenants.default()
+    database.close_db_connection()
+
+@pytest.fixture
+def client(tenant):
+    """Flask test client of the API."""
+    return app.create_app().test_client()
+
+def cdps_by_name(client):
+    """The chefs de projet served by /api/cdp, by (nom, prenom)."""
+    return {(cdp['nom'], cdp['prenom']): cdp for cdp in client.get('/api/cdp').get_json()}
@@ -0,0 +1,85 @@
+"""Tests of the admin endpoints (config edits and photo uploads)."""
+import io
+
+from PIL import Image
+
+import app
+import images
+
+def png(width=64, height=64):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def upload(client, filename, data, version=None):
+    return client.post(
+        '/api/admin/upload-photo',
+        data={'photo': (io.BytesIO(data), filename)},
+        headers={'If-Match': version} if version else {},
+        content_type='multipart/form-data'
+    )
+
+def test_an_upload_hands_back_the_config_version_it_renamed_to(client):
+    loaded = client.get('/api/admin/config')
+    version = loaded.headers['ETag'].strip('"')
+
+    response = upload(client, 'cdp_0.jpg', png(), version)
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['original'] == 'cdp_0.jpg'
+    assert result['version'] and result['version'] != version
+    # The page saves over its own rename without a 412
+    patch = client.patch('/api/admin/config', headers={'If-Match': result['version']}, json={
+        'operations': [{'op': 'set', 'field': 'wr', 'value': 1000}]
+    })
+    assert patch.status_code == 200
+
+def test_an_upload_over_another_edit_does_not_hand_back_a_version(client):
+    stale = client.get('/api/admin/config').headers['ETag'].strip('"')
+    client.patch('/api/admin/config', json={'operations': [{'op': 'set', 'field': 'wr', 'value': 1000}]})
+
+    result = upload(client, 'cdp_0.jpg', png(), stale).get_json()
+
+    assert result['version'] is None
+
+def test_an_oversized_upload_is_refused_before_being_read(tenant, monkeypatch):
+    monkeypatch.setattr(images, 'MAX_UPLOAD_BYTES', 1024)
+    client = app.create_app().test_client()
+
+    response = upload(client, 'big.png', b'\0' * (1024 + app.MULTIPART_OVERHEAD_BYTES + 1))
+
+    assert response.status_code == 413
+    assert 'too large' in response.get_json()['error']
+
+def test_a_patch_clears_a_photo(client):
+    from conftest import cdps_by_name
+
+    version = client.get('/api/admin/config').headers['ETag']
+
+    response = client.patch('/api/admin/config', headers={'If-Match': version}, json={'operations': [
+        {'op': 'update_cdp', 'nom': 'Nom0', 'prenom': 'Prenom0', 'photo_filename': None}
+    ]})
+
+    assert response.status_code == 200
+    assert response.get_json()['rows_changed'] == 1
+    assert cdps_by_name(client)[('Nom0', 'Prenom0')]['photo_filename'] is None
+    assert client.get('/api/admin/config').get_json()['chefs_projet'][0]['photo_filename'] is None
+
+def test_a_patch_writes_only_the_rows_it_names(client):
+    from conftest import cdps_by_name
+
+    response = client.patch('/api/admin/config', json={'operations': [
+        {'op': 'update_cdp', 'nom': 'Nom1', 'prenom': 'Prenom1', 'chiffre_affaire': 9000},
+        {'op': 'remove_cdp', 'nom': 'Nom2', 'prenom': 'Prenom2'},
+        {'op': 'remove_objectif', 'nom': 'Formations'}
+    ]})
+
+    assert response.status_code == 200
+    assert response.get_json()['rows_changed'] == 3
+    cdps = cdps_by_name(client)
+    assert cdps[('Nom1', 'Prenom1')]['chiffre_affaire'] == 9000
+    assert ('Nom2', 'Prenom2') not in cdps
+    assert client.get('/api/autres-objectifs').get_json() == []
+    # The config watcher's follow-up sync finds nothing left to apply
+    assert app.sync_data_from_sheets()['status'] == 'unchanged'
@@ -0,0 +1,71 @@
+"""Syncs and admin writes while readers hit the SQLite-backed endpoints."""
+import threading
+import time
+
+import admin_config
+import app
+import jobs
+import tenants
+from conftest import make_config
+
+DURATION_SECONDS = 2
+READERS = 8
+
+def test_readers_and_writers_never_see_a_locked_database(client):
+    job_id = client.post('/api/sync').get_json()['job']['id']
+    jobs.wait(job_id, timeout=10)
+    flask_app = app.create_app()
+    paths = ['/api/history', '/api/history?cdp=Nom0,Prenom0', f'/api/sync/{job_id}', '/api/admin/config']
+    stop = threading.Event()
+    errors, syncs, patches, reads = [], [], [], []
+
+    def reader(offset):
+        reader_client = flask_app.test_client()
+        i = offset
+        while not stop.is_set():
+            path = paths[i % len(paths)]
+            i += 1
+            response = reader_client.get(path)
+            reads.append(path)
+            if response.status_code != 200:
+                errors.append(f"{path}: {response.status_code} {response.get_data(as_text=True)}")
+
+    def syncer():
+        with tenants.use(tenants.default()):
+            seed = 0
+            while not stop.is_set():
+                seed += 1
+                config = make_config()
+                config['chiffre_affaire_total'] += seed
+                config['chefs_projet'][0]['chiffre_affaire'] += seed
+                # Atomic, like every backend write: readers never see a half-written file
+                admin_config.write(tenants.current().config_file_path, config)
+                result = app.sync_data_from_sheets()
+                syncs.append(result['status'])
+                if result['status'] == 'error':
+                    errors.append(f"sync: {result['message']}")
+
+    def patcher():
+        patch_client = flask_app.test_client()
+        value = 0
+        while not stop.is_set():
+            value += 1
+            response = patch_client.patch('/api/admin/config', json={'operations': [
+                {'op': 'update_objectif', 'nom': 'Formations', 'valeur': value}
+            ]})
+            patches.append(response.status_code)
+            if response.status_code != 200:
+                errors.append(f"patch: {response.status_code} {response.get_data(as_text=True)}")
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads += [threading.Thread(target=syncer), threading.Thread(target=patcher)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION_SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join(30)
+
+    assert not [error for error in errors if 'locked' in error]
+    assert errors == []
+    assert syncs and patches and len(reads) > len(paths) * READERS
@@ -0,0 +1,20 @@
+"""Tests of the conditional GETs of the read endpoints (app.conditional)."""
+
+def test_a_weak_etag_from_a_gzipping_proxy_gets_a_304(client):
+    version = client.get('/api/kpi').headers['ETag'].strip('"')
+
+    response = client.get('/api/kpi', headers={'If-None-Match': f'W/"{version}"'})
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == f'W/"{version}"'
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_an_encoded_variant_only_matches_while_its_encoding_is_accepted(client):
+    response = client.get('/api/dashboard', headers={'Accept-Encoding': 'gzip'})
+    etag = response.headers['ETag']
+    assert etag.strip('"').endswith('-gzip')
+
+    assert client.get('/api/dashboard', headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'}).status_code == 304
+    plain = client.get('/api/dashboard', headers={'If-None-Match': etag, 'Accept-Encoding': 'identity'})
+    assert plain.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
@@ -0,0 +1,28 @@
+"""Tests of the row-level sync diff (database.apply_sync)."""
+from conftest import cdps_by_name
+
+def test_clearing_a_photo_reaches_the_database(client):
+    response = client.get('/api/admin/config')
+    config = response.get_json()
+    config['chefs_projet'][0]['photo_filename'] = None
+
+    response = client.put('/api/admin/config', json=config, headers={'If-Match': response.headers['ETag']})
+
+    assert response.status_code == 200
+    assert response.get_json()['rows_changed'] == 1
+    assert cdps_by_name(client)[('Nom0', 'Prenom0')]['photo_filename'] is None
+    assert cdps_by_name(client)[('Nom1', 'Prenom1')]['photo_filename'] == 'cdp_1.jpg'
+
+def test_sources_without_photos_keep_the_stored_one(tenant):
+    import app
+    import snapshot
+
+    data = app.load_config_file()
+    data['cdp_list'] = [{k: v for k, v in cdp.items() if k != 'photo_filename'} for cdp in data['cdp_list']]
+    data['cdp_list'][0]['chiffre_affaire'] += 500
+
+    status, _, rows_changed = app.store_data(data, 'sheet without photos')
+
+    assert (status, rows_changed) == ('success', 1)
+    photos = {cdp['nom']: cdp['photo_filename'] for cdp in snapshot.get_snapshot().cdp_list}
+    assert photos['Nom0'] == 'cdp_0.jpg'
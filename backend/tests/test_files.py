@@ -0,0 +1,46 @@
+"""Tests of the atomic file writes shared by the config, photos, publishing and metrics (files.py)."""
+import os
+import threading
+
+import pytest
+
+import files
+
+def test_a_failed_write_keeps_the_file_and_leaves_no_temporary_file(tmp_path):
+    path = tmp_path / 'manifest.json'
+    path.write_bytes(b'old')
+
+    def write(f):
+        f.write(b'half')
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        files.replace(str(path), write)
+
+    assert path.read_bytes() == b'old'
+    assert os.listdir(tmp_path) == ['manifest.json']
+
+def test_the_permissions_of_the_file_replaced_are_kept(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_bytes(b'{}')
+    path.chmod(0o640)
+
+    files.replace(str(path), lambda f: f.write(b'{"a": 1}'), durable=True)
+    files.replace(str(tmp_path / 'new.json'), lambda f: f.write(b'{}'))
+
+    assert path.read_bytes() == b'{"a": 1}'
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert (tmp_path / 'new.json').stat().st_mode & 0o777 == 0o644
+
+def test_concurrent_writers_do_not_share_a_temporary_file(tmp_path):
+    path = str(tmp_path / 'dashboard.json')
+    contents = [bytes([ord('a') + i]) * 100000 for i in range(8)]
+    threads = [threading.Thread(target=files.replace, args=(path, lambda f, c=c: f.write(c))) for c in contents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path, 'rb') as f:
+        assert f.read() in contents
+    assert os.listdir(tmp_path) == ['dashboard.json']
@@ -0,0 +1,130 @@
+"""Tests of the paged Google Sheets reader (google_sheets.iter_rows and parse_rows)."""
+import re
+
+import pytest
+
+import google_sheets
+
+class FakeValues:
+    """spreadsheets().values() over an in-memory sheet, trimming trailing blank rows like the API."""
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.requested = []
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        self.requested.extend(ranges)
+        value_ranges = []
+        for range_name in ranges:
+            page = re.match(r'.*!A(\d+):C(\d+)$', range_name)
+            if page is None:
+                # A whole tab or a named range covering it
+                rows = self.sheet
+            else:
+                first_row, last_row = map(int, page.groups())
+                rows = self.sheet[first_row - 1:last_row]
+            while rows and not rows[-1]:
+                rows = rows[:-1]
+            value_ranges.append({'range': range_name, 'values': rows})
+        return FakeRequest({'valueRanges': value_ranges})
+
+class FakeSpreadsheets:
+    """spreadsheets() of a spreadsheet whose only tab, Sheet1, has row_count rows."""
+
+    def __init__(self, row_count):
+        self.row_count = row_count
+        self.gets = 0
+
+    def get(self, spreadsheetId, fields=None):
+        self.gets += 1
+        return FakeRequest({'sheets': [{'properties': {'title': 'Sheet1', 'gridProperties': {'rowCount': self.row_count}}}]})
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self, http=None):
+        return self.result
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """Serve rows as Sheet1 (row_count rows, blank ones at the end) in pages of 3 rows."""
+    def serve(rows, row_count=None):
+        values = FakeValues(rows)
+        values.spreadsheets = FakeSpreadsheets(row_count or len(rows))
+        monkeypatch.setattr(google_sheets, 'PAGE_ROWS', 3)
+        monkeypatch.setattr(google_sheets, '_get_spreadsheets_api', lambda: values.spreadsheets)
+        monkeypatch.setattr(google_sheets, '_get_values_api', lambda: values)
+        monkeypatch.setattr(google_sheets, '_get_http', lambda: None)
+        return values
+    return serve
+
+ROWS = [
+    ['Nom', 'Prénom', "Chiffre d'affaire"],
+    ['Dupont', 'Marie', 1000],
+    [],  # Last row of the first page
+    ['Martin', 'Paul', 2000],
+    ['Durand', 'Léa', 'douze'],
+    ['TOTAL', '', 3000],
+]
+
+def test_a_bounded_range_is_read_past_a_blank_row_at_a_page_boundary(sheet):
+    values = sheet(ROWS)
+
+    data = google_sheets.parse_rows(google_sheets.iter_rows('sheet-id', ['Sheet1!A1:C8']))
+
+    assert [cdp['nom'] for cdp in data['cdp_list']] == ['Dupont', 'Martin']
+    assert data['total'] == 3000
+    assert data['rejected']['count'] == 1
+    assert data['rejected']['rows'][0]['row'] == 5
+    assert values.requested == ['Sheet1!A1:C3', 'Sheet1!A4:C6', 'Sheet1!A7:C8']
+    assert values.spreadsheets.gets == 0
+
+def test_an_open_ended_range_is_read_to_the_last_row_of_its_tab(sheet):
+    values = sheet(ROWS, row_count=8)
+
+    data = google_sheets.parse_rows(google_sheets.iter_rows('sheet-id', ['Sheet1!A:C']))
+
+    assert [cdp['nom'] for cdp in data['cdp_list']] == ['Dupont', 'Martin']
+    assert data['total'] == 3000
+    assert values.requested == ['Sheet1!A1:C3', 'Sheet1!A4:C6', 'Sheet1!A7:C8']
+    assert values.spreadsheets.gets == 1
+
+@pytest.mark.parametrize('range_name', ['Sheet1', 'KPI', 'MyNamedRange'])
+def test_a_tab_or_a_named_range_is_fetched_in_one_request(sheet, range_name):
+    values = sheet(ROWS)
+
+    data = google_sheets.parse_rows(google_sheets.iter_rows('sheet-id', [range_name]))
+
+    assert [cdp['nom'] for cdp in data['cdp_list']] == ['Dupont', 'Martin']
+    assert values.requested == [range_name]
+
+def test_a_range_with_both_total_rows_counts_its_total_once(sheet):
+    sheet(ROWS + [['JEECE', '', 3000]])
+
+    data = google_sheets.parse_rows(google_sheets.iter_rows('sheet-id', ['Sheet1!A1:C7', 'Sheet1!A1:C6']))
+
+    assert data['total'] == 6000
+
+@pytest.mark.parametrize('text, expected', [
+    ('-€12', -12.0), ('-12 €', -12.0), ('€-12', -12.0), ('+ 1 234,50 €', 1234.5), ('-$3.5', -3.5)
+])
+def test_a_sign_before_the_currency_sign_is_parsed(text, expected):
+    assert google_sheets.parse_number(text) == expected
+
+def test_rejected_credentials_are_reloaded_on_the_next_sync(sheet, monkeypatch):
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    values = sheet(ROWS)
+    def batch_get(**kwargs):
+        raise HttpError(httplib2.Response({'status': 401}), b'{}')
+    monkeypatch.setattr(values, 'batchGet', batch_get)
+    monkeypatch.setattr(google_sheets, '_service', object())
+    monkeypatch.setattr(google_sheets, '_values_api', values)
+
+    with pytest.raises(HttpError):
+        google_sheets.fetch_kpi_data('sheet-id', 'Sheet1!A1:C8')
+
+    assert google_sheets._service is None
+    assert google_sheets._values_api is None
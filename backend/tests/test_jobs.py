@@ -0,0 +1,88 @@
+"""Tests of the sync jobs shared by the gunicorn workers (jobs.py)."""
+import json
+import os
+import subprocess
+import sys
+
+import jobs
+from conftest import WORKDIR
+
+LOOKUP = '''
+import json, sys
+sys.path.insert(0, {backend!r})
+import app, jobs, tenants
+with tenants.use(tenants.default()):
+    print(json.dumps(jobs.get({job_id!r})))
+'''
+
+def lookup_in_other_process(job_id):
+    """Look a job up from a new interpreter, like another gunicorn worker."""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, '-c', LOOKUP.format(backend=backend, job_id=job_id)],
+        env=os.environ, cwd=WORKDIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_a_job_is_found_from_another_process(client):
+    response = client.post('/api/sync')
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['id']
+    assert jobs.wait(job_id, timeout=10)['status'] == 'succeeded'
+
+    job = lookup_in_other_process(job_id)
+
+    assert job['id'] == job_id
+    assert job['status'] == 'succeeded'
+    assert job['result']['status'] == 'unchanged'
+    assert 'fetch' in job['phases']
+
+def test_a_sync_in_flight_is_reused(tenant):
+    import threading
+    release = threading.Event()
+
+    def blocked_sync(progress):
+        progress('fetch')
+        release.wait(10)
+        return {'status': 'success'}
+
+    first, created = jobs.submit(blocked_sync, 'scheduler')
+    second, attached = jobs.submit(blocked_sync, 'api')
+    release.set()
+
+    assert (created, attached) == (True, False)
+    assert second['id'] == first['id']
+    assert second['attached'] == 1
+    assert jobs.wait(first['id'], timeout=10)['status'] == 'succeeded'
+
+def test_a_job_left_by_an_exited_process_is_not_reused(tenant):
+    import database
+
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    stale = {column: None for column in database.SYNC_JOB_COLUMNS}
+    stale.update(id='stale', source='startup', status='running', phases={}, attached=0,
+                 created_at='2000-01-01T00:00:00', pid=exited.pid)
+    database.create_sync_job(stale, lambda job: True, jobs.MAX_JOBS_KEPT)
+
+    job, created = jobs.submit(lambda progress: {'status': 'success'}, 'api')
+
+    assert created and job['id'] != 'stale'
+    assert jobs.get('stale')['status'] == 'failed'
+    assert jobs.wait(job['id'], timeout=10)['status'] == 'succeeded'
+
+def test_a_job_whose_pid_was_handed_out_again_is_not_reused(tenant):
+    import database
+
+    # A live process stands for the one a restart gave the recorded pid to
+    parent = os.getppid()
+    stale = {column: None for column in database.SYNC_JOB_COLUMNS}
+    stale.update(id='reused', source='startup', status='running', phases={}, attached=0,
+                 created_at='2000-01-01T00:00:00', pid=parent, process='previous-boot:1')
+    database.create_sync_job(stale, lambda job: True, jobs.MAX_JOBS_KEPT)
+
+    job, created = jobs.submit(lambda progress: {'status': 'success'}, 'api')
+
+    assert created and job['id'] != 'reused'
+    assert jobs.get('reused')['status'] == 'failed'
+    assert jobs.wait(job['id'], timeout=10)['status'] == 'succeeded'
@@ -0,0 +1,19 @@
+"""Tests of the syncs from config.json (app.sync_data_from_sheets)."""
+import jobs
+import snapshot
+from conftest import make_config, write_config
+
+def test_an_invalid_hand_edit_fails_with_details_and_keeps_the_data(client):
+    before = snapshot.get_snapshot()
+    config = make_config()
+    config['chefs_projet'][1]['chiffre_affaire'] = '12 000'
+    write_config(config)
+
+    job = client.post('/api/sync').get_json()['job']
+    job = jobs.wait(job['id'], timeout=10)
+
+    assert job['status'] == 'failed'
+    assert job['result']['details'] == ["chefs_projet/1/chiffre_affaire: '12 000' is not of type 'number'"]
+    assert 'chefs_projet/1/chiffre_affaire' in job['error']
+    assert snapshot.get_snapshot().version == before.version
+    assert client.get('/api/kpi').get_json()['chiffre_affaire'] == 50000
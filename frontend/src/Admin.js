@@ -1,6 +1,70 @@
 import React, { useState, useEffect } from 'react';
 import './Admin.css';
 
+// Administration d'un autre tenant : /admin?tenant=pole-conseil
+const TENANT = new URLSearchParams(window.location.search).get('tenant');
+const API_BASE = TENANT ? `/api/${encodeURIComponent(TENANT)}` : '/api';
+const KPI_FIELDS = ['objectif_annuel', 'objectif_decembre', 'wr', 'chiffre_affaire_total'];
+
+const clone = (config) => JSON.parse(JSON.stringify(config));
+
+// Nom de photo remplacé par le serveur après l'upload (photo traitée)
+const renamePhoto = (config, from, to) => ({
+  ...config,
+  chefs_projet: config.chefs_projet.map((cdp) => (
+    cdp.photo_filename === from ? { ...cdp, photo_filename: to } : cdp
+  ))
+});
+
+// Opérations PATCH qui transforment la config enregistrée en la config éditée :
+// seules les lignes modifiées sont envoyées et écrites en base
+const configOperations = (saved, edited) => {
+  const operations = KPI_FIELDS
+    .filter((field) => edited[field] !== undefined && edited[field] !== saved[field])
+    .map((field) => ({ op: 'set', field, value: edited[field] }));
+
+  // Chefs de projet identifiés par (nom, prénom)
+  const key = (cdp) => JSON.stringify([cdp.nom, cdp.prenom]);
+  const before = new Map((saved.chefs_projet || []).map((cdp) => [key(cdp), cdp]));
+  const after = new Map((edited.chefs_projet || []).map((cdp) => [key(cdp), cdp]));
+  before.forEach((cdp, k) => {
+    if (!after.has(k)) operations.push({ op: 'remove_cdp', nom: cdp.nom, prenom: cdp.prenom });
+  });
+  after.forEach((cdp, k) => {
+    const previous = before.get(k);
+    const { nom, prenom, chiffre_affaire } = cdp;
+    const photo = cdp.photo_filename ? { photo_filename: cdp.photo_filename } : {};
+    if (!previous) {
+      operations.push({ op: 'add_cdp', nom, prenom, chiffre_affaire, ...photo });
+    } else if (chiffre_affaire !== previous.chiffre_affaire || (cdp.photo_filename || null) !== (previous.photo_filename || null)) {
+      const photoChanged = (cdp.photo_filename || null) !== (previous.photo_filename || null);
+      operations.push({ op: 'update_cdp', nom, prenom, chiffre_affaire, ...(photoChanged ? { photo_filename: cdp.photo_filename || null } : {}) });
+    }
+  });
+
+  // Autres objectifs : un nom désigne le premier objectif de ce nom, comme côté serveur
+  const valuesByName = (objectifs) => (objectifs || []).reduce((byName, obj) => {
+    byName.set(obj.nom, [...(byName.get(obj.nom) || []), obj.valeur]);
+    return byName;
+  }, new Map());
+  const savedObjectifs = valuesByName(saved.autres_objectifs);
+  const editedObjectifs = valuesByName(edited.autres_objectifs);
+  new Set([...savedObjectifs.keys(), ...editedObjectifs.keys()]).forEach((nom) => {
+    const oldValues = savedObjectifs.get(nom) || [];
+    const newValues = editedObjectifs.get(nom) || [];
+    const kept = oldValues.slice(Math.max(oldValues.length - newValues.length, 0));
+    oldValues.slice(kept.length).forEach(() => operations.push({ op: 'remove_objectif', nom }));
+    newValues.forEach((valeur, i) => {
+      if (i >= kept.length) {
+        operations.push({ op: 'add_objectif', nom, valeur });
+      } else if (valeur !== kept[i]) {
+        operations.push({ op: 'update_objectif', nom, valeur });
+      }
+    });
+  });
+  return operations;
+};
+
 function Admin() {
   const [config, setConfig] = useState({
     objectif_annuel: 100000,
@@ -10,6 +74,10 @@ function Admin() {
     chiffre_affaire_total: 0,
     chefs_projet: []
   });
+  // Version of config.json this page was loaded from, sent back on save
+  const [version, setVersion] = useState(null);
+  // Config as last loaded or saved, the base of the PATCH operations
+  const [saved, setSaved] = useState(null);
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [message, setMessage] = useState('');
@@ -31,9 +99,11 @@ function Admin() {
 
   const fetchConfig = async () => {
     try {
-      const response = await fetch('/api/admin/config');
+      const response = await fetch(`${API_BASE}/admin/config`);
       const data = await response.json();
       setConfig(data);
+      setSaved(clone(data));
+      setVersion(response.headers.get('ETag'));
       setLoading(false);
     } catch (error) {
       console.error('Error fetching config:', error);
@@ -70,18 +140,31 @@ function Admin() {
     setMessage('');
 
     try {
-      const response = await fetch('/api/admin/config', {
-        method: 'PUT',
+      const operations = configOperations(saved, config);
+      if (operations.length === 0) {
+        setMessage('✅ Aucune modification à sauvegarder');
+        return;
+      }
+
+      // Le serveur valide, enregistre et met à jour le dashboard dans la même requête
+      const response = await fetch(`${API_BASE}/admin/config`, {
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
+          ...(version ? { 'If-Match': version } : {})
         },
-        body: JSON.stringify(config)
+        body: JSON.stringify({ operations })
       });
+      const result = await response.json();
 
       if (response.ok) {
+        setVersion(response.headers.get('ETag'));
+        setSaved(clone(config));
         setMessage('✅ Données sauvegardées avec succès !');
-        // Trigger a sync to update the database
-        await fetch('/api/sync', { method: 'POST' });
+      } else if (response.status === 412) {
+        setMessage('⚠️ La configuration a été modifiée entre-temps (autre administrateur ?). Rechargez la page puis refaites vos modifications.');
+      } else if (result.details) {
+        setMessage(`❌ Données invalides : ${result.details.join(' ; ')}`);
       } else {
         setMessage('❌ Erreur lors de la sauvegarde');
       }
@@ -119,6 +202,7 @@ function Admin() {
     }
 
     let photoFilename = newCdp.photo_filename;
+    let baseConfig = config;
 
     // Upload photo if one was selected
     if (photoFile) {
@@ -126,14 +210,22 @@ function Admin() {
         const formData = new FormData();
         formData.append('photo', photoFile);
 
-        const response = await fetch('/api/admin/upload-photo', {
+        const response = await fetch(`${API_BASE}/admin/upload-photo`, {
           method: 'POST',
+          headers: version ? { 'If-Match': version } : {},
           body: formData
         });
 
         if (response.ok) {
           const result = await response.json();
           photoFilename = result.filename;
+          if (result.version) {
+            // Le serveur a renommé la photo dans config.json par-dessus notre version :
+            // on suit ce renommage pour que la prochaine sauvegarde ne soit pas refusée (412)
+            setVersion(result.version);
+            setSaved(renamePhoto(saved, result.original, result.filename));
+            baseConfig = renamePhoto(config, result.original, result.filename);
+          }
         } else {
           setMessage('⚠️ Erreur lors de l\'upload de la photo, CDP ajouté sans photo');
           photoFilename = '';
@@ -150,9 +242,9 @@ function Admin() {
       photo_filename: photoFilename
     };
 
-    const updatedChefsProjet = [...config.chefs_projet, cdpToAdd];
+    const updatedChefsProjet = [...baseConfig.chefs_projet, cdpToAdd];
     setConfig({
-      ...config,
+      ...baseConfig,
       chefs_projet: updatedChefsProjet
     });
 
@@ -1,65 +1,145 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import './App.css';
 import axios from 'axios';
 
-const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api';
+// Tableau de bord d'un autre tenant : /?tenant=pole-conseil
+const TENANT = new URLSearchParams(window.location.search).get('tenant');
+const API_URL = (process.env.REACT_APP_API_URL || '/api') +
+  (TENANT ? `/${encodeURIComponent(TENANT)}` : '');
+
+// Rechargement après un changement : délai aléatoire pour que tous les écrans
+// ne rechargent pas au même instant, et essais de plus en plus espacés en cas d'erreur
+const REFRESH_JITTER_MS = 2000;
+const POLL_INTERVAL_MS = 5000;
+const MAX_BACKOFF_MS = 60000;
+const jitter = (ms) => ms * (0.8 + Math.random() * 0.4);
+const backoff = (failures) => Math.min(MAX_BACKOFF_MS, 1000 * 2 ** failures);
 
 // Avatar par défaut SVG en base64
 const DEFAULT_AVATAR = 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTAwIiBoZWlnaHQ9IjEwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMTAwIiBoZWlnaHQ9IjEwMCIgZmlsbD0iIzY2N2VlYSIvPjxjaXJjbGUgY3g9IjUwIiBjeT0iNDAiIHI9IjIwIiBmaWxsPSJ3aGl0ZSIvPjxwYXRoIGQ9Ik0yNSA4MCBRIDI1IDYwIDUwIDYwIFEgNzUgNjAgNzUgODAgWiIgZmlsbD0id2hpdGUiLz48L3N2Zz4=';
 
+// Photos traitées par le serveur : variantes WebP/AVIF carrées, choisies par le navigateur selon la taille affichée
+function CdpPhoto({ cdp, className, sizes }) {
+  const src = cdp.photo_filename ? `/images/cdp/${cdp.photo_filename}` : DEFAULT_AVATAR;
+  const img = (
+    <img
+      src={src}
+      srcSet={cdp.photo_srcset || undefined}
+      sizes={cdp.photo_srcset ? sizes : undefined}
+      alt={`${cdp.prenom} ${cdp.nom}`}
+      className={className}
+      decoding="async"
+      onError={(e) => { e.target.onerror = null; e.target.removeAttribute('srcset'); e.target.src = DEFAULT_AVATAR; }}
+    />
+  );
+  if (!cdp.photo_avif_srcset) {
+    return img;
+  }
+  return (
+    <picture>
+      <source type="image/avif" srcSet={cdp.photo_avif_srcset} sizes={sizes} />
+      {img}
+    </picture>
+  );
+}
+
 function App() {
-  const [kpi, setKpi] = useState({ chiffre_affaire: 0, objectif_annuel: 100000, objectif_decembre: 0, wr: 0, timestamp: null });
+  const [kpi, setKpi] = useState({
+    chiffre_affaire: 0, objectif_annuel: 100000, objectif_decembre: 0, wr: 0, timestamp: null,
+    progress: { objectif_annuel: 0 }, markers: { objectif_decembre: 0, wr: 0 }
+  });
   const [cdps, setCdps] = useState([]);
   const [lastUpdate, setLastUpdate] = useState(null);
   const [loading, setLoading] = useState(true);
-  const [lastModified, setLastModified] = useState(null);
+  const versionRef = useRef(null);
+  const refreshTimerRef = useRef(null);
+  const failuresRef = useRef(0);
 
   const fetchData = async () => {
+    clearTimeout(refreshTimerRef.current);
     try {
-      const [kpiRes, cdpRes, updateRes] = await Promise.all([
-        axios.get(`${API_URL}/kpi`),
-        axios.get(`${API_URL}/cdp`),
-        axios.get(`${API_URL}/last-update`)
-      ]);
-
-      console.log('KPI data received:', kpiRes.data);
-      setKpi(kpiRes.data);
-      setCdps(cdpRes.data);
-      setLastUpdate(updateRes.data.last_update);
+      // KPI, classement et date de mise à jour en une seule requête
+      const res = await axios.get(`${API_URL}/dashboard`);
+
+      console.log('KPI data received:', res.data.kpi);
+      versionRef.current = res.data.version;
+      setKpi(res.data.kpi);
+      setCdps(res.data.cdp);
+      setLastUpdate(res.data.last_update);
       setLoading(false);
+      failuresRef.current = 0;
     } catch (error) {
       console.error('Error fetching data:', error);
       setLoading(false);
+      // Serveur redémarré, réseau coupé... : réessayer de plus en plus tard
+      refreshTimerRef.current = setTimeout(fetchData, jitter(backoff(failuresRef.current)));
+      failuresRef.current += 1;
     }
   };
 
-  const checkForUpdates = async () => {
-    try {
-      const res = await axios.get(`${API_URL}/last-modified`);
-      const newModified = res.data.last_modified;
-
-      if (lastModified !== null && newModified !== lastModified) {
-        console.log('Data changed, refreshing...');
-        await fetchData();
-      }
-      setLastModified(newModified);
-    } catch (error) {
-      console.error('Error checking for updates:', error);
-    }
+  const scheduleRefresh = () => {
+    // Tous les écrans apprennent le changement en même temps : étaler leurs rechargements
+    clearTimeout(refreshTimerRef.current);
+    refreshTimerRef.current = setTimeout(fetchData, Math.random() * REFRESH_JITTER_MS);
   };
 
   useEffect(() => {
     // Initial load
     fetchData();
+    return () => clearTimeout(refreshTimerRef.current);
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
   useEffect(() => {
-    // Check for updates every 5 seconds (very light request)
-    const interval = setInterval(checkForUpdates, 5000);
-    return () => clearInterval(interval);
+    // Le serveur pousse un événement dès que les données changent
+    if (!window.EventSource) return undefined;
+
+    const source = new EventSource(`${API_URL}/stream`);
+    source.addEventListener('update', (event) => {
+      const { version } = JSON.parse(event.data);
+      if (version !== versionRef.current) {
+        console.log('Data changed, refreshing...');
+        scheduleRefresh();
+      }
+    });
+    return () => source.close();
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [lastModified]);
+  }, []);
+
+  useEffect(() => {
+    // Fallback without SSE: check for updates about every 5 seconds (very light request),
+    // less and less often while the server does not answer
+    if (window.EventSource) return undefined;
+
+    let timer;
+    let stopped = false;
+    let lastModified = null;
+    let failures = 0;
+    const checkForUpdates = async () => {
+      try {
+        const res = await axios.get(`${API_URL}/last-modified`);
+        const newModified = res.data.last_modified;
+
+        if (lastModified !== null && newModified !== lastModified) {
+          console.log('Data changed, refreshing...');
+          scheduleRefresh();
+        }
+        lastModified = newModified;
+        failures = 0;
+      } catch (error) {
+        console.error('Error checking for updates:', error);
+        failures += 1;
+      }
+      if (stopped) return;
+      timer = setTimeout(checkForUpdates, jitter(failures ? Math.max(POLL_INTERVAL_MS, backoff(failures)) : POLL_INTERVAL_MS));
+    };
+    timer = setTimeout(checkForUpdates, jitter(POLL_INTERVAL_MS));
+    return () => {
+      stopped = true;
+      clearTimeout(timer);
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
 
   const formatCurrency = (amount) => {
     return new Intl.NumberFormat('fr-FR', {
@@ -108,7 +188,7 @@ function App() {
             <div className="progress-bar-container">
               <div
                 className="progress-bar-fill"
-                style={{ height: `${Math.min(100, (kpi.chiffre_affaire / (kpi.objectif_annuel || 100000)) * 100)}%` }}
+                style={{ height: `${Math.min(100, kpi.progress.objectif_annuel)}%` }}
               />
 
               {/* Marques 25k, 50k, 75k */}
@@ -124,8 +204,8 @@ function App() {
               {/* Objectif déc 2025 */}
               {kpi.objectif_decembre > 0 && (
                 <>
-                  <div className="progress-line" style={{ bottom: `${Math.min(100, (kpi.objectif_decembre / (kpi.objectif_annuel || 100000)) * 100)}%` }}></div>
-                  <div className="progress-line-label" style={{ bottom: `calc(${Math.min(100, (kpi.objectif_decembre / (kpi.objectif_annuel || 100000)) * 100)}% + 5px)` }}>
+                  <div className="progress-line" style={{ bottom: `${kpi.markers.objectif_decembre}%` }}></div>
+                  <div className="progress-line-label" style={{ bottom: `calc(${kpi.markers.objectif_decembre}% + 5px)` }}>
                     Objectif déc 2025 ({(kpi.objectif_decembre / 1000).toFixed(0)}k€)
                   </div>
                 </>
@@ -134,8 +214,8 @@ function App() {
               {/* WR (World Record) */}
               {kpi.wr > 0 && (
                 <>
-                  <div className="progress-line wr-line" style={{ bottom: `${Math.min(100, (kpi.wr / (kpi.objectif_annuel || 100000)) * 100)}%` }}></div>
-                  <div className="progress-line-label wr-label" style={{ bottom: `calc(${Math.min(100, (kpi.wr / (kpi.objectif_annuel || 100000)) * 100)}% + 5px)` }}>
+                  <div className="progress-line wr-line" style={{ bottom: `${kpi.markers.wr}%` }}></div>
+                  <div className="progress-line-label wr-label" style={{ bottom: `calc(${kpi.markers.wr}% + 5px)` }}>
                     WR ({(kpi.wr / 1000).toFixed(0)}k€)
                   </div>
                 </>
@@ -146,7 +226,7 @@ function App() {
               <h2>Chiffre d'Affaires Total</h2>
               <div className="kpi-value">{formatCurrency(kpi.chiffre_affaire)}</div>
               <div className="progress-percentage">
-                {Math.min(100, ((kpi.chiffre_affaire / (kpi.objectif_annuel || 100000)) * 100).toFixed(1))}%
+                {Math.min(100, kpi.progress.objectif_annuel).toFixed(1)}%
               </div>
               <div style={{ fontSize: '1.1rem', opacity: 0.9, marginTop: '15px' }}>
                 Objectif: {formatCurrency(kpi.objectif_annuel || 100000)}
@@ -156,18 +236,14 @@ function App() {
         </section>
 
         <section className="ranking-section">
+          {/* Classement, rangs et variations calculés par le serveur à chaque synchronisation */}
           <h2 className="section-title">Classement des Chefs de Projet</h2>
           <div className="podium">
             {cdps.slice(0, 3).map((cdp, index) => (
               <div key={cdp.id} className={`podium-item rank-${index + 1}`}>
-                <div className="rank-badge">{index + 1}</div>
+                <div className="rank-badge">{cdp.rank || index + 1}</div>
                 <div className="cdp-photo-container">
-                  <img
-                    src={cdp.photo_filename ? `/images/cdp/${cdp.photo_filename}` : DEFAULT_AVATAR}
-                    alt={`${cdp.prenom} ${cdp.nom}`}
-                    className="cdp-photo"
-                    onError={(e) => { e.target.onerror = null; e.target.src = DEFAULT_AVATAR; }}
-                  />
+                  <CdpPhoto cdp={cdp} className="cdp-photo" sizes="110px" />
                 </div>
                 <div className="cdp-name">{cdp.prenom} {cdp.nom}</div>
                 <div className="cdp-ca">{formatCurrency(cdp.chiffre_affaire)}</div>
@@ -178,15 +254,12 @@ function App() {
           <div className="ranking-list">
             {cdps.slice(3).map((cdp, index) => (
               <div key={cdp.id} className="ranking-item">
-                <div className="rank-number">{index + 4}</div>
+                <div className="rank-number">{cdp.rank || index + 4}</div>
                 <div className="cdp-info">
-                  <img
-                    src={cdp.photo_filename ? `/images/cdp/${cdp.photo_filename}` : DEFAULT_AVATAR}
-                    alt={`${cdp.prenom} ${cdp.nom}`}
-                    className="cdp-photo-small"
-                    onError={(e) => { e.target.onerror = null; e.target.src = DEFAULT_AVATAR; }}
-                  />
+                  <CdpPhoto cdp={cdp} className="cdp-photo-small" sizes="45px" />
                   <span className="cdp-name-small">{cdp.prenom} {cdp.nom}</span>
+                  {cdp.rank_change > 0 && <span className="rank-change up">▲{cdp.rank_change}</span>}
+                  {cdp.rank_change < 0 && <span className="rank-change down">▼{-cdp.rank_change}</span>}
                 </div>
                 <div className="cdp-ca-small">{formatCurrency(cdp.chiffre_affaire)}</div>
               </div>